@@ -1,4 +1,6 @@
 import numpy as np
+from History import History, History_Field
+from Random_Streams import GLOBAL_RNG
 
 class Player:
     """
@@ -37,6 +39,13 @@ class Player:
                 a numpy array containing the urn size of the player over multiple games in the system (relevant if the adaptive urn algos are online)
             so_container: np.array
                 a numpy array containing the second order estimates of the player over multiple games in the system
+            stakes_container: np.array
+                a numpy array containing the stakes of the player over multiple games in the system
+            history: History
+                the History object storing the containers above, the containers are views of the player's row in it.
+                Urnings merges the histories of all players (and items) into one History at initialisation.
+            history_row: int
+                the row of the player in history
             idx: int
                 an id created when the user enters a game
 
@@ -45,15 +54,23 @@ class Player:
                 an equivalence function which checks whether two player objects are the same
             find(id: int):
                 a function with boolean output indicating whether the given player has the inputed id or not
-            draw(true_score_logic:bool = False)
+            draw(true_score_logic:bool = False, rng = GLOBAL_RNG)
                 a function governing the draws from urns if the true score logic is true we are drawing with the true probability (used in simulation)
-            so_draw():
+                rng is the random stream to draw from (see Random_Streams), by default the global numpy state
+            so_draw(rng = GLOBAL_RNG):
                 a function governing the draws from the second order urns
             autocorrelation(lag: int, plots: bool = False):
                 a function which calculates the autocorrelation for the chain of estimates
             so_autocorrelation(lag: int, plots: bool = False):
                 a function calculating the autocorrelation for the differential container
     """
+    container = History_Field("container")
+    estimate_container = History_Field("estimate_container")
+    differential_container = History_Field("differential_container")
+    urn_container = History_Field("urn_container")
+    so_container = History_Field("so_container")
+    stakes_container = History_Field("stakes_container")
+
     def __init__(self, user_id: str, score: int, urn_size: int, true_value: float, so_urn_size: int = 10, stake = 16): 
 
         #TODO: implementing player declaration errors
@@ -78,6 +95,8 @@ class Player:
         self.previous_stake = stake
 
         #creating a container
+        self.history = History(1)
+        self.history_row = 0
         self.container = np.array([self.score])
         self.estimate_container = np.array([self.est])
         self.differential_container = np.array([0])
@@ -90,26 +109,26 @@ class Player:
         self.scaled_score = self.score
     
     def __eq__(self, other):
-        return self.user_id == other.user_id
+        return self is other or self.user_id == other.user_id
     
     def find(self, id:int):
         return self.user_id == id
     
 
-    def draw(self, true_score_logic: bool = False):
+    def draw(self, true_score_logic: bool = False, rng = GLOBAL_RNG):
        #drawing the expected result based on the most frequent estimate
         if true_score_logic == False:
-            sim_y = np.random.binomial(1, self.est)
+            sim_y = rng.binomial(1, self.est)
             self.sim_y = sim_y
             return  sim_y
         #drawing the simulated outcome
         else:
-            sim_y = np.random.binomial(1, self.true_value)
+            sim_y = rng.binomial(1, self.true_value)
             self.sim_true_y = sim_y
             return sim_y
 
-    def so_draw(self):
+    def so_draw(self, rng = GLOBAL_RNG):
         #drawing the expected result based on the most frequent second order estimate
-        sim_y = np.random.binomial(1, self.so_est)
+        sim_y = rng.binomial(1, self.so_est)
         self.sim_y = sim_y
         return sim_y
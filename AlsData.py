@@ -0,0 +1,260 @@
+import numpy as np
+import csv
+import json
+import time
+from typing import Optional, Type
+from Agents import Player
+from Game_Type import Game_Type
+from History import History
+
+class AlsData:
+    """
+    class AlsData:
+        Streams a log of recorded responses of an adaptive learning system and replays it through an Urnings object. The log is
+        read in chunks, so it never has to fit into memory, and the Player objects of learners and items are created when their
+        id first appears. The events are assumed to be ordered by their timestamp.
+
+        attributes:
+            path: str
+                the path of the log file
+            file_format: str
+                takes values from ["csv", "ndjson", "parquet"] (parquet needs pyarrow), guessed from the file extension if not given
+            chunk_size: int
+                the number of events read at once
+            columns: dict
+                the column names of the log, keys: "timestamp", "learner_id", "item_id", "correct"
+            player_urn_size, item_urn_size: int
+                the urn size of the new learners and items
+            player_start, item_start: int
+                the starting score of the new learners and items (half of the urn size by default)
+            n_events: int
+                the number of events replayed so far (without the events skipped when a checkpoint is resumed)
+            n_new_players, n_new_items: int
+                the number of learners and items created during the replay
+
+        methods:
+            read_chunks()
+                yields the log in chunks of (timestamps, learner_ids, item_ids, corrects) lists
+            build_urnings(game_type: Game_Type, **kwargs)
+                creates an empty Urnings object with the urn sizes of the log
+            replay(urnings: Urnings, report_every: Optional[int] = None, ragged: bool = True, checkpoint_every: Optional[int] = None, checkpoint_path: Optional[str] = None)
+                feeds every event of the log into urnings.urnings_game with the observed outcome and returns the throughput,
+                with Game_Type(engine = "compiled") every chunk is played by the kernel of Compiled_Urnings. With ragged = True the
+                in-memory histories are moved into History.Ragged_History first (Urnings.ragged_histories), so their memory grows with
+                the number of events instead of with the rows times the longest row.
+                If checkpoint_every is given the whole state is saved to checkpoint_path every checkpoint_every events. Every event
+                is one game, the first urnings.game_count events of the log are skipped, so a run restored with
+                Checkpoint.load_checkpoint continues with replay(restored) exactly as the uninterrupted replay would
+    """
+    def __init__(self,
+                 path: str,
+                 player_urn_size: int,
+                 item_urn_size: int,
+                 file_format: Optional[str] = None,
+                 chunk_size: int = 100000,
+                 columns: Optional[dict] = None,
+                 player_start: Optional[int] = None,
+                 item_start: Optional[int] = None):
+
+        self.path = path
+        self.file_format = path.rsplit(".", 1)[-1].lower() if file_format is None else file_format
+        if self.file_format == "jsonl":
+            self.file_format = "ndjson"
+        if self.file_format not in ["csv", "ndjson", "parquet"]:
+            raise ValueError("The file format should be 'csv', 'ndjson' or 'parquet'.")
+
+        self.chunk_size = chunk_size
+        self.columns = {"timestamp": "timestamp", "learner_id": "learner_id", "item_id": "item_id", "correct": "correct"}
+        if columns is not None:
+            self.columns.update(columns)
+
+        self.player_urn_size = player_urn_size
+        self.item_urn_size = item_urn_size
+        self.player_start = player_urn_size // 2 if player_start is None else player_start
+        self.item_start = item_urn_size // 2 if item_start is None else item_start
+
+        self.n_events = 0
+        self.n_new_players = 0
+        self.n_new_items = 0
+
+    @staticmethod
+    def parse_correct(value):
+        if isinstance(value, str):
+            return int(value.strip().lower() in ["1", "true", "t", "yes", "correct"])
+        return int(bool(value))
+
+    def _read_rows(self):
+        if self.file_format == "csv":
+            with open(self.path, newline="") as f:
+                for row in csv.DictReader(f):
+                    yield row
+        elif self.file_format == "ndjson":
+            with open(self.path) as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+
+    def read_chunks(self):
+        c = self.columns
+        if self.file_format == "parquet":
+            try:
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise ImportError("Reading parquet logs requires pyarrow.")
+
+            parquet_file = pq.ParquetFile(self.path)
+            for batch in parquet_file.iter_batches(batch_size=self.chunk_size, columns=[c["timestamp"], c["learner_id"], c["item_id"], c["correct"]]):
+                batch = batch.to_pydict()
+                yield batch[c["timestamp"]], batch[c["learner_id"]], batch[c["item_id"]], batch[c["correct"]]
+            return
+
+        chunk = ([], [], [], [])
+        for row in self._read_rows():
+            chunk[0].append(row.get(c["timestamp"]))
+            chunk[1].append(row[c["learner_id"]])
+            chunk[2].append(row[c["item_id"]])
+            chunk[3].append(row[c["correct"]])
+            if len(chunk[0]) == self.chunk_size:
+                yield chunk
+                chunk = ([], [], [], [])
+        if len(chunk[0]) > 0:
+            yield chunk
+
+    def build_urnings(self, game_type: Type[Game_Type], **kwargs):
+        from Urnings import Urnings
+        return Urnings([], [], game_type, player_urn_size=self.player_urn_size, item_urn_size=self.item_urn_size, **kwargs)
+
+    def replay(self, urnings, report_every: Optional[int] = None, ragged: bool = True, checkpoint_every: Optional[int] = None,
+               checkpoint_path: Optional[str] = None):
+        if checkpoint_every is not None:
+            if checkpoint_path is None:
+                raise ValueError("checkpoint_path is needed to save checkpoints.")
+            from Checkpoint import save_checkpoint
+
+        urnings.data = self
+        #the activity of real learners and items is long tailed, the matrices of History would be as wide as the most active one.
+        #Mapped histories (Urnings.map_histories) are kept, their files have the matrix layout
+        if ragged == True and type(urnings.player_history) is History:
+            urnings.ragged_histories()
+        players = {pl.user_id : pl for pl in urnings.players}
+        items = {it.user_id : it for it in urnings.items}
+
+        engine = None
+        if urnings.game_type.engine == "compiled":
+            from Compiled_Urnings import Compiled_Urnings, NUMBA_AVAILABLE
+            if NUMBA_AVAILABLE:
+                engine = Compiled_Urnings(urnings)
+
+        start = time.perf_counter()
+        #a run restored with Checkpoint.load_checkpoint has already played the first game_count events of the log
+        skip = urnings.game_count
+        for chunk in self.read_chunks():
+            if skip >= len(chunk[0]):
+                skip -= len(chunk[0])
+                continue
+            chunk = [column[skip:] for column in chunk]
+            skip = 0
+
+            #the chunk is split at the checkpoints, so every saved state ends with a completed event
+            for timestamps, learner_ids, item_ids, corrects in self._split(chunk, urnings.game_count, checkpoint_every):
+                if engine is not None:
+                    self._replay_compiled(engine, players, items, learner_ids, item_ids, corrects, report_every, start)
+                else:
+                    self._replay_python(urnings, players, items, learner_ids, item_ids, corrects, report_every, start)
+
+                if checkpoint_every is not None and urnings.game_count % checkpoint_every == 0:
+                    if engine is not None:
+                        engine.write_back()
+                    save_checkpoint(urnings, checkpoint_path)
+
+        if engine is not None:
+            engine.write_back()
+        urnings.flush_histories()
+
+        elapsed = time.perf_counter() - start
+        return {"events": self.n_events,
+                "seconds": elapsed,
+                "events_per_sec": self.n_events / elapsed if elapsed > 0 else float("inf"),
+                "new_players": self.n_new_players,
+                "new_items": self.n_new_items}
+
+    @staticmethod
+    def _split(chunk: list, game_count: int, checkpoint_every: Optional[int]):
+        if checkpoint_every is None:
+            yield chunk
+            return
+        begin = 0
+        while begin < len(chunk[0]):
+            end = min(len(chunk[0]), begin + checkpoint_every - (game_count + begin) % checkpoint_every)
+            yield [column[begin:end] for column in chunk]
+            begin = end
+
+    def _replay_python(self, urnings, players: dict, items: dict, learner_ids: list, item_ids: list, corrects: list, report_every: Optional[int], start: float):
+        for learner_id, item_id, correct in zip(learner_ids, item_ids, corrects):
+            learner_id = str(learner_id)
+            item_id = str(item_id)
+
+            #creating the players and items on their first appearance
+            player = players.get(learner_id)
+            if player is None:
+                player = Player(learner_id, self.player_start, self.player_urn_size, None)
+                urnings.add_player(player)
+                players[learner_id] = player
+                self.n_new_players += 1
+
+            item = items.get(item_id)
+            if item is None:
+                item = Player(item_id, self.item_start, self.item_urn_size, None)
+                urnings.add_item(item)
+                items[item_id] = item
+                self.n_new_items += 1
+
+            urnings.urnings_game(player, item, result=self.parse_correct(correct))
+            urnings.game_count += 1
+            self.n_events += 1
+
+            if report_every is not None and self.n_events % report_every == 0:
+                elapsed = time.perf_counter() - start
+                print(self.n_events, "events,", int(self.n_events / elapsed), "events/sec")
+
+    def _replay_compiled(self, engine, players: dict, items: dict, learner_ids: list, item_ids: list, corrects: list, report_every: Optional[int], start: float):
+        #the chunk is mapped to indices and played by the compiled kernel in one go, the new players and items enter the item
+        #bins and the green ball sums at their first game (see Compiled_Urnings.play)
+        from Compiled_Urnings import NEW_PLAYER, NEW_ITEM
+        n = len(learner_ids)
+        player_idx = np.empty(n, dtype=np.int64)
+        item_idx = np.empty(n, dtype=np.int64)
+        results = np.empty(n, dtype=np.int64)
+        activate = np.zeros(n, dtype=np.int64)
+        for e, (learner_id, item_id, correct) in enumerate(zip(learner_ids, item_ids, corrects)):
+            learner_id = str(learner_id)
+            item_id = str(item_id)
+
+            player = players.get(learner_id)
+            if player is None:
+                player = Player(learner_id, self.player_start, self.player_urn_size, None)
+                engine.add_player(player)
+                players[learner_id] = player
+                self.n_new_players += 1
+                activate[e] |= NEW_PLAYER
+
+            item = items.get(item_id)
+            if item is None:
+                item = Player(item_id, self.item_start, self.item_urn_size, None)
+                engine.add_item(item)
+                items[item_id] = item
+                self.n_new_items += 1
+                activate[e] |= NEW_ITEM
+
+            player_idx[e] = player.idx
+            item_idx[e] = item.idx
+            results[e] = self.parse_correct(correct)
+
+        engine.play(n, player_idx, item_idx, results, activate)
+        engine.urnings.game_count += n
+        previous_events = self.n_events
+        self.n_events += n
+
+        if report_every is not None and self.n_events // report_every > previous_events // report_every:
+            elapsed = time.perf_counter() - start
+            print(self.n_events, "events,", int(self.n_events / elapsed), "events/sec")
@@ -0,0 +1,200 @@
+import numpy as np
+import os
+import pickle
+import shutil
+from typing import Optional
+from History import History, Ragged_History
+from Population import Population, Player_View, POPULATION_FIELDS
+from Random_Streams import Buffered_RNG, Global_RNG
+from Urnings import Urnings
+
+#model fit arrays of Urnings
+FIT_ARRAYS = ["prop_correct", "number_per_bin", "fit_correct", "adaptive_correct"]
+
+
+def _save_agents(path: str, prefix: str, agents: list):
+    population = agents[0].population if len(agents) > 0 and isinstance(agents[0], Player_View) else None
+    in_order = population is not None and population.n == len(agents) and all(isinstance(ag, Player_View) and ag.population is population and ag.row == i for i, ag in enumerate(agents))
+
+    for f, dt in POPULATION_FIELDS.items():
+        if in_order:
+            #the views of a population are saved straight from its arrays
+            values = population.fields[f][:population.n]
+        elif f == "true_value":
+            #players without a true value (e.g. replayed from data) are saved as nan
+            values = np.array([np.nan if ag.true_value is None else ag.true_value for ag in agents], dtype=dt)
+        else:
+            values = np.array([getattr(ag, f) for ag in agents], dtype=dt)
+        np.save(os.path.join(path, prefix + f + ".npy"), values)
+
+
+def _load_agents(path: str, prefix: str, user_ids: list, history: History):
+    #the agents are restored as the views of one Population bound to the loaded history
+    fields = {f : np.load(os.path.join(path, prefix + f + ".npy")) for f in POPULATION_FIELDS}
+    population = Population(user_ids, fields["score"], fields["urn_size"], history = history)
+    for f in POPULATION_FIELDS:
+        population.fields[f][:] = fields[f]
+    return population.players()
+
+
+def _history_layout(history: History):
+    return "ragged" if isinstance(history, Ragged_History) else "matrix"
+
+
+def _history_class(layout: Optional[str]):
+    return Ragged_History if layout == "ragged" else History
+
+
+def _rng_state(rng):
+    if isinstance(rng, Buffered_RNG):
+        return {"type": "buffered", "bit_generator": rng.generator.bit_generator.state, "block_size": rng.block_size,
+                "block": list(rng.block), "position": rng.position}
+    elif isinstance(rng, Global_RNG):
+        return {"type": "global", "state": np.random.get_state()}
+    else:
+        raise ValueError("Only Buffered_RNG and Global_RNG streams can be checkpointed.")
+
+
+def _restore_rng(state: dict):
+    if state["type"] == "global":
+        np.random.set_state(state["state"])
+        return None
+
+    bit_generator = getattr(np.random, state["bit_generator"]["bit_generator"])()
+    bit_generator.state = state["bit_generator"]
+    rng = Buffered_RNG(np.random.Generator(bit_generator), state["block_size"])
+    rng.block = state["block"]
+    rng.position = state["position"]
+    return rng
+
+
+def save_checkpoint(urnings: Urnings, path: str):
+    """
+    Saves the complete state of an Urnings object into the directory path: the attributes of the players and items, their
+    histories (a Ragged_History in its packed layout), the paired update queues, the item bins, the model fit arrays and the state of the random stream. Arrays are
+    saved as .npy files (memory-mappable), the remaining small objects (Game_Type, ids, counters, random state) in state.pkl.
+    The checkpoint is written into a temporary directory first and swapped in at the end, so a crash while saving keeps
+    the previous checkpoint.
+
+        urnings: Urnings
+            the system to save
+        path: str
+            the checkpoint directory, it is replaced if it already exists
+    """
+    #the wrappers of an attached Phase_Profiler can't be pickled with the Game_Type
+    profiler = urnings.profiler
+    if profiler is not None:
+        profiler.detach()
+    try:
+        _save(urnings, path)
+    finally:
+        if profiler is not None:
+            profiler.attach(urnings)
+
+
+def _save(urnings: Urnings, path: str):
+    #the mapped histories (Urnings.map_histories) are brought up to date with the checkpoint
+    urnings.flush_histories()
+
+    tmp_path = path.rstrip(os.sep) + ".tmp"
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    _save_agents(tmp_path, "player_", urnings.players)
+    _save_agents(tmp_path, "item_", urnings.items)
+    urnings.player_history.save(tmp_path, "player_history_")
+    urnings.item_history.save(tmp_path, "item_history_")
+
+    for name, queue in [("queue_pos", urnings.queue_pos), ("queue_neg", urnings.queue_neg)]:
+        np.save(os.path.join(tmp_path, name + "_pending.npy"), queue.pending[:queue.size])
+        np.save(os.path.join(tmp_path, name + "_position.npy"), queue.position)
+
+    #the order of the items within the bins determines which item is drawn, so the bins are saved as they are
+    bins = urnings.item_bins
+    for name in ["counts", "members", "position", "bin_of"]:
+        np.save(os.path.join(tmp_path, "item_bins_" + name + ".npy"), getattr(bins, name))
+    if bins.normalisers is not None:
+        np.save(os.path.join(tmp_path, "item_bins_normalisers.npy"), bins.normalisers)
+
+    for name in FIT_ARRAYS:
+        np.save(os.path.join(tmp_path, name + ".npy"), getattr(urnings, name))
+
+    state = {"game_type": urnings.game_type,
+             "control_draws": urnings.control_draws,
+             "player_urn_size": urnings.player_urn_size,
+             "item_urn_size": urnings.item_urn_size,
+             "player_ids": [pl.user_id for pl in urnings.players],
+             "item_ids": [it.user_id for it in urnings.items],
+             "game_count": urnings.game_count,
+             "bugfix": urnings.bugfix,
+             "item_green_balls": urnings.item_green_balls,
+             "total_green_balls": urnings.total_green_balls,
+             "total_num_balls": urnings.total_num_balls,
+             "diagnostics": {"track_fit": urnings.track_fit, "track_green_balls": urnings.track_green_balls, "sample_every": urnings.sample_every,
+                             "diagnostic_games": urnings.diagnostic_games, "item_green_ball_sum": urnings.item_green_ball_sum,
+                             "total_green_ball_sum": urnings.total_green_ball_sum, "total_ball_sum": urnings.total_ball_sum},
+             "rng": _rng_state(urnings.rng),
+             #a Ragged_History is saved and restored in its packed layout, the others in the matrix layout
+             "histories": {"player": _history_layout(urnings.player_history), "item": _history_layout(urnings.item_history)}}
+    with open(os.path.join(tmp_path, "state.pkl"), "wb") as f:
+        pickle.dump(state, f)
+
+    #swapping the new checkpoint in
+    old_path = path.rstrip(os.sep) + ".old"
+    if os.path.exists(path):
+        os.replace(path, old_path)
+    os.replace(tmp_path, path)
+    if os.path.exists(old_path):
+        shutil.rmtree(old_path)
+
+
+def load_checkpoint(path: str, mmap_mode: Optional[str] = "c"):
+    """
+    Restores an Urnings object saved by save_checkpoint. The players and items are restored as the views of two Populations
+    (see Population.__doc__()). Playing n more games with the restored object gives exactly the same results as playing them
+    with the original one. If the saved object used the global numpy random state, the global state is set back to the saved one.
+
+        path: str
+            the checkpoint directory
+        mmap_mode: str
+            passed to np.load for the histories, the default "c" memory-maps them copy-on-write, so a large population is
+            restored without reading the histories up front and the files on disk are never modified. None reads them into memory
+
+    returns:
+        Urnings, the restored system
+    """
+    with open(os.path.join(path, "state.pkl"), "rb") as f:
+        state = pickle.load(f)
+
+    layouts = state.get("histories", {})
+    player_history = _history_class(layouts.get("player")).load(path, "player_history_", mmap_mode)
+    item_history = _history_class(layouts.get("item")).load(path, "item_history_", mmap_mode)
+    players = _load_agents(path, "player_", state["player_ids"], player_history)
+    items = _load_agents(path, "item_", state["item_ids"], item_history)
+
+    urnings = Urnings(players, items, state["game_type"], state["control_draws"], _restore_rng(state["rng"]),
+                      player_urn_size = state["player_urn_size"], item_urn_size = state["item_urn_size"])
+
+    for name, queue in [("queue_pos", urnings.queue_pos), ("queue_neg", urnings.queue_neg)]:
+        pending = np.load(os.path.join(path, name + "_pending.npy"))
+        queue.position = np.load(os.path.join(path, name + "_position.npy"))
+        queue.pending = np.zeros(len(queue.position), dtype=np.int64)
+        queue.pending[:len(pending)] = pending
+        queue.size = len(pending)
+
+    bins = urnings.item_bins
+    for name in ["counts", "members", "position", "bin_of"]:
+        setattr(bins, name, np.load(os.path.join(path, "item_bins_" + name + ".npy")))
+    if bins.normalisers is not None:
+        bins.normalisers = np.load(os.path.join(path, "item_bins_normalisers.npy"))
+
+    for name in FIT_ARRAYS:
+        setattr(urnings, name, np.load(os.path.join(path, name + ".npy")))
+
+    for name in ["game_count", "bugfix", "item_green_balls", "total_green_balls", "total_num_balls"]:
+        setattr(urnings, name, state[name])
+    for name, value in state["diagnostics"].items():
+        setattr(urnings, name, value)
+
+    return urnings
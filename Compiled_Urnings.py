@@ -0,0 +1,734 @@
+import numpy as np
+from typing import Optional, Type
+from Agents import Player
+from Game_Type import Game_Type
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        #without numba the kernel runs as plain Python over the same arrays (slow, Urnings.play uses the Python engine instead)
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda function: function
+
+#codes of the Game_Type options in the config array of the kernel
+ADAPTIVITY = {"n_adaptive": 0, "adaptive": 1}
+ALG_TYPES = {"Urnings1": 1, "Urnings2": 2}
+DRAW_MODES = {"rejection": 0, "closed_form": 1}
+URN_TYPES = {None: 0, "permutation": 1, "second_order_urnings": 2, "stakes_permutation": 3, "stakes_second_order_urnings": 4, "fixed_stakes": 5}
+
+#positions in the config array
+C_ADAPTIVITY, C_ALG, C_DRAW, C_URN_TYPE, C_ADAPTIVE_URN, C_PAIRED, C_WINDOW, C_MIN_URN, C_MAX_URN, C_MIN_STAKES, C_MAX_STAKES, \
+    C_FREQ_CHANGE, C_BOUND, C_PERMUTATION_TEST, C_CONTROL_DRAWS, C_TRACK_FIT, C_TRACK_GREEN, C_SAMPLE_EVERY = range(18)
+
+#positions in the counters array
+N_ACCEPTED, N_ITEM_GREEN, N_TOTAL_GREEN, N_TOTAL_BALLS, N_DIAGNOSTIC_GAMES, N_QUEUE_POS, N_QUEUE_NEG = range(7)
+
+#columns of the game log, the history values of every game
+L_PLAYER, L_ITEM, L_PLAYER_SCORE, L_PLAYER_DIFF, L_PLAYER_URN, L_PLAYER_STAKE, L_ITEM_SCORE, L_ITEM_DIFF = range(8)
+L_PLAYER_EST, L_SO_EST = range(2)
+
+#bits of the activation flags of replayed events
+NEW_PLAYER = 1
+NEW_ITEM = 2
+
+
+@njit(cache=True)
+def _conditional_probability(p, q):
+    #core.pRasch(p, q, 1, 1), the player's draw if the draws can never differ (see Game_Type.conditional_probability)
+    numerator = p * (1 - q)
+    denominator = numerator + (1 - p) * q
+    if denominator == 0:
+        return p
+    return numerator / denominator
+
+
+@njit(cache=True)
+def _round_half_even(x):
+    #np.round of a float
+    r = np.floor(x)
+    d = x - r
+    if d > 0.5 or (d == 0.5 and r % 2 == 1):
+        r += 1
+    return int(r)
+
+
+@njit(cache=True)
+def _window_stats(window_values, row, window):
+    #the number of nonzero differences and their sum, the index of the p value table
+    nonzero = 0
+    total = 0
+    for j in range(window):
+        if window_values[row, j] != 0:
+            nonzero += 1
+        total += window_values[row, j]
+    return nonzero, total
+
+
+@njit(cache=True)
+def _window_mean(window_values, row, length, window):
+    #summing in the order the values were saved, like np.mean of the last window values
+    total = 0.0
+    for j in range(window):
+        total += window_values[row, (length + j) % window]
+    return total / window
+
+
+@njit(cache=True)
+def _draw(alg, draw_mode, p_score, p_urn, p_true, i_score, i_urn, i_true, result, u, pos, end):
+    #Game_Type.draw_rule, returns pos = -1 if the uniforms up to end are used up (nothing is changed by the draws)
+    if draw_mode == 1:
+        if result < 0:
+            if pos >= end:
+                return -1, -1, -1
+            result = 1 if u[pos] < _conditional_probability(p_true, i_true) else 0
+            pos += 1
+        if alg == 1:
+            p_est = p_score / p_urn
+            i_est = i_score / i_urn
+        else:
+            p_est = (p_score + result) / (p_urn + 1)
+            i_est = (i_score + 1 - result) / (i_urn + 1)
+        if pos >= end:
+            return -1, -1, -1
+        expected = 1 if u[pos] < _conditional_probability(p_est, i_est) else 0
+        return result, expected, pos + 1
+
+    #simulating the observed value
+    if result < 0:
+        while True:
+            if pos + 2 > end:
+                return -1, -1, -1
+            player_draw = u[pos] < p_true
+            item_draw = u[pos + 1] < i_true
+            pos += 2
+            if player_draw != item_draw:
+                break
+        result = 1 if player_draw else 0
+
+    #calculating the expected value, Urnings1 gives up after 1000 pairs of draws
+    if alg == 1:
+        p_est = p_score / p_urn
+        i_est = i_score / i_urn
+        max_pairs = 1000
+    else:
+        p_est = (p_score + result) / (p_urn + 1)
+        i_est = (i_score + 1 - result) / (i_urn + 1)
+        max_pairs = -1
+
+    counter = 0
+    player_draw = False
+    while max_pairs < 0 or counter < max_pairs:
+        if pos + 2 > end:
+            return -1, -1, -1
+        player_draw = u[pos] < p_est
+        item_draw = u[pos + 1] < i_est
+        pos += 2
+        counter += 1
+        if player_draw != item_draw:
+            break
+    expected = 1 if player_draw else 0
+    return result, expected, pos
+
+
+@njit(cache=True)
+def _queue_add(pending, position, counters, size_at, idx):
+    if position[idx] == -1:
+        pending[counters[size_at]] = idx
+        position[idx] = counters[size_at]
+        counters[size_at] += 1
+
+
+@njit(cache=True)
+def _queue_remove(pending, position, counters, size_at, idx):
+    pos = position[idx]
+    if pos != -1:
+        last = pending[counters[size_at] - 1]
+        pending[pos] = last
+        position[last] = pos
+        position[idx] = -1
+        counters[size_at] -= 1
+
+
+@njit(cache=True)
+def _insert(counts, members, position, bin_of, idx, b):
+    members[b, counts[b]] = idx
+    position[idx] = counts[b]
+    bin_of[idx] = b
+    counts[b] += 1
+
+
+@njit(cache=True)
+def _move(weights, counts, members, position, bin_of, normalisers, idx, new_bin):
+    #Item_Bins.update, returns the previous bin
+    old_bin = bin_of[idx]
+    if old_bin == new_bin:
+        return old_bin
+
+    last = members[old_bin, counts[old_bin] - 1]
+    members[old_bin, position[idx]] = last
+    position[last] = position[idx]
+    counts[old_bin] -= 1
+    _insert(counts, members, position, bin_of, idx, new_bin)
+
+    for r in range(len(normalisers)):
+        normalisers[r] += weights[r, new_bin] - weights[r, old_bin]
+    return old_bin
+
+
+@njit(cache=True, error_model="numpy")
+def _play_games(n_games, fixed_players, fixed_items, results, activate, config, perm_p_val, p_values,
+                p_score, p_urn, p_true, p_scaled, p_so_score, p_so_urn, p_stake, n_players,
+                diff_window, diff_length, so_window, so_length,
+                i_score, i_urn, i_true, n_items,
+                weights, counts, members, position, bin_of, normalisers,
+                pos_pending, pos_position, neg_pending, neg_position,
+                adaptive_correct, prop_correct, number_per_bin, fit_correct,
+                counters, samples, log, log_float, u, pos):
+    """
+    Plays up to n_games games of Urnings.urnings_game over the array state, the uniforms u[pos:] are consumed in the order of
+    the draws of the Python engine using a Buffered_RNG. A game is only started if its draw phase fits into the uniforms left
+    (the rest of a game needs at most reserve of them), otherwise the kernel stops before it.
+
+    returns:
+        (number of games played, position of the next unused uniform, number of green ball samples)
+    """
+    adaptivity = config[C_ADAPTIVITY]
+    alg = config[C_ALG]
+    draw_mode = config[C_DRAW]
+    urn_type = config[C_URN_TYPE]
+    adaptive_urn = config[C_ADAPTIVE_URN]
+    paired_update = config[C_PAIRED]
+    window = config[C_WINDOW]
+    min_urn = config[C_MIN_URN]
+    max_urn = config[C_MAX_URN]
+    min_stakes = config[C_MIN_STAKES]
+    max_stakes = config[C_MAX_STAKES]
+    freq_change = config[C_FREQ_CHANGE]
+    bound = config[C_BOUND]
+    permutation_test = config[C_PERMUTATION_TEST]
+    control_draws = config[C_CONTROL_DRAWS]
+    track_fit = config[C_TRACK_FIT]
+    track_green = config[C_TRACK_GREEN]
+    sample_every = config[C_SAMPLE_EVERY]
+
+    n_bins = len(counts)
+    cumulative = np.empty(n_bins)
+    #accept draw, paired update picks, second order draw and the control draws
+    reserve = 104 + 2 * control_draws
+    end = len(u) - reserve
+    played = 0
+    n_samples = 0
+
+    while played < n_games:
+        start = pos
+
+        #--------------------------------------matchmaking---------------------------------------------------------------#
+        if len(fixed_players) > 0:
+            player = fixed_players[played]
+        else:
+            if pos >= end:
+                break
+            player = int(u[pos] * n_players)
+            pos += 1
+
+        if len(fixed_items) > 0:
+            item = fixed_items[played]
+        elif adaptivity == 0:
+            if pos >= end:
+                pos = start
+                break
+            item = int(u[pos] * n_items)
+            pos += 1
+        else:
+            if pos + 2 > end:
+                pos = start
+                break
+            #a bin weighted by the selection weight times the number of items in it, then an item uniformly within the bin
+            s = p_scaled[player]
+            total = 0.0
+            for b in range(n_bins):
+                total = total + weights[s, b] * counts[b]
+                cumulative[b] = total
+            x = u[pos] * total
+            cap = np.nextafter(total, 0.0)
+            if cap < x:
+                x = cap
+            b = 0
+            while b < n_bins - 1 and cumulative[b] <= x:
+                b += 1
+            item = members[b, int(u[pos + 1] * counts[b])]
+            pos += 2
+
+        #--------------------------------------calculate the estimated response-----------------------------------------#
+        result, expected, pos = _draw(alg, draw_mode, p_score[player], p_urn[player], p_true[player], i_score[item], i_urn[item], i_true[item],
+                                      results[played] if len(results) > 0 else -1, u, pos, end)
+        if pos < 0:
+            pos = start
+            break
+
+        #new players and items of a replayed log enter the system before their first game (Urnings.add_player, add_item)
+        if len(activate) > 0:
+            if activate[played] & NEW_PLAYER:
+                counters[N_TOTAL_GREEN] += p_score[player]
+                counters[N_TOTAL_BALLS] += p_urn[player]
+            if activate[played] & NEW_ITEM:
+                _insert(counts, members, position, bin_of, item, i_score[item])
+                for r in range(len(normalisers)):
+                    normalisers[r] += weights[r, i_score[item]]
+                counters[N_ITEM_GREEN] += i_score[item]
+                counters[N_TOTAL_GREEN] += i_score[item]
+                counters[N_TOTAL_BALLS] += i_urn[item]
+
+        player_bin = p_scaled[player]
+        item_bin = i_score[item]
+        adaptive_correct[player_bin, item_bin] += 1
+        ps = p_score[player]
+        pu = p_urn[player]
+        iscore = i_score[item]
+        iu = i_urn[item]
+
+        #--------------------------------------update the urnings -----------------------------------------------------#
+        if urn_type == 3:
+            if diff_length[player] >= window:
+                nonzero, total_diff = _window_stats(diff_window, player, window)
+                if p_values[nonzero, abs(total_diff)] < perm_p_val:
+                    p_stake[player] = max_stakes
+                elif p_stake[player] != 1:
+                    p_stake[player] = int(p_stake[player] / 2)
+        elif urn_type == 4:
+            if so_length[player] >= window and so_length[player] % window == 0:
+                so_mean = _window_mean(so_window, player, so_length[player], window)
+                draws = 0
+                for c in range(control_draws):
+                    if u[pos] < so_mean:
+                        draws += 1
+                    pos += 1
+                if (draws == control_draws or draws == 0) and p_stake[player] > min_stakes:
+                    p_stake[player] = max_stakes
+                elif p_stake[player] != 1:
+                    p_stake[player] = p_stake[player] - 1
+
+        stake = 1
+        if urn_type >= 3:
+            stake = p_stake[player]
+            #the stake falls back to a single ball if it would leave one of the urns
+            if ps + stake > pu or ps - stake < 0 or iscore + stake > iu or iscore - stake < 0:
+                stake = 1
+        player_proposal = min(max(ps + stake * (result - expected), 0), pu)
+        item_proposal = min(max(iscore + stake * ((1 - result) - (1 - expected)), 0), iu)
+
+        #--------------------------------------calculate metropolis correction————————————————————————————————————————–#
+        adaptivity_corrector = 1.0
+        if adaptivity == 1:
+            current_selection_prob = weights[player_bin, iscore] / normalisers[player_bin]
+            proposal_scaled = int(player_proposal * (max_urn / pu))
+            proposed_normaliser = normalisers[proposal_scaled] - weights[proposal_scaled, iscore] + weights[proposal_scaled, item_proposal]
+            proposed_selection_prob = weights[proposal_scaled, item_proposal] / proposed_normaliser
+            adaptivity_corrector = proposed_selection_prob / current_selection_prob
+
+        metropolis_corrector = 1.0
+        if alg == 1:
+            old_score = ps * (pu - iscore) + (iu - ps) * iscore
+            new_score = player_proposal * (pu - item_proposal) + (iu - player_proposal) * item_proposal
+            #the Python engine falls back to 1 on the ZeroDivisionError
+            if new_score != 0:
+                metropolis_corrector = old_score / new_score
+
+        acceptance = metropolis_corrector * adaptivity_corrector
+        if not acceptance < 1:
+            acceptance = 1.0
+        if u[pos] < acceptance:
+            counters[N_ACCEPTED] += 1
+            p_score[player] = player_proposal
+            p_scaled[player] = int(player_proposal * (max_urn / pu))
+            i_score[item] = item_proposal
+        pos += 1
+
+        player_diff = min(max(p_score[player] - ps, -1), 1)
+        item_diff = min(max(i_score[item] - iscore, -1), 1)
+
+        #--------------------------------------Paired Item Update-----------------------------------------------------#
+        paired_item = -1
+        if paired_update == 1:
+            if item_diff == 1:
+                if counters[N_QUEUE_NEG] == 0:
+                    _queue_add(pos_pending, pos_position, counters, N_QUEUE_POS, item)
+                    if i_score[item] > 0:
+                        i_score[item] -= 1
+                else:
+                    paired_item = neg_pending[int(u[pos] * counters[N_QUEUE_NEG])]
+                    pos += 1
+                    counter = 0
+                    while i_score[paired_item] <= 0:
+                        paired_item = neg_pending[int(u[pos] * counters[N_QUEUE_NEG])]
+                        pos += 1
+                        counter += 1
+                        if counter > 100:
+                            break
+                    _queue_remove(neg_pending, neg_position, counters, N_QUEUE_NEG, paired_item)
+                    i_score[paired_item] -= 1
+            elif item_diff == -1:
+                if counters[N_QUEUE_POS] == 0:
+                    _queue_add(neg_pending, neg_position, counters, N_QUEUE_NEG, item)
+                    if i_score[item] < i_urn[item]:
+                        i_score[item] += 1
+                else:
+                    paired_item = pos_pending[int(u[pos] * counters[N_QUEUE_POS])]
+                    pos += 1
+                    counter = 0
+                    while i_score[paired_item] >= i_urn[paired_item]:
+                        paired_item = pos_pending[int(u[pos] * counters[N_QUEUE_POS])]
+                        pos += 1
+                        counter += 1
+                        if counter > 100:
+                            break
+                    _queue_remove(pos_pending, pos_position, counters, N_QUEUE_POS, paired_item)
+                    i_score[paired_item] += 1
+
+        #-------------------------------------Place items in a new bin after the updating is done---------------------#
+        item_old_bin = _move(weights, counts, members, position, bin_of, normalisers, item, i_score[item])
+        paired_old_bin = 0
+        if paired_item >= 0:
+            paired_old_bin = _move(weights, counts, members, position, bin_of, normalisers, paired_item, i_score[paired_item])
+
+        #------------------------------------Save data before the adaptive urn change algos---------------------------#
+        log[played, L_PLAYER] = player
+        log[played, L_ITEM] = item
+        log[played, L_PLAYER_SCORE] = p_score[player]
+        log[played, L_PLAYER_DIFF] = player_diff
+        log[played, L_ITEM_SCORE] = i_score[item]
+        log[played, L_ITEM_DIFF] = item_diff
+        log_float[played, L_PLAYER_EST] = p_score[player] / p_urn[player]
+        diff_window[player, diff_length[player] % window] = player_diff
+        diff_length[player] += 1
+
+        #--------------------------------------Second Order Urnings---------------------------------------------------#
+        so_diff = 0 if player_diff == -1 else player_diff
+        so_expected = 1 if u[pos] < p_so_score[player] / p_so_urn[player] else 0
+        pos += 1
+        p_so_score[player] = p_so_score[player] + so_diff - so_expected
+        so_est = p_so_score[player] / p_so_urn[player]
+        log_float[played, L_SO_EST] = so_est
+        so_window[player, so_length[player] % window] = so_est
+        so_length[player] += 1
+
+        #-------------------------------------Adaptive urn_size------------------------------------------------------#
+        if adaptive_urn == 1 and (urn_type == 1 or urn_type == 2):
+            length = diff_length[player] if urn_type == 1 else so_length[player]
+            if length >= window and length % window == 0:
+                if urn_type == 1:
+                    nonzero, total_diff = _window_stats(diff_window, player, window)
+                    if permutation_test == 0:
+                        shrink = total_diff >= bound and p_urn[player] > min_urn
+                        grow = (not shrink) and length % freq_change == 0 and p_urn[player] < max_urn
+                    else:
+                        shrink = p_values[nonzero, abs(total_diff)] < perm_p_val
+                        grow = (not shrink) and p_urn[player] < max_urn
+                else:
+                    so_mean = _window_mean(so_window, player, so_length[player], window)
+                    draws = 0
+                    for c in range(control_draws):
+                        if u[pos] < so_mean:
+                            draws += 1
+                        pos += 1
+                    shrink = (draws == control_draws or draws == 0) and p_urn[player] > min_urn
+                    grow = (not shrink) and p_urn[player] < max_urn
+
+                if shrink:
+                    change = p_urn[player] / min_urn
+                    p_score[player] = _round_half_even(p_score[player] / change)
+                    p_urn[player] = min_urn
+                elif grow:
+                    p_urn[player] = p_urn[player] * 2
+                    p_score[player] = p_score[player] * 2
+        p_scaled[player] = int(p_score[player] * (max_urn / p_urn[player]))
+
+        log[played, L_PLAYER_URN] = p_urn[player]
+        log[played, L_PLAYER_STAKE] = p_stake[player]
+
+        #------------------------------------evaluating fit---------------------------------------------------------#
+        if track_fit == 1:
+            prop_correct[player_bin, item_bin] += result
+            number_per_bin[player_bin, item_bin] += 1
+            fit_correct[player_bin, item_bin] += expected
+
+        #------------------------------------green ball inflation---------------------------------------------------#
+        if track_green == 1:
+            item_change = i_score[item] - item_old_bin
+            if paired_item >= 0:
+                item_change += i_score[paired_item] - paired_old_bin
+            counters[N_ITEM_GREEN] += item_change
+            counters[N_TOTAL_GREEN] += item_change + p_score[player] - ps
+            counters[N_TOTAL_BALLS] += p_urn[player] - pu
+            counters[N_DIAGNOSTIC_GAMES] += 1
+            if counters[N_DIAGNOSTIC_GAMES] % sample_every == 0:
+                samples[n_samples, 0] = counters[N_ITEM_GREEN]
+                samples[n_samples, 1] = counters[N_TOTAL_GREEN]
+                samples[n_samples, 2] = counters[N_TOTAL_BALLS]
+                n_samples += 1
+
+        played += 1
+
+    return played, pos, n_samples
+
+
+def _grow(array: np.ndarray, n: int):
+    #doubling the capacity of the first axis if n rows don't fit
+    if n <= len(array):
+        return array
+    grown = np.zeros((max(n, 2 * len(array)),) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class Compiled_Urnings:
+    """
+    class Compiled_Urnings:
+        A compiled engine for Urnings.play and AlsData.replay (selected with Game_Type(engine = "compiled")). The states of the players
+        and items are kept in numpy arrays and the games are played one by one by a kernel compiled with numba, which runs every step of
+        Urnings.urnings_game: item selection, draw rule, stakes, updating rule, adaptivity and Metropolis correction, paired update,
+        item bins, second order urnings and the adaptive urn size algorithms. The item bins, the paired update queues, the model fit
+        arrays and the histories of the Urnings object are updated in place, the scores of the Player objects by write_back().
+
+        The kernel consumes the uniforms of Urnings.rng in the order of the draws of the Python engine. With a Buffered_RNG stream
+        the games are identical to the games of the Python engine, except for the control draws of the "second_order_urnings" and
+        "stakes_second_order_urnings" algorithms, which are taken from the uniforms (the Python engine draws them from the generator),
+        and for a Metropolis correction with a zero denominator, which is 1 as for Python int scores. With the global stream the
+        uniforms are drawn with np.random.random, so the games follow the same rules but not the same draws.
+        Without numba the kernel runs as plain Python, Urnings.play then falls back to the Python engine.
+
+        attributes:
+            urnings: Urnings
+                the Urnings object played by the engine
+            player_score, player_urn_size, player_true_value, player_scaled_score: np.ndarray
+                the scores, urn sizes, true values (nan if unknown) and scaled scores of the players
+            so_score, so_urn_size, player_stake: np.ndarray
+                the second order urns and the stakes of the players
+            diff_window, so_window: np.ndarray
+                (players x window) the last window values of the differential and the second order containers, in a ring
+            diff_length, so_length: np.ndarray
+                the length of the differential and the second order containers of the players
+            item_score, item_urn_size, item_true_value: np.ndarray
+                the scores, urn sizes and true values of the items
+            n_players, n_items: int
+                the number of players and items (the arrays have spare capacity)
+            chunk_size: int
+                the maximum number of games played by one call of the kernel, the histories are saved after every call
+            uniforms_per_game: float
+                the running estimate of the uniforms used per game, the kernel gets enough of them for a chunk
+
+        methods:
+            check_game_type(game_type: Game_Type)
+                raises a ValueError if the options are not supported
+            add_player(player: Player), add_item(item: Player)
+                registers a new player or item in the Urnings object, it enters the item bins and the green ball sums at its
+                first game (see play(activate))
+            play(n_games: int, players: Optional[np.ndarray] = None, items: Optional[np.ndarray] = None, results: Optional[np.ndarray] = None,
+                 activate: Optional[np.ndarray] = None)
+                plays n_games games, the players are drawn uniformly unless given, the items are selected unless given,
+                the outcomes are simulated unless given, activate flags the first games of new players (1) and items (2)
+            write_back()
+                copies the state of the engine back to the Player objects
+    """
+    def __init__(self, urnings, chunk_size: int = 65536):
+        self.check_game_type(urnings.game_type)
+        self.urnings = urnings
+        self.game_type = urnings.game_type
+        self.chunk_size = chunk_size
+        self.uniforms_per_game = 16.0
+        self.extra_uniforms = 4096
+
+        players = urnings.players
+        items = urnings.items
+        self.n_players = len(players)
+        self.n_items = len(items)
+        self.player_score = np.array([pl.score for pl in players], dtype=np.int64)
+        self.player_urn_size = np.array([pl.urn_size for pl in players], dtype=np.int64)
+        self.player_true_value = np.array([np.nan if pl.true_value is None else pl.true_value for pl in players], dtype=np.float64)
+        self.player_scaled_score = np.array([pl.scaled_score for pl in players], dtype=np.int64)
+        self.so_score = np.array([pl.so_score for pl in players], dtype=np.int64)
+        self.so_urn_size = np.array([pl.so_urn_size for pl in players], dtype=np.int64)
+        self.player_stake = np.array([pl.previous_stake for pl in players], dtype=np.int64)
+        self.player_rows = np.array([pl.history_row for pl in players], dtype=np.int64)
+
+        self.item_score = np.array([it.score for it in items], dtype=np.int64)
+        self.item_urn_size = np.array([it.urn_size for it in items], dtype=np.int64)
+        self.item_true_value = np.array([np.nan if it.true_value is None else it.true_value for it in items], dtype=np.float64)
+        self.item_rows = np.array([it.history_row for it in items], dtype=np.int64)
+
+        #the end of the differential and second order containers, read by the adaptive urn size algorithms
+        window = self.game_type.window
+        history = urnings.player_history
+        self.diff_length = history.lengths["differential_container"][self.player_rows].copy()
+        self.so_length = history.lengths["so_container"][self.player_rows].copy()
+        self.diff_window = np.zeros((self.n_players, window), dtype=np.int64)
+        self.so_window = np.zeros((self.n_players, window), dtype=np.float64)
+        for j in range(window):
+            for values, lengths, field in [(self.diff_window, self.diff_length, "differential_container"), (self.so_window, self.so_length, "so_container")]:
+                game = lengths - window + j
+                kept = game >= 0
+                values[kept, game[kept] % window] = history.values(field, self.player_rows[kept], game[kept])
+
+    @staticmethod
+    def check_game_type(game_type: Type[Game_Type]):
+        if game_type.alg_type not in ALG_TYPES:
+            raise ValueError("The compiled engine supports alg_type 'Urnings1' and 'Urnings2'.")
+        if game_type.adaptivity not in ADAPTIVITY:
+            raise ValueError("The compiled engine supports adaptivity 'adaptive' and 'n_adaptive'.")
+        if game_type.draw_mode not in DRAW_MODES:
+            raise ValueError("The compiled engine supports draw_mode 'rejection' and 'closed_form'.")
+        if game_type.updating_type != "one_dim":
+            raise ValueError("The compiled engine supports updating_type 'one_dim'.")
+        if game_type.adaptive_urn_type not in URN_TYPES:
+            raise ValueError("The compiled engine does not support the adaptive urn size algorithm " + str(game_type.adaptive_urn_type) + ".")
+        if game_type.adaptive_urn == True and game_type.adaptive_urn_type == "permutation" and game_type.permutation_test == False:
+            if game_type.bound is None or game_type.freq_change is None:
+                raise ValueError("The permutation algorithm without permutation test needs bound and freq_change.")
+
+    def _config(self):
+        gt = self.game_type
+        urnings = self.urnings
+        return np.array([ADAPTIVITY[gt.adaptivity], ALG_TYPES[gt.alg_type], DRAW_MODES[gt.draw_mode], URN_TYPES[gt.adaptive_urn_type],
+                         int(gt.adaptive_urn == True), int(gt.item_pair_update == True), gt.window,
+                         -1 if gt.min_urn is None else gt.min_urn, gt.max_urn, gt.min_stakes,
+                         -1 if gt.max_stakes is None else gt.max_stakes, -1 if gt.freq_change is None else gt.freq_change,
+                         -1 if gt.bound is None else gt.bound, int(gt.permutation_test == True), urnings.control_draws,
+                         int(urnings.track_fit == True), int(urnings.track_green_balls == True), urnings.sample_every], dtype=np.int64)
+
+    def add_player(self, player: Type[Player]):
+        urnings = self.urnings
+        player.idx = len(urnings.players)
+        urnings.players.append(player)
+        urnings.player_history.add(player)
+        player.scaled_score = int(player.score * (self.game_type.max_urn / player.urn_size))
+
+        n = self.n_players
+        for name in ["player_score", "player_urn_size", "player_true_value", "player_scaled_score", "so_score", "so_urn_size", "player_stake",
+                     "player_rows", "diff_length", "so_length", "diff_window", "so_window"]:
+            setattr(self, name, _grow(getattr(self, name), n + 1))
+        self.player_score[n] = player.score
+        self.player_urn_size[n] = player.urn_size
+        self.player_true_value[n] = np.nan if player.true_value is None else player.true_value
+        self.player_scaled_score[n] = player.scaled_score
+        self.so_score[n] = player.so_score
+        self.so_urn_size[n] = player.so_urn_size
+        self.player_stake[n] = player.previous_stake
+        self.player_rows[n] = player.history_row
+        self.diff_length[n] = len(player.differential_container)
+        self.so_length[n] = len(player.so_container)
+        window = self.game_type.window
+        for values, container in [(self.diff_window[n], player.differential_container), (self.so_window[n], player.so_container)]:
+            for game in range(max(0, len(container) - window), len(container)):
+                values[game % window] = container[game]
+        self.n_players = n + 1
+
+    def add_item(self, item: Type[Player]):
+        urnings = self.urnings
+        item.idx = len(urnings.items)
+        urnings.items.append(item)
+        urnings.item_history.add(item)
+
+        n = self.n_items
+        for name in ["item_score", "item_urn_size", "item_true_value", "item_rows"]:
+            setattr(self, name, _grow(getattr(self, name), n + 1))
+        self.item_score[n] = item.score
+        self.item_urn_size[n] = item.urn_size
+        self.item_true_value[n] = np.nan if item.true_value is None else item.true_value
+        self.item_rows[n] = item.history_row
+        self.n_items = n + 1
+
+    def play(self, n_games: int, players: Optional[np.ndarray] = None, items: Optional[np.ndarray] = None, results: Optional[np.ndarray] = None,
+             activate: Optional[np.ndarray] = None):
+        empty = np.zeros(0, dtype=np.int64)
+        players = empty if players is None else np.asarray(players, dtype=np.int64)
+        items = empty if items is None else np.asarray(items, dtype=np.int64)
+        results = empty if results is None else np.asarray(results, dtype=np.int64)
+        activate = empty if activate is None else np.asarray(activate, dtype=np.int64)
+
+        done = 0
+        while done < n_games:
+            n = min(n_games - done, self.chunk_size)
+            played = self._play_chunk(n, players[done:done + n], items[done:done + n], results[done:done + n], activate[done:done + n])
+            if played == 0:
+                #the first game needs more uniforms than the estimate gives (e.g. a long rejection loop)
+                self.extra_uniforms *= 2
+            done += played
+
+    def _play_chunk(self, n: int, players: np.ndarray, items: np.ndarray, results: np.ndarray, activate: np.ndarray):
+        urnings = self.urnings
+        bins = urnings.item_bins
+        bins._reserve(self.n_items)
+        urnings.queue_pos._reserve(self.n_items)
+        urnings.queue_neg._reserve(self.n_items)
+
+        counters = np.array([0, urnings.item_green_ball_sum, urnings.total_green_ball_sum, urnings.total_ball_sum, urnings.diagnostic_games,
+                             urnings.queue_pos.size, urnings.queue_neg.size], dtype=np.int64)
+        samples = np.zeros((n // max(urnings.sample_every, 1) + 1, 3), dtype=np.int64)
+        log = np.zeros((n, 8), dtype=np.int64)
+        log_float = np.zeros((n, 2), dtype=np.float64)
+
+        u = urnings.rng.take(int(n * self.uniforms_per_game) + self.extra_uniforms)
+        played, pos, n_samples = _play_games(n, players, items, results, activate, self._config(), self.game_type.perm_p_val, self.game_type.p_values,
+                                             self.player_score, self.player_urn_size, self.player_true_value, self.player_scaled_score,
+                                             self.so_score, self.so_urn_size, self.player_stake, self.n_players,
+                                             self.diff_window, self.diff_length, self.so_window, self.so_length,
+                                             self.item_score, self.item_urn_size, self.item_true_value, self.n_items,
+                                             urnings.adaptive_matrix_binned, bins.counts, bins.members, bins.position, bins.bin_of, bins.normalisers,
+                                             urnings.queue_pos.pending, urnings.queue_pos.position, urnings.queue_neg.pending, urnings.queue_neg.position,
+                                             urnings.adaptive_correct, urnings.prop_correct, urnings.number_per_bin, urnings.fit_correct,
+                                             counters, samples, log, log_float, u, 0)
+        urnings.rng.give_back(u[pos:])
+        if played > 0:
+            #a small margin, the unused uniforms go back into the list of the stream
+            self.uniforms_per_game = 1.02 * pos / played
+
+        urnings.bugfix += int(counters[N_ACCEPTED])
+        urnings.item_green_ball_sum = int(counters[N_ITEM_GREEN])
+        urnings.total_green_ball_sum = int(counters[N_TOTAL_GREEN])
+        urnings.total_ball_sum = int(counters[N_TOTAL_BALLS])
+        urnings.diagnostic_games = int(counters[N_DIAGNOSTIC_GAMES])
+        urnings.queue_pos.size = int(counters[N_QUEUE_POS])
+        urnings.queue_neg.size = int(counters[N_QUEUE_NEG])
+        for sample in samples[:n_samples].tolist():
+            urnings.item_green_balls.append(sample[0])
+            urnings.total_green_balls.append(sample[1])
+            urnings.total_num_balls.append(sample[2])
+
+        #------------------------------------Save data---------------------------------------------------------------#
+        log = log[:played]
+        log_float = log_float[:played]
+        item_idx = log[:, L_ITEM]
+        urnings.player_history.extend_rows(self.player_rows[log[:, L_PLAYER]],
+                                           {"container": log[:, L_PLAYER_SCORE],
+                                            "estimate_container": log_float[:, L_PLAYER_EST],
+                                            "differential_container": log[:, L_PLAYER_DIFF],
+                                            "so_container": log_float[:, L_SO_EST],
+                                            "urn_container": log[:, L_PLAYER_URN],
+                                            "stakes_container": log[:, L_PLAYER_STAKE]})
+        urnings.item_history.extend_rows(self.item_rows[item_idx],
+                                         {"container": log[:, L_ITEM_SCORE],
+                                          "estimate_container": log[:, L_ITEM_SCORE] / self.item_urn_size[item_idx],
+                                          "differential_container": log[:, L_ITEM_DIFF],
+                                          "urn_container": self.item_urn_size[item_idx]})
+        return played
+
+    def write_back(self):
+        urnings = self.urnings
+        for pl, score, urn_size, scaled_score, so_score, stake in zip(urnings.players, self.player_score.tolist(), self.player_urn_size.tolist(),
+                                                                       self.player_scaled_score.tolist(), self.so_score.tolist(), self.player_stake.tolist()):
+            pl.score = score
+            pl.urn_size = urn_size
+            pl.est = score / urn_size
+            pl.scaled_score = scaled_score
+            pl.so_score = so_score
+            pl.so_est = pl.so_score / pl.so_urn_size
+            pl.previous_stake = stake
+
+        for it, score in zip(urnings.items, self.item_score.tolist()):
+            it.score = score
+            it.est = it.score / it.urn_size
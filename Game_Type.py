@@ -1,7 +1,10 @@
 import numpy as np
-from typing import Optional, Type
+from typing import Callable, Optional, Type, Union
 from Agents import Player
-import utilities as util
+from Item_Bins import Item_Bins
+from Random_Streams import GLOBAL_RNG
+from Update_Queue import Update_Queue
+import core
 
 class Game_Type:
     """
@@ -34,9 +37,24 @@ class Game_Type:
             permutation_test: bool
                 indicates whether we use permutation test or not
             n_permutations: int
-                indicates the number of permutations generated if window < 15 the algorithm uses exact test
+                indicates the number of random sign flips used by the permutation test if the window contains values outside {-1, 0, 1},
+                otherwise the exact test is read from the precomputed table p_values
+            p_values: np.ndarray
+                the p values of the exact permutation test indexed by [number of nonzero differences, |sum of differences|] (see core.permutation_p_values)
             perm_p_val: float
                 p value for the permutation test
+            selection_kernel: str or Callable
+                the kernel of the adaptive item selection, takes values from Selection_Kernels.KERNELS (["normal", "target_probability",
+                "fisher_information"]) or a function kernel(R_i, R_j, n_i, n_j, **kernel_args)
+            kernel_args: dict
+                extra arguments of the kernel, e.g. {"target": 0.7} for "target_probability"
+            draw_mode: str
+                takes values from ["rejection", "closed_form"], "rejection" draws from both urns until the draws differ, "closed_form" samples the
+                outcome directly from the conditional probability (core.pRasch) using a single uniform draw
+            engine: str
+                takes values from ["python", "vectorized", "compiled"], choses the engine used by Urnings.play. "python" plays the games one by one
+                using the methods of this class, "vectorized" processes whole rounds of players as array operations in test mode (see Vectorized_Urnings.__doc__),
+                "compiled" plays the games one by one in a kernel compiled with numba, also in AlsData.replay (see Compiled_Urnings.__doc__)
 
     """
     def __init__(self, 
@@ -56,7 +74,11 @@ class Game_Type:
                 bound: Optional[int] = None,
                 permutation_test: bool = False,
                 n_permutations: int = 1000,
-                perm_p_val: float = 0.05):
+                perm_p_val: float = 0.05,
+                selection_kernel: Union[str, Callable] = "normal",
+                kernel_args: Optional[dict] = None,
+                draw_mode: str = "rejection",
+                engine: str = "python"):
 
         self.adaptivity = adaptivity
         self.alg_type = alg_type
@@ -75,32 +97,58 @@ class Game_Type:
         self.permutation_test = permutation_test
         self.n_permutations = n_permutations
         self.perm_p_val = perm_p_val
+        self.selection_kernel = selection_kernel
+        self.kernel_args = {} if kernel_args is None else kernel_args
+        self.draw_mode = draw_mode
+        self.engine = engine
 
         #container for updates
         self.queue_pos = []
         self.queue_neg = []
 
-        #all combinations for exact permutation test
-        self.all_comb = util.all_binary_combination(self.window)
+        #p value table for the exact permutation test
+        self.p_values = core.permutation_p_values(self.window)
     
-    def draw_rule(self, player: Type[Player], item: Type[Player]):
+    def conditional_probability(self, p, q):
+        #probability of the player's draw being 1 given that the player's and the item's draws differ
+        p = np.asarray(p, dtype=np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            prob = core.pRasch(p, q, 1, 1)
+        #if both urns are all green or all red the draws never differ, the capped rejection loop then returns the player's draw which is p
+        return np.where(np.isnan(prob), p, prob)
+
+    def draw_rule(self, player: Type[Player], item: Type[Player], rng = GLOBAL_RNG, result: Optional[int] = None):
+        #result is the observed outcome if the game is replayed from data, otherwise it is simulated from the true values
         
+        #sampling the outcomes from the conditional probabilities
+        if self.draw_mode == "closed_form":
+            if result is None:
+                result = int(rng.uniform() < self.conditional_probability(player.true_value, item.true_value))
+
+            if self.alg_type == "Urnings1":
+                expected_results = int(rng.uniform() < self.conditional_probability(player.est, item.est))
+            elif self.alg_type == "Urnings2":
+                player_est = (player.score + result) / (player.urn_size + 1)
+                item_est = (item.score + 1 - result) / (item.urn_size + 1)
+                expected_results = int(rng.uniform() < self.conditional_probability(player_est, item_est))
+
         #urnings 1 algorithm 
-        if self.alg_type == "Urnings1":
+        elif self.alg_type == "Urnings1":
             #simulating the observed value
-            while player.sim_true_y == item.sim_true_y:
-                player.draw(true_score_logic = True)
-                item.draw(true_score_logic = True)
+            if result is None:
+                while player.sim_true_y == item.sim_true_y:
+                    player.draw(true_score_logic = True, rng = rng)
+                    item.draw(true_score_logic = True, rng = rng)
 
-            result = player.sim_true_y
-            player.sim_true_y = item.sim_true_y = 8
+                result = player.sim_true_y
+                player.sim_true_y = item.sim_true_y = 8
 
 
             #calculating expected score
             counter = 0
             while player.sim_y == item.sim_y and counter < 1000:
-                player.draw()
-                item.draw()
+                player.draw(rng = rng)
+                item.draw(rng = rng)
                 counter += 1
 
             expected_results = player.sim_y
@@ -110,20 +158,21 @@ class Game_Type:
         #urnings 2 algorithm
         elif self.alg_type == "Urnings2":
             #simulating the observed value
-            while player.sim_true_y == item.sim_true_y:
-                player.draw(true_score_logic = True)
-                item.draw(true_score_logic = True)
-            
-            result = player.sim_true_y
-            player.sim_true_y = item.sim_true_y = 8
+            if result is None:
+                while player.sim_true_y == item.sim_true_y:
+                    player.draw(true_score_logic = True, rng = rng)
+                    item.draw(true_score_logic = True, rng = rng)
+
+                result = player.sim_true_y
+                player.sim_true_y = item.sim_true_y = 8
 
             #calculating expected value
             player.est = (player.score + result) / (player.urn_size + 1)
             item.est = (item.score + 1 - result) / (item.urn_size + 1)
 
             while player.sim_y == item.sim_y:
-                    player.draw()
-                    item.draw()
+                    player.draw(rng = rng)
+                    item.draw(rng = rng)
                 
             expected_results = player.sim_y
             player.sim_y = item.sim_y = 8
@@ -133,6 +182,28 @@ class Game_Type:
             item.est = item.score / item.urn_size
 
         return result, expected_results
+
+    def draw_rule_batch(self,
+                        player_score: np.ndarray,
+                        player_urn_size: np.ndarray,
+                        player_true_value: np.ndarray,
+                        item_score: np.ndarray,
+                        item_urn_size: np.ndarray,
+                        item_true_value: np.ndarray,
+                        rng = GLOBAL_RNG):
+        #closed form draw_rule for many player item pairs at once
+        u = rng.random((2, len(player_score)))
+        result = (u[0] < self.conditional_probability(player_true_value, item_true_value)).astype(np.int64)
+
+        if self.alg_type == "Urnings1":
+            player_est = player_score / player_urn_size
+            item_est = item_score / item_urn_size
+        elif self.alg_type == "Urnings2":
+            player_est = (player_score + result) / (player_urn_size + 1)
+            item_est = (item_score + 1 - result) / (item_urn_size + 1)
+        expected_results = (u[1] < self.conditional_probability(player_est, item_est)).astype(np.int64)
+
+        return result, expected_results
   
     def updating_rule(self, 
                       player: Type[Player], 
@@ -159,12 +230,21 @@ class Game_Type:
             
         return player_prop, item_prop
     
-    def calculate_stakes(self, player:Type[Player], item:Type[Player], control_draws):
+    def permutation_p_value(self, conv_stat: np.ndarray, rng = GLOBAL_RNG):
+        #exact test from the table if the differences are from {-1, 0, 1}
+        if np.all(np.abs(conv_stat) <= 1):
+            return self.p_values[np.count_nonzero(conv_stat), abs(int(np.sum(conv_stat)))]
+
+        #otherwise a Monte Carlo test with n_permutations random sign flips
+        signs = 2 * rng.integers(0, 2, (self.n_permutations, len(conv_stat))) - 1
+        permute_means = np.mean(signs * conv_stat, axis=1)
+        return 1 - np.sum(permute_means < np.abs(np.mean(conv_stat)))/len(permute_means)
+
+    def calculate_stakes(self, player:Type[Player], item:Type[Player], control_draws, rng = GLOBAL_RNG):
         if self.adaptive_urn_type == "stakes_permutation":
             if len(player.differential_container) >= self.window:
                 conv_stat = player.differential_container[-self.window:]
-                permute_means = np.mean(self.all_comb * conv_stat, axis=1)
-                p_value = 1 - np.sum(permute_means < np.abs(np.mean(conv_stat)))/len(permute_means)
+                p_value = self.permutation_p_value(conv_stat, rng)
                 
                 if p_value < self.perm_p_val:
                     player.previous_stake = self.max_stakes
@@ -175,7 +255,7 @@ class Game_Type:
                 
         elif self.adaptive_urn_type == "stakes_second_order_urnings":
             if len(player.so_container) >= self.window and len(player.so_container) % self.window == 0:
-                    draw_urn_control = np.sum(np.random.binomial(1, np.mean(player.so_container[-self.window:]), control_draws))
+                    draw_urn_control = np.sum(rng.binomial(1, np.mean(player.so_container[-self.window:]), control_draws))
                     if (draw_urn_control == control_draws or draw_urn_control == 0) and player.previous_stake > self.min_stakes :
                         player.previous_stake = self.max_stakes
 
@@ -228,16 +308,16 @@ class Game_Type:
         
         return metropolis_corrector
 
-    def adaptivity_correction(self, player: Type[Player], item: Type[Player], player_proposal: int, item_proposal: int, adaptive_matrix_binned: np.ndarray, item_bins: dict):
+    def adaptivity_correction(self, player: Type[Player], item: Type[Player], player_proposal: int, item_proposal: int, adaptive_matrix_binned: np.ndarray, item_bins: Type[Item_Bins]):
         if self.adaptivity == "adaptive":
-            num_per_bin = [len(item_bins[str(i)]) for i in range(item.urn_size + 1)]
-            current_selection_prob = adaptive_matrix_binned[player.scaled_score, item.score] / np.sum(adaptive_matrix_binned[player.scaled_score, :] * num_per_bin)
+            current_selection_prob = adaptive_matrix_binned[player.scaled_score, item.score] / item_bins.normalisers[player.scaled_score]
 
-            new_num_per_bin = num_per_bin
-            new_num_per_bin[item.score] -= 1
-            new_num_per_bin[item_proposal] += 1
+            #normalising constant after moving the item from its current bin to the proposed one
             player_proposal_scaled = int(player_proposal * (self.max_urn / player.urn_size))
-            proposed_selection_prob = adaptive_matrix_binned[player_proposal_scaled, item_proposal] / np.sum(adaptive_matrix_binned[player_proposal_scaled, :] * new_num_per_bin)
+            proposed_normaliser = (item_bins.normalisers[player_proposal_scaled]
+                                   - adaptive_matrix_binned[player_proposal_scaled, item.score]
+                                   + adaptive_matrix_binned[player_proposal_scaled, item_proposal])
+            proposed_selection_prob = adaptive_matrix_binned[player_proposal_scaled, item_proposal] / proposed_normaliser
             adaptivity_corrector = proposed_selection_prob/current_selection_prob
             
         else:
@@ -245,78 +325,59 @@ class Game_Type:
         
         return adaptivity_corrector
 
-    def paired_update(self, item: Type[Player], items: list[Type[Player]], item_diff: int, queue_neg: dict, queue_pos: dict):
+    def paired_update(self, item: Type[Player], items: list[Type[Player]], item_diff: int, queue_neg: Type[Update_Queue], queue_pos: Type[Update_Queue], rng = GLOBAL_RNG):
         if self.item_pair_update == True:
             if item_diff == 1:
-                if all(i == 0 for i in list(queue_neg.values())):
-                    queue_pos[item.user_id] += 1
+                if queue_neg.is_empty():
+                    queue_pos.add(item.idx)
                     if item.score > 0:
                         item.score -= 1
                         item.est = item.score / item.urn_size 
                 else:
-                    candidates = {k:v for k,v in queue_neg.items() if v >= 1}
-                    idx = np.random.randint(0, len(candidates.keys()))
-                    candidate_user_id = list(candidates)[idx]
-                    
-                    for it in items:
-                        if it.user_id == candidate_user_id:
-                            candidate_item = it 
+                    candidate_item = items[queue_neg.random_pick(rng)]
                     
                     counter = 0
                     while candidate_item.score <= 0:
-                        candidates = {k:v for k,v in queue_neg.items() if v >= 1}
-                        idx = np.random.randint(0, len(candidates.keys()))
-                        candidate_user_id = list(candidates)[idx]
-                    
-                        for it in items:
-                            if it.user_id == candidate_user_id:
-                                candidate_item = it
+                        candidate_item = items[queue_neg.random_pick(rng)]
                         counter +=1 
                         if counter > 100:
                             break
                         
-                    queue_neg[candidate_user_id] = 0
+                    queue_neg.remove(candidate_item.idx)
                     candidate_item.score -= 1
                     candidate_item.est = candidate_item.score / candidate_item.urn_size
+                    return candidate_item
 
             elif item_diff == -1:
-                if all(i == 0 for i in list(queue_pos.values())):
-                    queue_neg[item.user_id] += 1
+                if queue_pos.is_empty():
+                    queue_neg.add(item.idx)
                     if item.score < item.urn_size:
                         item.score += 1
                         item.est = item.score / item.urn_size 
                 else:
-                    candidates = {k:v for k,v in queue_pos.items() if v >= 1}
-                    idx = np.random.randint(0, len(candidates.keys()))
-                    candidate_user_id = list(candidates)[idx]
-
-                    for it in items:
-                        if it.user_id == candidate_user_id:
-                            candidate_item = it
+                    candidate_item = items[queue_pos.random_pick(rng)]
                     
                     counter = 0
                     while candidate_item.score >= candidate_item.urn_size:
-                        candidates = {k:v for k,v in queue_pos.items() if v >= 1}
-                        idx = np.random.randint(0, len(candidates.keys()))
-                        candidate_user_id = list(candidates)[idx]
-
-                        for it in items:
-                            if it.user_id == candidate_user_id:
-                                candidate_item = it
+                        candidate_item = items[queue_pos.random_pick(rng)]
                         counter += 1
                         if counter > 100:
                             break
                     
-                    queue_pos[candidate_user_id] = 0
+                    queue_pos.remove(candidate_item.idx)
                     candidate_item.score += 1
                     candidate_item.est = candidate_item.score / candidate_item.urn_size
+                    return candidate_item
+
+        #the item whose score was changed by a paired update, None if only the played item changed
+        return None
 
-    def second_order_urnings(self, player: Type[Player], player_diff: int):
+    def second_order_urnings(self, player: Type[Player], player_diff: int, rng = GLOBAL_RNG):
         so_diff = player_diff
         if so_diff == -1:
             so_diff = 0
 
-        expected_result = np.random.binomial(1, player.so_est, 1)
+        expected_result = rng.binomial(1, player.so_est)
 
         player.so_score = player.so_score + so_diff - expected_result
 
@@ -324,7 +385,7 @@ class Game_Type:
     
 
           
-    def adaptive_urn_change(self, player: Type[Player], control_draws = 2):
+    def adaptive_urn_change(self, player: Type[Player], control_draws = 2, rng = GLOBAL_RNG):
         
         if self.adaptive_urn == True:
             if self.adaptive_urn_type == "permutation":
@@ -343,8 +404,7 @@ class Game_Type:
                             player.score =  player.score * 2
                             player.est = player.score / player.urn_size
                     else:
-                        permute_means = np.mean(self.all_comb * conv_stat, axis=1)
-                        p_value = 1 - np.sum(permute_means < np.abs(np.mean(conv_stat)))/len(permute_means)
+                        p_value = self.permutation_p_value(conv_stat, rng)
 
                         if p_value < self.perm_p_val:
                             change = player.urn_size / self.min_urn
@@ -358,7 +418,7 @@ class Game_Type:
 
             elif self.adaptive_urn_type == "second_order_urnings":
                 if len(player.so_container) >= self.window and len(player.so_container) % self.window == 0:
-                    draw_urn_control = np.sum(np.random.binomial(1, np.mean(player.so_container[-self.window:]), control_draws))
+                    draw_urn_control = np.sum(rng.binomial(1, np.mean(player.so_container[-self.window:]), control_draws))
                     if (draw_urn_control == control_draws or draw_urn_control == 0) and player.urn_container[-1] > self.min_urn:
                         change = player.urn_size / self.min_urn
                         player.score = int(np.round(player.score / change))
@@ -0,0 +1,464 @@
+import numpy as np
+import os
+from typing import Optional
+
+#fields stored for every player/item and their types
+HISTORY_FIELDS = {"container": np.int64,
+                  "estimate_container": np.float64,
+                  "differential_container": np.int64,
+                  "urn_container": np.int64,
+                  "so_container": np.float64,
+                  "stakes_container": np.int64}
+
+class History:
+    """
+    class History:
+        An array-backed store for the per-game histories of a group of players or items. Every field is kept in a
+        (rows x capacity) matrix which is preallocated or grows in chunks, so saving the result of a game costs O(1)
+        instead of copying the whole history like np.append does.
+
+        attributes:
+            n_rows: int
+                the number of players/items stored in the history
+            data: dict[str, np.ndarray]
+                field name -> (n_rows x capacity) matrix holding the saved values
+            lengths: dict[str, np.ndarray]
+                field name -> number of values saved for each row
+            chunk_size: int
+                the minimum number of columns added when a matrix runs out of capacity
+
+        methods:
+            merge(agents: list[Player], chunk_size: int = 64)
+                creates one history containing the rows of all the given players and binds the players to it, if the players
+                already share one history in row order (e.g. after load) it is reused without copying
+            add(agent: Player)
+                adds the history of a new player as the last row and binds the player to it
+            append(row: int, field: str, value)
+                saves a new value at the end of the row
+            append_rows(rows: np.ndarray, field: str, values: np.ndarray)
+                saves one new value at the end of each of the given (distinct) rows
+            extend_rows(rows: np.ndarray, values: dict[str, np.ndarray])
+                saves the values of the given fields at the end of the given rows in order, a row can occur more than once
+            view(row: int, field: str)
+                returns the saved values of a row as a view (this is what Player.container etc. return)
+            assign(row: int, field: str, values: np.ndarray)
+                overwrites the saved values of a row
+            assign_rows(rows: np.ndarray, field: str, values: np.ndarray, lengths: np.ndarray)
+                overwrites the saved values of the given rows with the first lengths values of the rows of a (rows x games) matrix
+            reserve(capacity: int)
+                makes sure that every row can hold at least capacity values without growing
+            matrix(field: str, rows: np.ndarray, width: int)
+                the first width saved values of the given rows as a (rows x width) matrix, the entries past the length of a row are not results
+            values(field: str, rows: np.ndarray, cols: np.ndarray)
+                the values saved at the given (row, column) positions
+            flush()
+                writes the pending values to disk (Mapped_History), nothing to do for an in-memory history
+            to_matrix(field: str, rows: Optional[np.ndarray] = None, fill: float = np.nan)
+                exports the field as a (players x games) matrix, shorter rows are padded with fill
+            save(path: str, prefix: str = "")
+                saves every field as <prefix><field>.npy and its lengths as <prefix><field>_lengths.npy into the directory path
+            load(path: str, prefix: str = "", mmap_mode: Optional[str] = "c", chunk_size: int = 64)
+                loads a saved history, by default the matrices are memory-mapped copy-on-write so only the touched pages are read.
+                The packed rows of Ragged_History.save are loaded as a Ragged_History
+    """
+    def __init__(self, n_rows: int, capacity: int = 1, chunk_size: int = 64):
+        self.n_rows = n_rows
+        self.chunk_size = chunk_size
+        self.data = {f : self._allocate(f, n_rows, capacity) for f in HISTORY_FIELDS}
+        self.lengths = {f : np.zeros(n_rows, dtype=np.int64) for f in HISTORY_FIELDS}
+
+    @classmethod
+    def merge(cls, agents: list, chunk_size: int = 64):
+        if len(agents) > 0:
+            shared = agents[0].history
+            if shared.n_rows == len(agents) and all(ag.history is shared and ag.history_row == row for row, ag in enumerate(agents)):
+                return shared
+
+        capacity = 1
+        for ag in agents:
+            for f in HISTORY_FIELDS:
+                capacity = max(capacity, ag.history.lengths[f][ag.history_row])
+
+        history = cls(len(agents), capacity, chunk_size)
+        for row, ag in enumerate(agents):
+            for f in HISTORY_FIELDS:
+                history.assign(row, f, ag.history.view(ag.history_row, f))
+            ag.history = history
+            ag.history_row = row
+
+        return history
+
+    def _allocate(self, field: str, n_rows: int, capacity: int):
+        #a new zero matrix of the field, Mapped_History creates it on disk
+        return np.zeros((n_rows, capacity), dtype=HISTORY_FIELDS[field])
+
+    def _replace(self, field: str, data: np.ndarray):
+        #called once the values are copied into the matrix returned by _allocate
+        self.data[field] = data
+
+    def _grow(self, field: str, needed: int):
+        capacity = self.data[field].shape[1]
+        new_capacity = max(needed, 2 * capacity, capacity + self.chunk_size)
+        new_data = self._allocate(field, self.data[field].shape[0], new_capacity)
+        new_data[:, :capacity] = self.data[field]
+        self._replace(field, new_data)
+
+    def add(self, agent):
+        #the agent is already stored here (e.g. a Player_View of a population sharing this history)
+        if agent.history is self:
+            return agent.history_row
+
+        #adding a new row at the end, the matrices get spare rows so adding players one by one stays cheap
+        row = self.n_rows
+        if row == self.data["container"].shape[0]:
+            new_rows = max(1, 2 * row)
+            for f in HISTORY_FIELDS:
+                data = self._allocate(f, new_rows, self.data[f].shape[1])
+                data[:row] = self.data[f]
+                self._replace(f, data)
+                self.lengths[f] = np.concatenate([self.lengths[f], np.zeros(new_rows - row, dtype=np.int64)])
+        self.n_rows += 1
+
+        for f in HISTORY_FIELDS:
+            self.assign(row, f, agent.history.view(agent.history_row, f))
+        agent.history = self
+        agent.history_row = row
+        return row
+
+    def append(self, row: int, field: str, value):
+        length = self.lengths[field][row]
+        if length == self.data[field].shape[1]:
+            self._grow(field, length + 1)
+        self.data[field][row, length] = value
+        self.lengths[field][row] = length + 1
+
+    def append_rows(self, rows: np.ndarray, field: str, values: np.ndarray):
+        cols = self.lengths[field][rows]
+        if len(cols) > 0 and np.max(cols) >= self.data[field].shape[1]:
+            self._grow(field, np.max(cols) + 1)
+        self.data[field][rows, cols] = values
+        self.lengths[field][rows] = cols + 1
+
+    @staticmethod
+    def _group_ranks(rows: np.ndarray):
+        #the k-th occurrence of a row gets rank k, also returns the distinct rows and their number of occurrences
+        order = np.argsort(rows, kind="stable")
+        sorted_rows = rows[order]
+        group_start = np.flatnonzero(np.r_[True, sorted_rows[1:] != sorted_rows[:-1]])
+        group_sizes = np.diff(np.r_[group_start, len(rows)])
+        rank = np.empty(len(rows), dtype=np.int64)
+        rank[order] = np.arange(len(rows)) - np.repeat(group_start, group_sizes)
+        return rank, sorted_rows[group_start], group_sizes
+
+    def extend_rows(self, rows: np.ndarray, values: dict):
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows) == 0:
+            return
+
+        #the k-th value of a row goes k places after its current end
+        rank, distinct_rows, group_sizes = self._group_ranks(rows)
+        for field, field_values in values.items():
+            cols = self.lengths[field][rows] + rank
+            if np.max(cols) >= self.data[field].shape[1]:
+                self._grow(field, np.max(cols) + 1)
+            self.data[field][rows, cols] = field_values
+            self.lengths[field][distinct_rows] += group_sizes
+
+    def view(self, row: int, field: str):
+        return self.data[field][row, :self.lengths[field][row]]
+
+    def assign(self, row: int, field: str, values: np.ndarray):
+        values = np.ravel(values)
+        if len(values) > self.data[field].shape[1]:
+            self._grow(field, len(values))
+        self.data[field][row, :len(values)] = values
+        self.lengths[field][row] = len(values)
+
+    def assign_rows(self, rows: np.ndarray, field: str, values: np.ndarray, lengths: np.ndarray):
+        if values.shape[1] > self.data[field].shape[1]:
+            self._grow(field, values.shape[1])
+        self.data[field][rows, :values.shape[1]] = values
+        self.lengths[field][rows] = lengths
+
+    def reserve(self, capacity: int):
+        for f in HISTORY_FIELDS:
+            if capacity > self.data[f].shape[1]:
+                self._grow(f, capacity)
+
+    def matrix(self, field: str, rows: np.ndarray, width: int):
+        #the first width columns of the rows, a view for a slice of rows, the entries past the length of a row are not results
+        return self.data[field][rows, :width]
+
+    def values(self, field: str, rows: np.ndarray, cols: np.ndarray):
+        #the values saved at the given (row, column) positions
+        return self.data[field][rows, cols]
+
+    def flush(self):
+        #the in-memory history has nothing to write, see Mapped_History.flush
+        pass
+
+    def to_matrix(self, field: str, rows: Optional[np.ndarray] = None, fill: float = np.nan):
+        if rows is None:
+            rows = np.arange(self.n_rows)
+        lengths = self.lengths[field][rows]
+        n_games = np.max(lengths) if len(lengths) > 0 else 0
+
+        #equal length rows (e.g. Urnings.play(test = True)) can be copied without padding
+        if np.all(lengths == n_games):
+            return self.data[field][rows, :n_games].copy()
+
+        matrix = np.full((len(rows), n_games), fill, dtype=np.result_type(self.data[field].dtype, np.asarray(fill).dtype))
+        mask = np.arange(n_games) < lengths[:, None]
+        matrix[mask] = self.data[field][rows, :n_games][mask]
+        return matrix
+
+    def save(self, path: str, prefix: str = ""):
+        for f in HISTORY_FIELDS:
+            lengths = self.lengths[f][:self.n_rows]
+            n_games = int(np.max(lengths)) if self.n_rows > 0 else 0
+            np.save(os.path.join(path, prefix + f + ".npy"), self.data[f][:self.n_rows, :max(n_games, 1)])
+            np.save(os.path.join(path, prefix + f + "_lengths.npy"), lengths)
+
+    @classmethod
+    def load(cls, path: str, prefix: str = "", mmap_mode: Optional[str] = "c", chunk_size: int = 64):
+        #the packed rows written by Ragged_History.save are loaded as they are
+        if cls is History and os.path.exists(os.path.join(path, prefix + "container_flat.npy")):
+            return Ragged_History.load(path, prefix, mmap_mode, chunk_size)
+
+        lengths = np.load(os.path.join(path, prefix + "container_lengths.npy"))
+        history = cls(0, 1, chunk_size)
+        history.n_rows = len(lengths)
+        for f in HISTORY_FIELDS:
+            history.data[f] = np.load(os.path.join(path, prefix + f + ".npy"), mmap_mode=mmap_mode)
+            history.lengths[f] = np.load(os.path.join(path, prefix + f + "_lengths.npy"))
+        return history
+
+
+class Ragged_History(History):
+    """
+    class Ragged_History(History):
+        A History which keeps the values of every row in its own segment of one flat array per field (offsets + flat values), so the
+        memory grows with the number of saved values and not with rows x longest row like the matrices of History. A segment which runs
+        out of capacity is moved to the end of the flat array with at least twice the capacity, when the flat array is full the segments
+        are packed into a new one with as much free room as they take. The flat arrays hold at most about four times the saved values.
+        AlsData.replay uses it: in a real log a few very active learners or popular items would widen every row of the matrices.
+
+        attributes:
+            data: dict[str, np.ndarray]
+                field name -> the flat array of the segments
+            offsets, capacities: dict[str, np.ndarray]
+                field name -> the start and the capacity of the segment of each row
+            used: dict[str, int]
+                field name -> the end of the last segment in the flat array
+            (see History.__doc__() for the others)
+
+        methods:
+            from_history(history: History, block_size: int = 4096)
+                copies a history into a new Ragged_History, block_size rows at a time
+            (the methods of History, save writes the rows packed back to back into <field>_flat.npy with <field>_offsets.npy and
+            <field>_lengths.npy, so the files take as much room as the saved values, load reads this layout or the one of History.save)
+    """
+    def __init__(self, n_rows: int, capacity: int = 1, chunk_size: int = 64):
+        self.n_rows = n_rows
+        self.chunk_size = chunk_size
+        self.data = {f : np.zeros(n_rows * capacity, dtype=dt) for f, dt in HISTORY_FIELDS.items()}
+        self.offsets = {f : np.arange(n_rows, dtype=np.int64) * capacity for f in HISTORY_FIELDS}
+        self.capacities = {f : np.full(n_rows, capacity, dtype=np.int64) for f in HISTORY_FIELDS}
+        self.lengths = {f : np.zeros(n_rows, dtype=np.int64) for f in HISTORY_FIELDS}
+        self.used = {f : n_rows * capacity for f in HISTORY_FIELDS}
+
+    @staticmethod
+    def _positions(starts: np.ndarray, lengths: np.ndarray):
+        #the flat positions of lengths[i] consecutive values from starts[i], row after row
+        ends = np.cumsum(lengths)
+        return np.repeat(starts - ends + lengths, lengths) + np.arange(ends[-1] if len(ends) > 0 else 0)
+
+    def _move(self, field: str, rows: np.ndarray, starts: np.ndarray, data: np.ndarray):
+        lengths = self.lengths[field][rows]
+        data[self._positions(starts, lengths)] = self.data[field][self._positions(self.offsets[field][rows], lengths)]
+        self.offsets[field][rows] = starts
+
+    def _fit(self, field: str, rows: np.ndarray, needed: np.ndarray):
+        #makes room for needed values in the segments of the (distinct) rows
+        short = needed > self.capacities[field][rows]
+        if not np.any(short):
+            return
+        rows = rows[short]
+        capacities = np.maximum(needed[short], 2 * self.capacities[field][rows])
+        total = int(np.sum(capacities))
+
+        if self.used[field] + total <= len(self.data[field]):
+            #moving the segments to the free room at the end
+            starts = self.used[field] + np.cumsum(capacities) - capacities
+            self._move(field, rows, starts, self.data[field])
+            self.capacities[field][rows] = capacities
+            self.used[field] += total
+        else:
+            #packing every segment into a new flat array, the free room is as large as the segments
+            self.capacities[field][rows] = capacities
+            all_rows = np.arange(len(self.capacities[field]))
+            live = int(np.sum(self.capacities[field]))
+            data = np.zeros(max(2 * live, self.chunk_size), dtype=HISTORY_FIELDS[field])
+            self._move(field, all_rows, np.cumsum(self.capacities[field]) - self.capacities[field], data)
+            self.data[field] = data
+            self.used[field] = live
+
+    def _fit_row(self, field: str, row: int, needed: int):
+        #_fit for a single row without the array overhead, used for the new rows of History.add and Player.container
+        if needed <= self.capacities[field][row]:
+            return
+        capacity = max(needed, 2 * int(self.capacities[field][row]))
+        start = self.used[field]
+        if start + capacity > len(self.data[field]):
+            self._fit(field, np.array([row]), np.array([needed]))
+            return
+        old_start, length = self.offsets[field][row], self.lengths[field][row]
+        self.data[field][start:start + length] = self.data[field][old_start:old_start + length]
+        self.offsets[field][row] = start
+        self.capacities[field][row] = capacity
+        self.used[field] = start + capacity
+
+    @classmethod
+    def from_history(cls, history: History, block_size: int = 4096):
+        ragged = cls(history.n_rows, 0, history.chunk_size)
+        for start in range(0, history.n_rows, block_size):
+            rows = np.arange(start, min(start + block_size, history.n_rows))
+            for f in HISTORY_FIELDS:
+                lengths = history.lengths[f][rows]
+                width = int(np.max(lengths, initial=0))
+                ragged.assign_rows(rows, f, history.matrix(f, rows, width), lengths)
+        return ragged
+
+    @classmethod
+    def merge(cls, agents: list, chunk_size: int = 64):
+        return cls.from_history(History.merge(agents, chunk_size))
+
+    def add(self, agent):
+        if agent.history is self:
+            return agent.history_row
+
+        #the row arrays get spare rows like the matrices of History, an empty segment takes no room
+        row = self.n_rows
+        if row == len(self.lengths["container"]):
+            new_rows = max(1, 2 * row)
+            for f in HISTORY_FIELDS:
+                for arrays in [self.offsets, self.capacities, self.lengths]:
+                    arrays[f] = np.concatenate([arrays[f], np.zeros(new_rows - row, dtype=np.int64)])
+        self.n_rows += 1
+
+        for f in HISTORY_FIELDS:
+            self.assign(row, f, agent.history.view(agent.history_row, f))
+        agent.history = self
+        agent.history_row = row
+        return row
+
+    def append(self, row: int, field: str, value):
+        length = self.lengths[field][row]
+        self._fit_row(field, row, length + 1)
+        self.data[field][self.offsets[field][row] + length] = value
+        self.lengths[field][row] = length + 1
+
+    def append_rows(self, rows: np.ndarray, field: str, values: np.ndarray):
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = self.lengths[field][rows]
+        self._fit(field, rows, cols + 1)
+        self.data[field][self.offsets[field][rows] + cols] = values
+        self.lengths[field][rows] = cols + 1
+
+    def extend_rows(self, rows: np.ndarray, values: dict):
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows) == 0:
+            return
+
+        rank, distinct_rows, group_sizes = self._group_ranks(rows)
+        for field, field_values in values.items():
+            self._fit(field, distinct_rows, self.lengths[field][distinct_rows] + group_sizes)
+            self.data[field][self.offsets[field][rows] + self.lengths[field][rows] + rank] = field_values
+            self.lengths[field][distinct_rows] += group_sizes
+
+    def view(self, row: int, field: str):
+        start = self.offsets[field][row]
+        return self.data[field][start:start + self.lengths[field][row]]
+
+    def assign(self, row: int, field: str, values: np.ndarray):
+        values = np.ravel(values)
+        self._fit_row(field, row, len(values))
+        start = self.offsets[field][row]
+        self.data[field][start:start + len(values)] = values
+        self.lengths[field][row] = len(values)
+
+    def assign_rows(self, rows: np.ndarray, field: str, values: np.ndarray, lengths: np.ndarray):
+        rows = np.asarray(rows, dtype=np.int64)
+        lengths = np.asarray(lengths, dtype=np.int64)
+        self._fit(field, rows, lengths)
+        saved = np.arange(values.shape[1]) < lengths[:, None]
+        self.data[field][self._positions(self.offsets[field][rows], lengths)] = values[saved]
+        self.lengths[field][rows] = lengths
+
+    def reserve(self, capacity: int):
+        rows = np.arange(self.n_rows)
+        for f in HISTORY_FIELDS:
+            self._fit(f, rows, np.full(self.n_rows, capacity, dtype=np.int64))
+
+    def matrix(self, field: str, rows: np.ndarray, width: int):
+        rows = np.arange(self.n_rows)[rows] if isinstance(rows, slice) else np.asarray(rows, dtype=np.int64)
+        lengths = np.minimum(self.lengths[field][rows], width)
+        matrix = np.zeros((len(rows), width), dtype=HISTORY_FIELDS[field])
+        matrix[np.arange(width) < lengths[:, None]] = self.data[field][self._positions(self.offsets[field][rows], lengths)]
+        return matrix
+
+    def values(self, field: str, rows: np.ndarray, cols: np.ndarray):
+        return self.data[field][self.offsets[field][rows] + cols]
+
+    def to_matrix(self, field: str, rows: Optional[np.ndarray] = None, fill: float = np.nan):
+        if rows is None:
+            rows = np.arange(self.n_rows)
+        lengths = self.lengths[field][rows]
+        n_games = np.max(lengths) if len(lengths) > 0 else 0
+
+        matrix = np.full((len(rows), n_games), fill, dtype=np.result_type(HISTORY_FIELDS[field], np.asarray(fill).dtype))
+        matrix[np.arange(n_games) < lengths[:, None]] = self.data[field][self._positions(self.offsets[field][rows], lengths)]
+        return matrix
+
+    def save(self, path: str, prefix: str = ""):
+        #the rows packed back to back (<field>_flat.npy) with the start (<field>_offsets.npy) and the length (<field>_lengths.npy) of each row
+        for f in HISTORY_FIELDS:
+            lengths = self.lengths[f][:self.n_rows]
+            np.save(os.path.join(path, prefix + f + "_flat.npy"), self.data[f][self._positions(self.offsets[f][:self.n_rows], lengths)])
+            np.save(os.path.join(path, prefix + f + "_offsets.npy"), np.cumsum(lengths) - lengths)
+            np.save(os.path.join(path, prefix + f + "_lengths.npy"), lengths)
+
+    @classmethod
+    def load(cls, path: str, prefix: str = "", mmap_mode: Optional[str] = "c", chunk_size: int = 64):
+        if not os.path.exists(os.path.join(path, prefix + "container_flat.npy")):
+            #a history saved in the matrix layout of History.save
+            return cls.from_history(History.load(path, prefix, mmap_mode, chunk_size))
+
+        history = cls(0, 0, chunk_size)
+        for f in HISTORY_FIELDS:
+            #the packed rows have no free room, the first row which grows moves the segments into memory
+            history.data[f] = np.load(os.path.join(path, prefix + f + "_flat.npy"), mmap_mode=mmap_mode)
+            history.offsets[f] = np.load(os.path.join(path, prefix + f + "_offsets.npy"))
+            history.lengths[f] = np.load(os.path.join(path, prefix + f + "_lengths.npy"))
+            history.capacities[f] = history.lengths[f].copy()
+            history.used[f] = len(history.data[f])
+        history.n_rows = len(history.lengths["container"])
+        return history
+
+
+class History_Field:
+    """
+    class History_Field:
+        A descriptor which exposes one field of the History of a Player as an attribute (e.g. Player.container),
+        reading returns a view of the saved values, assigning overwrites them.
+    """
+    def __init__(self, field: str):
+        self.field = field
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        return obj.history.view(obj.history_row, self.field)
+
+    def __set__(self, obj, values):
+        obj.history.assign(obj.history_row, self.field, values)
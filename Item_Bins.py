@@ -0,0 +1,127 @@
+import numpy as np
+from typing import Optional, Type
+from Agents import Player
+from Random_Streams import GLOBAL_RNG
+
+class Item_Bins:
+    """
+    class Item_Bins:
+        An index of the items by their current score (bin) used by the adaptive item selection. Each bin keeps its members in a
+        preallocated array with a position map, so moving an item to another bin is O(1) and the index never has to be rebuilt.
+
+        attributes:
+            n_bins: int
+                the number of bins (item urn size + 1)
+            counts: np.ndarray
+                the number of items in each bin
+            members: np.ndarray
+                (n_bins x capacity) array, the first counts[b] elements of row b are the idx of the items in bin b
+            position: np.ndarray
+                the position of every item within the row of its bin
+            bin_of: np.ndarray
+                the bin every item is placed in
+            weights: np.ndarray
+                (player bins x n_bins) selection weights of the item bins (Urnings.adaptive_matrix_binned), optional
+            normalisers: np.ndarray
+                weights @ counts, the normalising constant of the item selection probabilities for every player bin. It is updated
+                incrementally when an item changes bin (only if weights is given)
+
+        methods:
+            add(item: Player)
+                places a new item in the bin of its score
+            move(idx: int, new_bin: int)
+                moves the item with the given idx to a new bin
+            update(item: Player)
+                moves the item to the bin of its current score if it changed, returns the previous bin
+            bin_members(b: int)
+                returns the idx of the items in bin b
+            all_members()
+                returns the idx of all items ordered by bin
+            random_bin(weights: np.ndarray, rng = GLOBAL_RNG)
+                draws a bin with probability proportional to weights * counts (the selection weight of each item times the number of items)
+            random_member(b: int, rng = GLOBAL_RNG)
+                draws an item idx uniformly from bin b
+            random_members(weights: np.ndarray, rows: np.ndarray, rng = GLOBAL_RNG)
+                random_bin and random_member for many players at once, the bins of player k are weighted by weights[rows[k]] * counts
+    """
+    def __init__(self, items: list[Type[Player]], n_bins: int, weights: Optional[np.ndarray] = None):
+        self.n_bins = n_bins
+        self.weights = weights
+        self.counts = np.zeros(n_bins, dtype=np.int64)
+        self.members = np.zeros((n_bins, max(len(items), 1)), dtype=np.int64)
+        self.position = np.zeros(max(len(items), 1), dtype=np.int64)
+        self.bin_of = np.zeros(max(len(items), 1), dtype=np.int64)
+        self.normalisers = None if weights is None else np.zeros(weights.shape[0])
+
+        for it in items:
+            self.add(it)
+
+    def _reserve(self, n_items: int):
+        capacity = len(self.position)
+        if n_items > capacity:
+            new_capacity = max(n_items, 2 * capacity)
+            members = np.zeros((self.n_bins, new_capacity), dtype=np.int64)
+            members[:, :capacity] = self.members
+            self.members = members
+            self.position = np.concatenate([self.position, np.zeros(new_capacity - capacity, dtype=np.int64)])
+            self.bin_of = np.concatenate([self.bin_of, np.zeros(new_capacity - capacity, dtype=np.int64)])
+
+    def _insert(self, idx: int, b: int):
+        self.members[b, self.counts[b]] = idx
+        self.position[idx] = self.counts[b]
+        self.bin_of[idx] = b
+        self.counts[b] += 1
+
+    def add(self, item: Type[Player]):
+        self._reserve(item.idx + 1)
+        self._insert(item.idx, int(item.score))
+
+        if self.normalisers is not None:
+            self.normalisers += self.weights[:, int(item.score)]
+
+    def move(self, idx: int, new_bin: int):
+        old_bin = self.bin_of[idx]
+        if old_bin == new_bin:
+            return
+
+        #replacing the item with the last member of its bin
+        last = self.members[old_bin, self.counts[old_bin] - 1]
+        self.members[old_bin, self.position[idx]] = last
+        self.position[last] = self.position[idx]
+        self.counts[old_bin] -= 1
+
+        self._insert(idx, new_bin)
+
+        if self.normalisers is not None:
+            self.normalisers += self.weights[:, new_bin] - self.weights[:, old_bin]
+
+    def update(self, item: Type[Player]):
+        old_bin = int(self.bin_of[item.idx])
+        self.move(item.idx, int(item.score))
+        return old_bin
+
+    def bin_members(self, b: int):
+        return self.members[b, :self.counts[b]]
+
+    def all_members(self):
+        return np.concatenate([self.bin_members(b) for b in range(self.n_bins)])
+
+    def random_bin(self, weights: np.ndarray, rng = GLOBAL_RNG):
+        cumulative = np.cumsum(weights * self.counts)
+        #keeping the draw below the total so an empty last bin can never be chosen
+        u = min(rng.uniform() * cumulative[-1], np.nextafter(cumulative[-1], 0))
+        return int(np.searchsorted(cumulative, u, side="right"))
+
+    def random_member(self, b: int, rng = GLOBAL_RNG):
+        return int(self.members[b, rng.integers(0, self.counts[b])])
+
+    def random_members(self, weights: np.ndarray, rows: np.ndarray, rng = GLOBAL_RNG):
+        cumulative = np.cumsum(weights * self.counts, axis=1)
+        u = rng.random((2, len(rows)))
+        bins = np.empty(len(rows), dtype=np.int64)
+        for r in np.unique(rows):
+            selected = rows == r
+            total = cumulative[r, -1]
+            bins[selected] = np.searchsorted(cumulative[r], np.minimum(u[0, selected] * total, np.nextafter(total, 0)), side="right")
+        within = (u[1] * self.counts[bins]).astype(np.int64)
+        return self.members[bins, within]
@@ -0,0 +1,199 @@
+import numpy as np
+from typing import Optional, Type
+from Game_Type import Game_Type
+from Selection_Kernels import binned_selection_matrix
+
+
+class Markov_Engine:
+    """
+    class Markov_Engine:
+        The exact alternative to simulating many learners. With a fixed item bank the urn score of a learner with true value theta is a
+        Markov chain on 0..urn_size: a game picks an item (uniformly in n_adaptive mode, with the selection weights of the item bins in
+        adaptive mode), the outcome is drawn from the true values, the expected outcome from the urns, and the proposal of
+        Game_Type.updating_rule is accepted with the Metropolis and adaptivity corrections of Game_Type. The engine builds the transition
+        matrices of these chains for many true values at once and propagates the exact score distributions, so the MAD curve of
+        Replications.mad_curve is computed without Monte Carlo noise.
+
+        The item scores stay fixed (the items are not updated, so the paired update has no effect), every game follows the rules of
+        Urnings.urnings_game otherwise. Supported options: alg_type "Urnings1" and "Urnings2", adaptivity "adaptive" and "n_adaptive",
+        no adaptive urn size algorithms.
+
+        attributes:
+            game_type: Game_Type
+                the Game_Type object governing the game
+            player_urn_size: int
+                the urn size of the learners
+            item_scores, item_true_values: np.ndarray
+                the fixed scores and the true values of the items
+            item_urn_size: int
+                the urn size of the items
+            adaptive_matrix_binned: np.ndarray
+                the selection weight of the item bins for each scaled player score (see Urnings.adaptive_matrix_binned)
+            selection: np.ndarray
+                (scores x item bins) the probability of selecting a given item of each bin for each player score
+            kernels: np.ndarray
+                (item bins x 2 x scores x scores) the transition probabilities of the player score given the bin of the selected item and
+                the outcome, they do not depend on the true value of the learner. The score moves by at most one ball per game, so every
+                transition matrix is tridiagonal
+
+        methods:
+            from_urnings(urnings: Urnings)
+                creates the engine for the game type, urn sizes and current item bank of an Urnings object
+            transition_matrices(thetas: np.ndarray)
+                the (thetas x scores x scores) transition matrices of learners with the given true values
+            propagate(thetas: np.ndarray, n_games: int, start: Optional[int] = None)
+                yields the exact (thetas x scores) score distributions after 0..n_games games, every learner starts at start (half of the urn by default)
+            distributions(thetas: np.ndarray, n_games: int, start: Optional[int] = None)
+                the distributions of propagate stacked, shape (thetas x n_games + 1 x scores)
+            mad_curve(thetas: np.ndarray, n_games: int, start: Optional[int] = None, weights: Optional[np.ndarray] = None)
+                the expected mean absolute distance of the estimates from the true values after 0..n_games games
+    """
+    def __init__(self,
+                 game_type: Type[Game_Type],
+                 player_urn_size: int,
+                 item_scores: np.ndarray,
+                 item_true_values: np.ndarray,
+                 item_urn_size: int):
+
+        self.check_game_type(game_type)
+        self.game_type = game_type
+        self.player_urn_size = int(player_urn_size)
+        self.item_scores = np.asarray(item_scores, dtype=np.int64)
+        self.item_true_values = np.asarray(item_true_values, dtype=np.float64)
+        self.item_urn_size = int(item_urn_size)
+
+        if len(self.item_scores) == 0:
+            raise ValueError("The item bank is empty.")
+        if np.any(np.isnan(self.item_true_values)):
+            raise ValueError("Every item needs a true value.")
+
+        #Urnings uses the player urn size as max_urn without adaptive urns
+        self.max_urn = self.player_urn_size
+        self.adaptive_matrix_binned = binned_selection_matrix(self.max_urn, self.item_urn_size, game_type.selection_kernel, **game_type.kernel_args)
+
+        self.selection = self.selection_probabilities()
+        self.kernels = self.transition_kernels()
+
+    @staticmethod
+    def check_game_type(game_type: Type[Game_Type]):
+        if game_type.alg_type not in ["Urnings1", "Urnings2"]:
+            raise ValueError("Markov_Engine supports alg_type 'Urnings1' and 'Urnings2'.")
+        if game_type.adaptivity not in ["adaptive", "n_adaptive"]:
+            raise ValueError("Markov_Engine supports adaptivity 'adaptive' and 'n_adaptive'.")
+        if game_type.adaptive_urn == True:
+            raise ValueError("Markov_Engine does not support the adaptive urn size algorithms, the urn size has to be fixed.")
+
+    @classmethod
+    def from_urnings(cls, urnings):
+        return cls(urnings.game_type,
+                   urnings.player_urn_size,
+                   [it.score for it in urnings.items],
+                   [np.nan if it.true_value is None else it.true_value for it in urnings.items],
+                   urnings.item_urn_size)
+
+    def scaled_scores(self, scores: np.ndarray):
+        return (scores * (self.max_urn / self.player_urn_size)).astype(np.int64)
+
+    def selection_probabilities(self):
+        scores = np.arange(self.player_urn_size + 1)
+        n_bins = self.item_urn_size + 1
+        if self.game_type.adaptivity == "n_adaptive":
+            return np.full((len(scores), n_bins), 1 / len(self.item_scores))
+
+        #a bin is picked with probability weight * count (Item_Bins.random_bin), then one of its items uniformly
+        counts = np.bincount(self.item_scores, minlength=n_bins)
+        weights = self.adaptive_matrix_binned[self.scaled_scores(scores)]
+        return weights / (weights @ counts)[:, None]
+
+    def transition_kernels(self):
+        gt = self.game_type
+        n, m = self.player_urn_size, self.item_urn_size
+        #every (item bin, outcome, player score, expected outcome) combination
+        j, y, s, x = np.meshgrid(np.arange(m + 1), np.arange(2), np.arange(n + 1), np.arange(2), indexing="ij")
+
+        #probability of the expected outcome x given the player score, the item score and the outcome (Game_Type.draw_rule)
+        if gt.alg_type == "Urnings1":
+            q = gt.conditional_probability(s / n, j / m)
+        else:
+            q = gt.conditional_probability((s + y) / (n + 1), (j + 1 - y) / (m + 1))
+        p_x = np.where(x == 1, q, 1 - q)
+
+        #Game_Type.updating_rule
+        player_proposal = np.clip(s + y - x, 0, n)
+        item_proposal = np.clip(j + (1 - y) - (1 - x), 0, m)
+
+        #Game_Type.metropolis_correction, a division by zero is caught by urnings_game and counts as 1
+        if gt.alg_type == "Urnings1":
+            old_score = s * (n - j) + (m - s) * j
+            new_score = player_proposal * (n - item_proposal) + (m - player_proposal) * item_proposal
+            with np.errstate(divide="ignore", invalid="ignore"):
+                metropolis_corrector = np.where(new_score == 0, 1, old_score / np.where(new_score == 0, 1, new_score))
+        else:
+            metropolis_corrector = np.ones(player_proposal.shape)
+
+        #Game_Type.adaptivity_correction with the normalisers of the fixed item bins
+        if gt.adaptivity == "adaptive":
+            w = self.adaptive_matrix_binned
+            counts = np.bincount(self.item_scores, minlength=m + 1)
+            normalisers = w @ counts
+            k = self.scaled_scores(s)
+            k_proposal = self.scaled_scores(player_proposal)
+            current_selection_prob = w[k, j] / normalisers[k]
+            proposed_normaliser = normalisers[k_proposal] - w[k_proposal, j] + w[k_proposal, item_proposal]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                adaptivity_corrector = (w[k_proposal, item_proposal] / proposed_normaliser) / current_selection_prob
+        else:
+            adaptivity_corrector = 1
+
+        #min(1, nan) is 1 in urnings_game
+        ratio = metropolis_corrector * adaptivity_corrector
+        acceptance = np.where(np.isnan(ratio), 1, np.minimum(1, ratio))
+
+        kernels = np.zeros((m + 1, 2, n + 1, n + 1))
+        accepted = p_x * acceptance
+        np.add.at(kernels, (j, y, s, player_proposal), accepted)
+        np.add.at(kernels, (j, y, s, s), p_x - accepted)
+        return kernels
+
+    def transition_matrices(self, thetas: np.ndarray):
+        thetas = np.atleast_1d(np.asarray(thetas, dtype=np.float64))
+
+        #probability of every outcome summed over the items of each bin, (thetas x item bins x 2)
+        p_correct = self.game_type.conditional_probability(thetas[:, None], self.item_true_values[None, :])
+        bins = np.zeros((len(self.item_scores), self.item_urn_size + 1))
+        bins[np.arange(len(self.item_scores)), self.item_scores] = 1
+        outcome = np.stack([(1 - p_correct) @ bins, p_correct @ bins], axis=2)
+
+        #T[t, s, s'] = sum over bins and outcomes of selection[s, bin] * outcome[t, bin, y] * kernels[bin, y, s, s']
+        weighted = self.kernels * self.selection.T[:, None, :, None]
+        return np.einsum("tjy,jyab->tab", outcome, weighted, optimize=True)
+
+    def propagate(self, thetas: np.ndarray, n_games: int, start: Optional[int] = None):
+        matrices = self.transition_matrices(thetas)
+        start = self.player_urn_size // 2 if start is None else start
+
+        #a game moves the score by at most one ball, so the matrices are tridiagonal and a step costs O(thetas x scores)
+        scores = np.arange(self.player_urn_size + 1)
+        stay = matrices[:, scores, scores]
+        up = matrices[:, scores[:-1], scores[1:]]
+        down = matrices[:, scores[1:], scores[:-1]]
+
+        distribution = np.zeros((matrices.shape[0], self.player_urn_size + 1))
+        distribution[:, start] = 1
+        yield distribution
+        for g in range(n_games):
+            moved = distribution * stay
+            moved[:, 1:] += distribution[:, :-1] * up
+            moved[:, :-1] += distribution[:, 1:] * down
+            distribution = moved
+            yield distribution
+
+    def distributions(self, thetas: np.ndarray, n_games: int, start: Optional[int] = None):
+        return np.stack(list(self.propagate(thetas, n_games, start)), axis=1)
+
+    def mad_curve(self, thetas: np.ndarray, n_games: int, start: Optional[int] = None, weights: Optional[np.ndarray] = None):
+        #the learners play one game per round like Urnings.play(test = True), weights are the shares of the true values (equal by default)
+        thetas = np.atleast_1d(np.asarray(thetas, dtype=np.float64))
+        estimates = np.arange(self.player_urn_size + 1) / self.player_urn_size
+        distance = np.abs(estimates[None, :] - thetas[:, None])
+        return np.array([np.average(np.sum(distribution * distance, axis=1), weights=weights) for distribution in self.propagate(thetas, n_games, start)])
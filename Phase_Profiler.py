@@ -0,0 +1,182 @@
+import time
+from functools import wraps
+
+#phase name -> (attribute holding the object, method names), the methods of urnings_game timed in each phase
+PHASES = {"matchmaking": ("urnings", ["matchmaking"]),
+          "draw": ("game_type", ["draw_rule"]),
+          "update": ("game_type", ["updating_rule", "updating_with_stakes", "calculate_stakes"]),
+          "metropolis_correction": ("game_type", ["adaptivity_correction", "metropolis_correction"]),
+          "paired_update": ("game_type", ["paired_update"]),
+          "item_bins": ("item_bins", ["update"]),
+          "container_appends": ("history", ["append"]),
+          "second_order_urnings": ("game_type", ["second_order_urnings"]),
+          "adaptive_urn_change": ("game_type", ["adaptive_urn_change"])}
+
+
+class Counting_RNG:
+    """
+    class Counting_RNG:
+        Passes every draw to the wrapped random stream and records the results of the Bernoulli draws, so the iterations of
+        the rejection loops of Game_Type.draw_rule can be counted without touching draw_rule itself.
+    """
+    def __init__(self, rng):
+        self.rng = rng
+        self.bernoulli = []
+
+    def uniform(self):
+        return self.rng.uniform()
+
+    def random(self, size=None):
+        return self.rng.random(size)
+
+    def binomial(self, n, p, size=None):
+        draw = self.rng.binomial(n, p, size)
+        if n == 1 and size is None:
+            self.bernoulli.append(draw)
+        return draw
+
+    def integers(self, low, high, size=None):
+        return self.rng.integers(low, high, size)
+
+
+class Phase_Profiler:
+    """
+    class Phase_Profiler:
+        Opt-in instrumentation of Urnings.urnings_game. attach() wraps the methods called in each phase of a game with timers on the
+        instances (Urnings, its Game_Type, Item_Bins and Histories), detach() removes the wrappers again, so nothing is measured and
+        nothing is paid while it is not attached. Only the games played by the Python engine are instrumented.
+        Enabled by Urnings.enable_profiling(). The Game_Type is instrumented as well, so other Urnings objects sharing it are measured too.
+
+        attributes:
+            seconds: dict[str, float]
+                phase -> the total time spent in the phase ("game" is the whole urnings_game)
+            calls: dict[str, int]
+                phase -> the number of calls of the phase
+            games: int
+                the number of games played while attached
+            accepted: int
+                the number of accepted Metropolis proposals (the increase of Urnings.bugfix)
+            observed_draws: int
+                the iterations of the rejection loop simulating the observed outcome
+            expected_draws: int
+                the iterations of the rejection loop simulating the expected outcome
+
+        methods:
+            attach(urnings: Urnings)
+                instruments the urnings object
+            detach()
+                removes the instrumentation
+            reset()
+                sets every timer and counter to zero
+            report()
+                returns the timers and counters as a dict, with the share of each phase in the time of the games (matchmaking included),
+                the acceptance rate and the average number of rejection loop iterations per game
+    """
+    def __init__(self):
+        self.urnings = None
+        self.wrapped = []
+        self.reset()
+
+    def reset(self):
+        self.seconds = {phase : 0.0 for phase in ["game"] + list(PHASES)}
+        self.calls = {phase : 0 for phase in ["game"] + list(PHASES)}
+        self.active = {phase : False for phase in ["game"] + list(PHASES)}
+        self.games = 0
+        self.accepted = 0
+        self.observed_draws = 0
+        self.expected_draws = 0
+
+    def _timed(self, phase: str, method):
+        @wraps(method)
+        def timed(*args, **kwargs):
+            #nested calls within the same phase (e.g. updating_with_stakes calling updating_rule) are timed once
+            if self.active[phase]:
+                return method(*args, **kwargs)
+            self.active[phase] = True
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.seconds[phase] += time.perf_counter() - start
+                self.calls[phase] += 1
+                self.active[phase] = False
+        return timed
+
+    def _counted_draw_rule(self, method):
+        timed_method = self._timed("draw", method)
+
+        @wraps(method)
+        def draw_rule(player, item, rng, result=None):
+            counting_rng = Counting_RNG(rng)
+            draw = timed_method(player, item, counting_rng, result)
+
+            #the draws come in (player, item) pairs, the observed outcome is simulated first until the pair differs
+            pairs = list(zip(counting_rng.bernoulli[0::2], counting_rng.bernoulli[1::2]))
+            observed = 0
+            if result is None and self.urnings.game_type.draw_mode != "closed_form":
+                while observed < len(pairs) and pairs[observed][0] == pairs[observed][1]:
+                    observed += 1
+                observed = min(observed + 1, len(pairs))
+            self.observed_draws += observed
+            self.expected_draws += len(pairs) - observed
+            return draw
+        return draw_rule
+
+    def _wrap(self, obj, name: str, wrapper):
+        setattr(obj, name, wrapper)
+        self.wrapped.append((obj, name))
+
+    def attach(self, urnings):
+        if self.urnings is not None:
+            self.detach()
+        self.urnings = urnings
+
+        owners = {"urnings": [urnings], "game_type": [urnings.game_type], "item_bins": [urnings.item_bins],
+                  "history": [urnings.player_history, urnings.item_history]}
+        for phase, (owner, names) in PHASES.items():
+            for obj in owners[owner]:
+                for name in names:
+                    if phase == "draw":
+                        self._wrap(obj, name, self._counted_draw_rule(getattr(obj, name)))
+                    else:
+                        self._wrap(obj, name, self._timed(phase, getattr(obj, name)))
+
+        urnings_game = self._timed("game", urnings.urnings_game)
+
+        @wraps(urnings.urnings_game)
+        def counted_game(*args, **kwargs):
+            accepted = urnings.bugfix
+            value = urnings_game(*args, **kwargs)
+            self.games += 1
+            self.accepted += urnings.bugfix - accepted
+            return value
+        self._wrap(urnings, "urnings_game", counted_game)
+
+    def detach(self):
+        #deleting the instance attributes uncovers the methods of the classes again
+        for obj, name in self.wrapped:
+            if name in vars(obj):
+                delattr(obj, name)
+        self.wrapped = []
+        self.urnings = None
+
+    def report(self):
+        #matchmaking runs before urnings_game, the other phases within it
+        total_seconds = max(self.seconds["game"] + self.seconds["matchmaking"], 1e-12)
+        phases = {}
+        for phase in PHASES:
+            phases[phase] = {"seconds": self.seconds[phase],
+                             "calls": self.calls[phase],
+                             "share": self.seconds[phase] / total_seconds}
+        in_game = sum(phases[phase]["seconds"] for phase in PHASES if phase != "matchmaking")
+        phases["other"] = {"seconds": max(0.0, self.seconds["game"] - in_game), "calls": self.calls["game"]}
+        phases["other"]["share"] = phases["other"]["seconds"] / total_seconds
+
+        games = max(self.games, 1)
+        return {"games": self.games,
+                "seconds": total_seconds,
+                "us_per_game": 1e6 * total_seconds / games,
+                "phases": phases,
+                "acceptance_rate": self.accepted / games,
+                "observed_draws_per_game": self.observed_draws / games,
+                "expected_draws_per_game": self.expected_draws / games}
@@ -0,0 +1,221 @@
+import numpy as np
+from typing import Optional, Type
+from Agents import Player
+from History import History, History_Field
+
+#per player scalars stored by a Population and their types
+POPULATION_FIELDS = {"score": np.int64,
+                     "urn_size": np.int64,
+                     "est": np.float64,
+                     "true_value": np.float64,
+                     "sim_y": np.int64,
+                     "sim_true_y": np.int64,
+                     "so_urn_size": np.int64,
+                     "so_score": np.int64,
+                     "so_est": np.float64,
+                     "previous_stake": np.int64,
+                     "idx": np.int64,
+                     "scaled_score": np.int64}
+
+class Population:
+    """
+    class Population:
+        A struct-of-arrays store for a large group of players or items. Every scalar attribute of Player is kept in one typed
+        array and the containers in one shared History, the players themselves are handed out as lightweight Player_View objects.
+        A million players cost a few arrays instead of a million Player objects with six arrays each.
+
+        attributes:
+            n: int
+                the number of players in the population
+            user_ids: list
+                the user ids of the players
+            fields: dict[str, np.ndarray]
+                field name -> array holding the attribute of every player (see POPULATION_FIELDS), a missing true value is nan
+            history: History
+                the History storing the containers of the players, row i belongs to player i
+
+        methods:
+            from_players(players: list[Player])
+                creates a population from existing Player objects (their histories are merged into the population's)
+            add(player: Player)
+                appends a Player object to the population and returns its view
+            players()
+                returns a list with a view of every player, this is what Urnings expects as players/items
+            __getitem__(row: int), __iter__(), __len__()
+                access the players as views
+    """
+    def __init__(self,
+                 user_ids: list,
+                 scores: np.ndarray,
+                 urn_sizes: np.ndarray,
+                 true_values: Optional[np.ndarray] = None,
+                 so_urn_size: int = 10,
+                 stake: int = 16,
+                 history: Optional[History] = None):
+
+        self.n = len(user_ids)
+        self.user_ids = list(user_ids)
+        scores = np.asarray(scores, dtype=np.int64)
+        urn_sizes = np.broadcast_to(np.asarray(urn_sizes, dtype=np.int64), (self.n,))
+
+        if np.any(scores > urn_sizes):
+            raise ValueError("The score can't be higher then the urn size.")
+
+        #the same starting values as Player.__init__
+        self.fields = {f : np.zeros(self.n, dtype=dt) for f, dt in POPULATION_FIELDS.items()}
+        self.fields["score"][:] = scores
+        self.fields["urn_size"][:] = urn_sizes
+        self.fields["est"][:] = scores / urn_sizes
+        self.fields["true_value"][:] = np.nan if true_values is None else np.array([np.nan if tv is None else tv for tv in true_values], dtype=np.float64)
+        self.fields["sim_y"][:] = 8
+        self.fields["sim_true_y"][:] = 8
+        self.fields["so_urn_size"][:] = so_urn_size
+        self.fields["so_score"][:] = int(np.round(so_urn_size / 2))
+        self.fields["so_est"][:] = self.fields["so_score"] / so_urn_size
+        self.fields["previous_stake"][:] = stake
+        self.fields["idx"][:] = np.arange(self.n)
+        self.fields["scaled_score"][:] = scores
+
+        if history is None:
+            history = History(self.n)
+            for f, values in [("container", self.fields["score"]), ("estimate_container", self.fields["est"]), ("differential_container", 0),
+                              ("urn_container", self.fields["urn_size"]), ("so_container", self.fields["so_est"]), ("stakes_container", self.fields["previous_stake"])]:
+                history.data[f][:, 0] = values
+                history.lengths[f][:] = 1
+        self.history = history
+
+    @classmethod
+    def from_players(cls, players: list[Type[Player]]):
+        population = cls([pl.user_id for pl in players], [pl.score for pl in players], [pl.urn_size for pl in players],
+                         history = History.merge(players))
+        #the idx of a player is its row in the population
+        for f in POPULATION_FIELDS:
+            if f != "idx":
+                population.fields[f][:] = [np.nan if f == "true_value" and getattr(pl, f) is None else getattr(pl, f) for pl in players]
+        return population
+
+    def _reserve(self, n: int):
+        capacity = len(self.fields["score"])
+        if n > capacity:
+            for f in POPULATION_FIELDS:
+                values = np.zeros(max(n, 2 * capacity), dtype=POPULATION_FIELDS[f])
+                values[:capacity] = self.fields[f]
+                self.fields[f] = values
+
+    def add(self, player: Type[Player]):
+        row = self.n
+        self._reserve(row + 1)
+        for f in POPULATION_FIELDS:
+            if f != "idx":
+                value = getattr(player, f)
+                self.fields[f][row] = np.nan if f == "true_value" and value is None else value
+        self.fields["idx"][row] = row
+        self.user_ids.append(player.user_id)
+        self.history.add(player)
+        self.n += 1
+        return Player_View(self, row)
+
+    def players(self):
+        return [Player_View(self, row) for row in range(self.n)]
+
+    def __getitem__(self, row: int):
+        if row < 0 or row >= self.n:
+            raise IndexError("Population index out of range.")
+        return Player_View(self, row)
+
+    def __iter__(self):
+        for row in range(self.n):
+            yield Player_View(self, row)
+
+    def __len__(self):
+        return self.n
+
+
+class Population_Field:
+    """
+    class Population_Field:
+        A descriptor which exposes one field of a Population as an attribute of Player_View (e.g. Player_View.score),
+        reading returns a Python scalar, so the views behave like Player objects in the game rules.
+    """
+    def __init__(self, field: str):
+        self.field = field
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        return obj.population.fields[self.field].item(obj.row)
+
+    def __set__(self, obj, value):
+        obj.population.fields[self.field][obj.row] = value
+
+
+class True_Value_Field(Population_Field):
+    #a missing true value is stored as nan and read as None, like Player.true_value
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        value = obj.population.fields[self.field].item(obj.row)
+        return None if value != value else value
+
+    def __set__(self, obj, value):
+        obj.population.fields[self.field][obj.row] = np.nan if value is None else value
+
+
+class Player_View:
+    """
+    class Player_View:
+        A player of a Population. It has the attributes and methods of Player (see Player.__doc__()) but keeps no data itself,
+        every attribute reads and writes the population's arrays. Two views are equal if they point to the same player.
+
+        attributes:
+            population: Population
+                the population the player belongs to
+            row: int
+                the index of the player in the population
+            history, history_row:
+                the History and the row storing the containers of the player (the population's history by default)
+    """
+    __slots__ = ("population", "row", "history", "history_row")
+
+    score = Population_Field("score")
+    urn_size = Population_Field("urn_size")
+    est = Population_Field("est")
+    true_value = True_Value_Field("true_value")
+    sim_y = Population_Field("sim_y")
+    sim_true_y = Population_Field("sim_true_y")
+    so_urn_size = Population_Field("so_urn_size")
+    so_score = Population_Field("so_score")
+    so_est = Population_Field("so_est")
+    previous_stake = Population_Field("previous_stake")
+    idx = Population_Field("idx")
+    scaled_score = Population_Field("scaled_score")
+
+    container = History_Field("container")
+    estimate_container = History_Field("estimate_container")
+    differential_container = History_Field("differential_container")
+    urn_container = History_Field("urn_container")
+    so_container = History_Field("so_container")
+    stakes_container = History_Field("stakes_container")
+
+    def __init__(self, population: Population, row: int):
+        self.population = population
+        self.row = row
+        self.history = population.history
+        self.history_row = row
+
+    @property
+    def user_id(self):
+        return self.population.user_ids[self.row]
+
+    def __eq__(self, other):
+        if isinstance(other, Player_View) and other.population is self.population:
+            return other.row == self.row
+        return self.user_id == other.user_id
+
+    def __repr__(self):
+        return "Player_View(" + repr(self.user_id) + ")"
+
+    #the methods of Player only use the attributes above
+    find = Player.find
+    draw = Player.draw
+    so_draw = Player.so_draw
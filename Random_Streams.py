@@ -0,0 +1,143 @@
+import numpy as np
+from typing import Optional, Union
+
+
+class Global_RNG:
+    """
+    class Global_RNG:
+        The random stream used when no generator is given. It draws from the global (legacy) numpy state, so results
+        set up with np.random.seed stay the same as before the generators were introduced. It is not safe to share it
+        between Urnings objects running in threads.
+
+        methods:
+            uniform()
+                draws a uniform number from [0, 1)
+            random(size)
+                draws an array of uniform numbers from [0, 1)
+            binomial(n, p, size = None)
+                draws from a binomial distribution
+            integers(low, high, size = None)
+                draws integers from [low, high)
+            take(n: int)
+                returns the next n uniform numbers as an array
+            give_back(unused: np.ndarray)
+                sets the global state back to the one before the last take and draws the used uniforms again, so the next draws
+                continue right after the used ones and a compiled kernel uses the same uniforms however its games are chunked
+    """
+    def __init__(self):
+        self.taken = None
+
+    def uniform(self):
+        return np.random.uniform()
+
+    def random(self, size=None):
+        return np.random.random(size)
+
+    def binomial(self, n, p, size=None):
+        return np.random.binomial(n, p, size)
+
+    def integers(self, low, high, size=None):
+        return np.random.randint(low, high, size)
+
+    def take(self, n: int):
+        self.taken = (np.random.get_state(), n)
+        return np.random.random(n)
+
+    def give_back(self, unused: np.ndarray):
+        if self.taken is None or len(unused) == 0:
+            return
+        state, n = self.taken
+        self.taken = None
+        np.random.set_state(state)
+        np.random.random(n - len(unused))
+
+
+class Buffered_RNG:
+    """
+    class Buffered_RNG:
+        A random stream backed by its own np.random.Generator. Uniform numbers are drawn from the generator in blocks and
+        consumed one by one, the scalar draws of the hot loop (Bernoulli draws, random indices) are derived from them, so
+        a single draw costs a list lookup instead of a call into numpy. Array draws go to the generator directly.
+
+        attributes:
+            generator: np.random.Generator
+                the underlying generator
+            block_size: int
+                the number of uniforms drawn at once
+            block: list[float]
+                the current block of uniforms
+            position: int
+                the index of the next unused uniform in block
+
+        methods:
+            uniform()
+                returns the next uniform number from [0, 1)
+            random(size = None)
+                draws uniform numbers from [0, 1)
+            binomial(n, p, size = None)
+                draws from a binomial distribution, binomial(1, p) uses the buffered uniforms
+            integers(low, high, size = None)
+                draws integers from [low, high), a single integer uses the buffered uniforms
+            take(n: int)
+                returns the next n buffered uniforms as an array (e.g. for a compiled kernel consuming them like uniform() would)
+            give_back(unused: np.ndarray)
+                puts the unused tail of the last take back in front of the stream, so the next draws continue right after the used ones
+    """
+    def __init__(self, generator: Optional[np.random.Generator] = None, block_size: int = 4096):
+        self.generator = np.random.default_rng() if generator is None else generator
+        self.block_size = block_size
+        self.block = []
+        self.position = 0
+
+    def uniform(self):
+        if self.position == len(self.block):
+            self.block = self.generator.random(self.block_size).tolist()
+            self.position = 0
+        u = self.block[self.position]
+        self.position += 1
+        return u
+
+    def random(self, size=None):
+        if size is None:
+            return self.uniform()
+        return self.generator.random(size)
+
+    def binomial(self, n, p, size=None):
+        if n == 1 and size is None:
+            return int(self.uniform() < p)
+        return self.generator.binomial(n, p, size)
+
+    def integers(self, low, high, size=None):
+        if size is None:
+            return low + int(self.uniform() * (high - low))
+        return self.generator.integers(low, high, size)
+
+    def take(self, n: int):
+        head = self.block[self.position:self.position + n]
+        self.position += len(head)
+        missing = n - len(head)
+        if missing == 0:
+            return np.array(head, dtype=np.float64)
+
+        #drawing whole blocks, so the stream stays the same as if they were drawn one by one by uniform()
+        n_blocks = -(-missing // self.block_size)
+        fresh = self.generator.random(n_blocks * self.block_size)
+        self.block = fresh[missing:].tolist()
+        self.position = 0
+        return np.concatenate([np.array(head, dtype=np.float64), fresh[:missing]])
+
+    def give_back(self, unused: np.ndarray):
+        self.block = np.asarray(unused).tolist() + self.block[self.position:]
+        self.position = 0
+
+
+GLOBAL_RNG = Global_RNG()
+
+
+def as_rng(rng: Optional[Union[np.random.Generator, Buffered_RNG, Global_RNG]] = None):
+    #None keeps the global numpy stream, a Generator is wrapped into a Buffered_RNG
+    if rng is None:
+        return GLOBAL_RNG
+    if isinstance(rng, np.random.Generator):
+        return Buffered_RNG(rng)
+    return rng
@@ -0,0 +1,85 @@
+import numpy as np
+import io
+import contextlib
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Optional
+
+
+def mad_curve(urnings):
+    #mean absolute distance of the player estimates from the true values after each game (the curve plotted in the notebooks)
+    estimates = urnings.history_matrix("estimate_container")
+    true_values = np.array([pl.true_value for pl in urnings.players])
+    return np.nanmean(np.abs(estimates - true_values[:, None]), axis=0)
+
+
+def replication_seeds(seed: Optional[int], n_replications: int):
+    return np.random.SeedSequence(seed).spawn(n_replications)
+
+
+def run_replication(build: Callable, n_games: int, test: bool, summary: Callable, verbose: bool, seed_seq: np.random.SeedSequence):
+    """
+    Runs one replication. build(rng) gets the np.random.Generator of the replication and returns the Urnings object
+    to play (ideally created with Urnings(..., rng = rng)), the output of summary(urnings) is returned. The global numpy
+    stream is also seeded from the seed sequence, so builds which do not pass the generator stay reproducible.
+    """
+    rng = np.random.default_rng(seed_seq)
+    np.random.seed(seed_seq.generate_state(4))
+
+    urnings = build(rng)
+    if verbose == True:
+        urnings.play(n_games, test=test)
+    else:
+        with contextlib.redirect_stdout(io.StringIO()):
+            urnings.play(n_games, test=test)
+
+    return summary(urnings)
+
+
+def run_replications(build: Callable,
+                     n_replications: int,
+                     n_games: int,
+                     seed: Optional[int] = None,
+                     n_workers: Optional[int] = None,
+                     test: bool = True,
+                     summary: Callable = mad_curve,
+                     verbose: bool = False):
+    """
+    Runs n_replications independent Urnings simulations on a process pool and stacks their summaries.
+
+        build: Callable
+            build(rng: np.random.Generator) -> Urnings, creates the players, items and the game of one replication.
+            It has to be picklable (defined at module level) when n_workers > 1.
+        n_replications: int
+            the number of replications
+        n_games: int
+            the number of games passed to Urnings.play
+        seed: int
+            the root seed, each replication gets its own stream spawned from np.random.SeedSequence(seed), so the
+            results do not depend on the number of workers
+        n_workers: int
+            the number of processes (None uses all cores, 1 runs in the current process)
+        test: bool
+            passed to Urnings.play
+        summary: Callable
+            summary(urnings) -> np.ndarray, the result kept from each replication (default: mad_curve)
+        verbose: bool
+            whether to keep the progress printed by Urnings.play
+
+    returns:
+        np.ndarray of shape (n_replications, ...) with the stacked summaries, e.g. np.mean(curves, axis=0) is the
+        MAD curve averaged over the replications
+    """
+    seeds = replication_seeds(seed, n_replications)
+    worker = partial(run_replication, build, n_games, test, summary, verbose)
+
+    if n_workers == 1:
+        #keeping the global stream of the caller intact
+        state = np.random.get_state()
+        results = [worker(ss) for ss in seeds]
+        np.random.set_state(state)
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            results = list(pool.map(worker, seeds))
+
+    return np.array(results)
@@ -0,0 +1,182 @@
+import numpy as np
+import os
+import json
+from typing import Optional, Union
+from History import History, HISTORY_FIELDS
+
+
+class Mapped_History(History):
+    """
+    class Mapped_History(History):
+        A History whose matrices are memory-mapped .npy files in a directory, one file per field (<field>.npy, rows x capacity) with the
+        lengths next to it (<field>_lengths.npy), the layout of History.save. The values are written into the mapped files while the run
+        progresses, the operating system pages them out, so the histories of a run can be larger than the memory. When a field runs out
+        of capacity it grows like History (at least doubling) into a new file which replaces the old one.
+
+        attributes:
+            path: str
+                the directory of the files
+            (see History.__doc__() for the others)
+
+        methods:
+            from_history(history: History, path: str, chunk_size: int = 64)
+                copies an existing history into a new directory and returns it mapped
+            open(path: str, chunk_size: int = 64)
+                opens the directory of a Mapped_History (or of History.save) to continue writing into it
+            flush()
+                writes the dirty pages and the lengths to disk, after this Result_Store sees every saved value. Urnings.play calls it
+                every Urnings.flush_every games (rounds in test mode), with every checkpoint and at the end
+    """
+    def __init__(self, path: str, n_rows: int, capacity: int = 64, chunk_size: int = 64):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        super().__init__(n_rows, capacity, chunk_size)
+        for f in HISTORY_FIELDS:
+            self._replace(f, self.data[f])
+        self.flush()
+
+    def _file(self, field: str):
+        return os.path.join(self.path, field + ".npy")
+
+    def _allocate(self, field: str, n_rows: int, capacity: int):
+        #the new file is written next to the old one, which stays readable until _replace
+        return np.lib.format.open_memmap(self._file(field) + ".tmp", mode="w+", dtype=HISTORY_FIELDS[field], shape=(int(n_rows), int(capacity)))
+
+    def _replace(self, field: str, data: np.ndarray):
+        data.flush()
+        os.replace(self._file(field) + ".tmp", self._file(field))
+        self.data[field] = data
+
+    @classmethod
+    def from_history(cls, history: History, path: str, chunk_size: int = 64):
+        capacity = max(1, max(int(np.max(history.lengths[f][:history.n_rows], initial=0)) for f in HISTORY_FIELDS))
+        mapped = cls(path, history.n_rows, capacity, chunk_size)
+        for start in range(0, history.n_rows, 4096):
+            rows = slice(start, min(start + 4096, history.n_rows))
+            for f in HISTORY_FIELDS:
+                mapped.assign_rows(np.arange(history.n_rows)[rows], f, history.matrix(f, rows, capacity), history.lengths[f][rows])
+        mapped.flush()
+        return mapped
+
+    @classmethod
+    def open(cls, path: str, chunk_size: int = 64):
+        mapped = cls.__new__(cls)
+        mapped.path = path
+        mapped.chunk_size = chunk_size
+        mapped.data = {}
+        mapped.lengths = {}
+        for f in HISTORY_FIELDS:
+            mapped.data[f] = np.load(mapped._file(f), mmap_mode="r+")
+            lengths = np.load(os.path.join(path, f + "_lengths.npy"))
+            #the files keep the spare rows of History.add, the rows past n_rows have no values yet
+            mapped.lengths[f] = np.concatenate([lengths, np.zeros(mapped.data[f].shape[0] - len(lengths), dtype=np.int64)])
+        mapped.n_rows = len(lengths)
+        return mapped
+
+    def _write(self, name: str, write):
+        #a Result_Store may read the file at any time, so it is written next to it and swapped in
+        path = os.path.join(self.path, name)
+        with open(path + ".tmp", "wb") as file:
+            write(file)
+        os.replace(path + ".tmp", path)
+
+    def flush(self):
+        for f in HISTORY_FIELDS:
+            self.data[f].flush()
+            self._write(f + "_lengths.npy", lambda file: np.save(file, self.lengths[f][:self.n_rows]))
+        self._write("history.json", lambda file: file.write(json.dumps({"n_rows": self.n_rows, "fields": list(HISTORY_FIELDS)}).encode()))
+
+
+class Result_Store:
+    """
+    class Result_Store:
+        Read-only, zero-copy access to the histories written by Mapped_History or saved by History.save (e.g. the player_history_
+        files of a checkpoint). The matrices are memory-mapped, so opening a store costs nothing and only the pages of the sliced
+        players and games are read. The packed rows of Ragged_History.save are read as well, their slices are copies.
+
+        attributes:
+            path: str
+                the directory of the files
+            prefix: str
+                the prefix of the file names (e.g. "player_history_" in a checkpoint)
+            n_rows: int
+                the number of players/items
+            lengths: dict[str, np.ndarray]
+                field name -> the number of values saved for each row
+            ragged: bool
+                the files hold the packed rows of Ragged_History.save
+            offsets: dict[str, np.ndarray]
+                field name -> the start of each row in the packed values (ragged layout only)
+
+        methods:
+            field(field: str)
+                the memory-mapped (rows x capacity) matrix of the field, entries past the length of a row are not results.
+                For the ragged layout the packed values of all rows
+            slice(field: str, rows = None, games = None)
+                the values of the given rows (a slice, an index array or None for all) in the given game range (a slice or None),
+                a view of the file if rows and games are slices and the layout is not ragged
+            to_matrix(field: str, rows = None, games = None, fill: float = np.nan)
+                copies a slice into a matrix, the values past the length of a row are replaced by fill (see History.to_matrix)
+            n_games(field: str = "container")
+                the length of the longest row
+            refresh()
+                reloads the lengths and remaps the files, to see the games a running Mapped_History flushed since the store was opened
+    """
+    def __init__(self, path: str, prefix: str = ""):
+        self.path = path
+        self.prefix = prefix
+        self.refresh()
+
+    def _file(self, name: str):
+        return os.path.join(self.path, self.prefix + name + ".npy")
+
+    def refresh(self):
+        self.lengths = {f : np.load(self._file(f + "_lengths")) for f in HISTORY_FIELDS}
+        self.n_rows = len(self.lengths["container"])
+        self.ragged = os.path.exists(self._file("container_flat"))
+        self.offsets = {f : np.load(self._file(f + "_offsets")) for f in HISTORY_FIELDS} if self.ragged else {}
+        #a growing Mapped_History replaces its files, so the old mappings are dropped
+        self._fields = {}
+
+    def field(self, field: str):
+        if field not in HISTORY_FIELDS:
+            raise ValueError("field should be one of " + ", ".join(HISTORY_FIELDS) + ".")
+        if field not in self._fields:
+            self._fields[field] = np.load(self._file(field + "_flat" if self.ragged else field), mmap_mode="r")
+        return self._fields[field]
+
+    def n_games(self, field: str = "container"):
+        return int(np.max(self.lengths[field], initial=0))
+
+    def _indices(self, field: str, rows: Optional[Union[slice, np.ndarray]], games: Optional[slice]):
+        row_idx = np.arange(self.n_rows)[slice(0, self.n_rows) if rows is None else rows]
+        width = self.n_games(field) if self.ragged else self.field(field).shape[1]
+        game_idx = np.arange(width)[slice(0, self.n_games(field)) if games is None else games]
+        return row_idx, game_idx
+
+    def _packed(self, field: str, row_idx: np.ndarray, game_idx: np.ndarray, fill):
+        #gathers the saved values of the rows from the packed layout, the other entries are fill
+        saved = game_idx[None, :] < self.lengths[field][row_idx][:, None]
+        matrix = np.full(saved.shape, fill, dtype=np.result_type(self.field(field).dtype, np.asarray(fill).dtype))
+        positions = self.offsets[field][row_idx][:, None] + game_idx[None, :]
+        matrix[saved] = self.field(field)[positions[saved]]
+        return matrix
+
+    def slice(self, field: str, rows: Optional[Union[slice, np.ndarray]] = None, games: Optional[slice] = None):
+        if self.ragged:
+            row_idx, game_idx = self._indices(field, rows, games)
+            return self._packed(field, row_idx, game_idx, 0)
+        rows = slice(0, self.n_rows) if rows is None else rows
+        games = slice(0, self.n_games(field)) if games is None else games
+        return self.field(field)[rows, games]
+
+    def to_matrix(self, field: str, rows: Optional[Union[slice, np.ndarray]] = None, games: Optional[slice] = None, fill: float = np.nan):
+        row_idx, game_idx = self._indices(field, rows, games)
+        if self.ragged:
+            return self._packed(field, row_idx, game_idx, fill)
+
+        values = self.field(field)[row_idx, slice(0, self.n_games(field)) if games is None else games]
+        matrix = np.full(values.shape, fill, dtype=np.result_type(values.dtype, np.asarray(fill).dtype))
+        saved = game_idx[None, :] < self.lengths[field][row_idx][:, None]
+        matrix[saved] = values[saved]
+        return matrix
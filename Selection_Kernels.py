@@ -0,0 +1,68 @@
+"""
+Kernels for the adaptive item selection. A kernel takes the player scores R_i, the item scores R_j (broadcastable arrays)
+and the urn sizes n_i, n_j and returns the unnormalised selection weights. binned_selection_matrix evaluates a kernel on
+all (player bin, item bin) pairs at once and caches the result, so every Urnings object with the same urn sizes and kernel
+shares one read-only matrix. The cache holds the last MATRIX_CACHE_SIZE matrices and is cleared by register_kernel.
+"""
+import numpy as np
+from functools import lru_cache
+from typing import Callable, Union
+
+
+def log_odds(R, n):
+    #smoothed log odds of an urn with R green balls out of n
+    return np.log((R + 1) / (n - R + 1))
+
+
+def normal_kernel(R_i, R_j, n_i, n_j):
+    #normal quantiles method (Hofmann et al, 2021), targets a 0.5 probability of a correct response
+    return np.exp(-2*(log_odds(R_i, n_i) - log_odds(R_j, n_j))**2)
+
+
+def target_probability_kernel(R_i, R_j, n_i, n_j, target: float = 0.7):
+    #normal quantiles method centred on a target probability of a correct response instead of 0.5
+    return np.exp(-2*(log_odds(R_i, n_i) - log_odds(R_j, n_j) - np.log(target / (1 - target)))**2)
+
+
+def fisher_information_kernel(R_i, R_j, n_i, n_j):
+    #Fisher information of the response under the Rasch model, p(1 - p), favours items where the outcome is most uncertain
+    p = 1 / (1 + np.exp(-(log_odds(R_i, n_i) - log_odds(R_j, n_j))))
+    return p * (1 - p)
+
+
+KERNELS = {"normal": normal_kernel,
+           "target_probability": target_probability_kernel,
+           "fisher_information": fisher_information_kernel}
+
+MATRIX_CACHE_SIZE = 64
+
+
+def register_kernel(name: str, kernel: Callable):
+    KERNELS[name] = kernel
+    #the cached matrices of a replaced kernel are stale
+    _cached_selection_matrix.cache_clear()
+
+
+def selection_matrix(max_urn: int, item_urn_size: int, kernel: Union[str, Callable], kernel_args: tuple):
+    kernel_function = KERNELS[kernel] if isinstance(kernel, str) else kernel
+    R_i = np.arange(max_urn + 1)[:, None]
+    R_j = np.arange(item_urn_size + 1)[None, :]
+    matrix = np.broadcast_to(kernel_function(R_i, R_j, max_urn, item_urn_size, **dict(kernel_args)), (max_urn + 1, item_urn_size + 1)).astype(np.float64)
+    #the matrix is shared between Urnings objects
+    matrix.setflags(write=False)
+    return matrix
+
+
+@lru_cache(maxsize=MATRIX_CACHE_SIZE)
+def _cached_selection_matrix(max_urn: int, item_urn_size: int, kernel: Union[str, Callable], kernel_args: tuple):
+    return selection_matrix(max_urn, item_urn_size, kernel, kernel_args)
+
+
+def binned_selection_matrix(max_urn: int, item_urn_size: int, kernel: Union[str, Callable] = "normal", **kernel_args):
+    kernel_args = tuple(sorted(kernel_args.items()))
+    try:
+        hash((kernel, kernel_args))
+    except TypeError:
+        #arguments which can't be a cache key (e.g. arrays) are evaluated every time
+        return selection_matrix(max_urn, item_urn_size, kernel, kernel_args)
+    return _cached_selection_matrix(max_urn, item_urn_size, kernel, kernel_args)
@@ -0,0 +1,250 @@
+import numpy as np
+import os
+import io
+import contextlib
+import tempfile
+import multiprocessing
+from multiprocessing import shared_memory
+from typing import Optional
+from History import History, HISTORY_FIELDS
+from Population import Population, Player_View, POPULATION_FIELDS
+from Urnings import Urnings
+
+#model fit arrays of Urnings summed over the shards
+FIT_ARRAYS = ["prop_correct", "number_per_bin", "fit_correct", "adaptive_correct"]
+
+
+def _agent_fields(agents: list):
+    population = agents[0].population if len(agents) > 0 and isinstance(agents[0], Player_View) else None
+    in_order = population is not None and population.n == len(agents) and all(isinstance(ag, Player_View) and ag.population is population and ag.row == i for i, ag in enumerate(agents))
+
+    fields = {}
+    for f, dt in POPULATION_FIELDS.items():
+        if in_order:
+            fields[f] = population.fields[f][:population.n].copy()
+        elif f == "true_value":
+            fields[f] = np.array([np.nan if ag.true_value is None else ag.true_value for ag in agents], dtype=dt)
+        else:
+            fields[f] = np.array([getattr(ag, f) for ag in agents], dtype=dt)
+    return fields
+
+
+def _set_agent_fields(agents: list, rows: np.ndarray, fields: dict):
+    population = agents[0].population if len(agents) > 0 and isinstance(agents[0], Player_View) else None
+    in_order = population is not None and population.n == len(agents) and all(isinstance(ag, Player_View) and ag.population is population and ag.row == i for i, ag in enumerate(agents))
+
+    for f in POPULATION_FIELDS:
+        if f == "idx":
+            continue
+        if in_order:
+            population.fields[f][rows] = fields[f]
+        else:
+            for row, value in zip(rows, fields[f]):
+                setattr(agents[row], f, None if f == "true_value" and value != value else value.item())
+
+
+def _shard_population(user_ids: list, fields: dict, history: Optional[History] = None):
+    population = Population(user_ids, fields["score"], fields["urn_size"], history = history)
+    for f in POPULATION_FIELDS:
+        if f != "idx":
+            population.fields[f][:] = fields[f]
+    return population
+
+
+def shard_bounds(n_players: int, n_workers: int):
+    #contiguous shards of (almost) equal size
+    return np.arange(n_workers + 1, dtype=np.int64) * n_players // n_workers
+
+
+def shard_schedule(n_games: int, sizes: np.ndarray, sync_interval: int, test: bool):
+    """
+    Splits the games between the shards and into the intervals between two synchronizations. In test mode every shard plays
+    n_games rounds, sync_interval rounds at a time. Otherwise the n_games are split in proportion to the shard sizes (the serial
+    engine picks the player uniformly) and every shard plays its games in the same number of intervals of at most sync_interval games.
+
+    returns:
+        np.ndarray of shape (n_workers, n_syncs) with the number of games (rounds) each shard plays before each synchronization
+    """
+    if test == True:
+        n_syncs = max(1, -(-n_games // sync_interval))
+        rounds = np.full(n_syncs, sync_interval, dtype=np.int64)
+        rounds[-1] = n_games - sync_interval * (n_syncs - 1)
+        return np.tile(rounds, (len(sizes), 1))
+
+    games = n_games * sizes // np.sum(sizes)
+    games[:n_games - np.sum(games)] += 1
+    n_syncs = max(1, -(-int(np.max(games)) // sync_interval))
+    bounds = np.round(np.linspace(0, 1, n_syncs + 1)[None, :] * games[:, None]).astype(np.int64)
+    return np.diff(bounds, axis=1)
+
+
+def run_shard(worker: int, n_workers: int, shard: dict, items: dict, game_type, control_draws: int, urn_sizes: tuple,
+              schedule: np.ndarray, test: bool, track_fit: bool, seed_seq: np.random.SeedSequence, shm_names: tuple, barrier, result_path: str):
+    """
+    Plays the games of one shard in a worker process. The shard is a complete Urnings system with its own players, a private copy of
+    the items and its own random stream. After every interval of the schedule the item score changes of all shards are merged through
+    shared memory: each worker writes its changes into its row of the delta matrix, worker 0 adds them to the shared item scores
+    (clipped to the urn) and every worker continues from the merged scores. The merge waits for all shards, so the result only
+    depends on the seeds and not on the timing of the processes.
+    """
+    try:
+        rng = np.random.default_rng(seed_seq)
+        population = _shard_population(shard["user_ids"], shard["fields"], shard["history"])
+        players = population.players()
+        item_population = _shard_population(items["user_ids"], items["fields"])
+        urnings = Urnings(players, item_population.players(), game_type, control_draws, rng, urn_sizes[0], urn_sizes[1], track_fit = track_fit)
+
+        n_items = item_population.n
+        score_shm = shared_memory.SharedMemory(name = shm_names[0])
+        delta_shm = shared_memory.SharedMemory(name = shm_names[1])
+        try:
+            shared_scores = np.ndarray((n_items,), dtype=np.int64, buffer=score_shm.buf)
+            deltas = np.ndarray((n_workers, n_items), dtype=np.int64, buffer=delta_shm.buf)
+            item_scores = item_population.fields["score"]
+            item_urns = item_population.fields["urn_size"][:n_items]
+            base = shared_scores.copy()
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                for n_games in schedule:
+                    if n_games > 0:
+                        urnings.play(int(n_games), test = test)
+
+                    deltas[worker] = item_scores[:n_items] - base
+                    barrier.wait()
+                    if worker == 0:
+                        shared_scores[:] = np.clip(base + np.sum(deltas, axis=0), 0, item_urns)
+                    barrier.wait()
+
+                    #continuing from the merged item scores
+                    merged = shared_scores.copy()
+                    changed = np.flatnonzero(merged != item_scores[:n_items])
+                    item_scores[:n_items] = merged
+                    item_population.fields["est"][:n_items] = merged / item_urns
+                    for it in changed:
+                        urnings.item_bins.update(urnings.items[it])
+                    base = merged
+        finally:
+            del shared_scores, deltas
+            score_shm.close()
+            delta_shm.close()
+
+        prefix = "shard" + str(worker) + "_"
+        for f in POPULATION_FIELDS:
+            np.save(os.path.join(result_path, prefix + f + ".npy"), population.fields[f][:population.n])
+        urnings.player_history.save(result_path, prefix + "history_")
+        for name in FIT_ARRAYS:
+            np.save(os.path.join(result_path, prefix + name + ".npy"), getattr(urnings, name))
+        np.save(os.path.join(result_path, prefix + "bugfix.npy"), np.array(urnings.bugfix))
+    except BaseException:
+        #releasing the other shards waiting at the merge
+        barrier.abort()
+        raise
+
+
+def play_sharded(urnings: Urnings, n_games: int, n_workers: Optional[int] = None, sync_interval: int = 100, test: bool = False,
+                 seed: Optional[int] = None):
+    """
+    Plays an n_adaptive Urnings system on several processes. In n_adaptive mode the items are picked uniformly, so the players only
+    interact through the item scores: the players are split into n_workers contiguous shards, every shard plays its games on a private
+    copy of the items (with the engine of urnings.game_type) and the item score changes of all shards are merged through
+    multiprocessing.shared_memory every sync_interval games. Between two merges a shard does not see the item updates of the other
+    shards, which is the only difference to the serial engine (see the README for the measured deviation).
+
+        urnings: Urnings
+            the system to play, its players, player histories, items, model fit arrays and counters are updated in place
+        n_games: int
+            the number of games (rounds in test mode), as in Urnings.play
+        n_workers: int
+            the number of processes (None uses all cores), at most one per player
+        sync_interval: int
+            the number of games (rounds in test mode) each shard plays between two merges of the item scores
+        test: bool
+            every player plays once per round, as in Urnings.play
+        seed: int
+            the root seed, every shard gets its own stream spawned from np.random.SeedSequence(seed)
+
+    The item histories are not merged (the items keep their containers from before the call) and the green ball sums are
+    recomputed at the end instead of being sampled during the games.
+    """
+    if urnings.game_type.adaptivity != "n_adaptive":
+        raise ValueError("Sharded simulation is only possible with n_adaptive item selection.")
+    if urnings.game_type.item_pair_update == True:
+        raise ValueError("Sharded simulation is not possible with the paired update, the update queues are shared by all players.")
+    if sync_interval < 1:
+        raise ValueError("sync_interval should be at least 1.")
+
+    n_players = len(urnings.players)
+    n_items = len(urnings.items)
+    if n_workers is None:
+        n_workers = os.cpu_count()
+    n_workers = max(1, min(n_workers, n_players))
+
+    bounds = shard_bounds(n_players, n_workers)
+    schedule = shard_schedule(n_games, np.diff(bounds), sync_interval, test)
+    seeds = np.random.SeedSequence(seed).spawn(n_workers)
+
+    player_fields = _agent_fields(urnings.players)
+    item_fields = _agent_fields(urnings.items)
+    items = {"user_ids": [it.user_id for it in urnings.items], "fields": item_fields}
+    urn_sizes = (urnings.player_urn_size, urnings.item_urn_size)
+
+    score_shm = shared_memory.SharedMemory(create = True, size = max(n_items, 1) * 8)
+    delta_shm = shared_memory.SharedMemory(create = True, size = max(n_workers * n_items, 1) * 8)
+    try:
+        np.ndarray((n_items,), dtype=np.int64, buffer=score_shm.buf)[:] = item_fields["score"]
+
+        with tempfile.TemporaryDirectory() as result_path:
+            context = multiprocessing.get_context()
+            barrier = context.Barrier(n_workers)
+            processes = []
+            for w in range(n_workers):
+                rows = np.arange(bounds[w], bounds[w + 1])
+                history = History(len(rows), 1, urnings.player_history.chunk_size)
+                for f in HISTORY_FIELDS:
+                    lengths = urnings.player_history.lengths[f][rows]
+                    width = max(int(np.max(lengths)), 1)
+                    history.assign_rows(np.arange(len(rows)), f, urnings.player_history.matrix(f, rows, width), lengths)
+                shard = {"user_ids": [urnings.players[r].user_id for r in rows],
+                         "fields": {f : values[rows] for f, values in player_fields.items()},
+                         "history": history}
+                process = context.Process(target = run_shard,
+                                          args = (w, n_workers, shard, items, urnings.game_type, urnings.control_draws, urn_sizes, schedule[w],
+                                                  test, urnings.track_fit, seeds[w], (score_shm.name, delta_shm.name), barrier, result_path))
+                process.start()
+                processes.append(process)
+
+            for process in processes:
+                process.join()
+            if any(process.exitcode != 0 for process in processes):
+                raise RuntimeError("A shard of the sharded simulation failed, see the traceback of the worker above.")
+
+            #copying the players and their histories back, the games of a shard were appended to the rows of its players
+            for w in range(n_workers):
+                prefix = "shard" + str(w) + "_"
+                rows = np.arange(bounds[w], bounds[w + 1])
+                fields = {f : np.load(os.path.join(result_path, prefix + f + ".npy")) for f in POPULATION_FIELDS}
+                _set_agent_fields(urnings.players, rows, fields)
+                history = History.load(result_path, prefix + "history_", mmap_mode = None)
+                for f in HISTORY_FIELDS:
+                    urnings.player_history.assign_rows(rows, f, history.data[f], history.lengths[f])
+                for name in FIT_ARRAYS:
+                    getattr(urnings, name)[:] += np.load(os.path.join(result_path, prefix + name + ".npy"))
+                urnings.bugfix += int(np.load(os.path.join(result_path, prefix + "bugfix.npy")))
+
+        final_scores = np.ndarray((n_items,), dtype=np.int64, buffer=score_shm.buf).copy()
+    finally:
+        score_shm.close()
+        score_shm.unlink()
+        delta_shm.close()
+        delta_shm.unlink()
+
+    for it, score in zip(urnings.items, final_scores):
+        it.score = int(score)
+        it.est = it.score / it.urn_size
+        urnings.item_bins.update(it)
+
+    urnings.game_count += n_games
+    urnings.flush_histories()
+    if urnings.track_green_balls == True:
+        urnings.enable_diagnostics(urnings.track_fit, True, urnings.sample_every)
+        urnings.sample_green_balls()
@@ -0,0 +1,157 @@
+import numpy as np
+import os
+import csv
+import json
+import hashlib
+import itertools
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Optional
+from Game_Type import Game_Type
+from Urnings import Urnings
+from Replications import run_replication, replication_seeds, mad_curve
+
+
+def config_grid(**options):
+    #cartesian product of the Game_Type options, e.g. config_grid(adaptivity = ["adaptive"], alg_type = ["Urnings1"], window = [6, 10])
+    keys = list(options)
+    return [dict(zip(keys, values)) for values in itertools.product(*[options[k] for k in keys])]
+
+
+def stable_value(value):
+    #a JSON representation of value which is the same in every run, callables are identified by their qualified name
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, dict):
+        return {str(k) : stable_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [stable_value(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, partial):
+        return {"partial": stable_value(value.func), "args": stable_value(value.args), "keywords": stable_value(value.keywords)}
+    if callable(value):
+        module, name = getattr(value, "__module__", None), getattr(value, "__qualname__", None)
+        if module is None or name is None or "<" in name:
+            raise ValueError(repr(value) + " has no stable name (lambda or local function), it cannot be part of a sweep cache key. "
+                             "Use a module level function or pass a sweep_id to run_sweep.")
+        return module + "." + name
+    raise ValueError(repr(value) + " of type " + type(value).__name__ + " cannot be part of a sweep cache key.")
+
+
+def cell_key(config: dict, seed: int, replication: int, sweep: dict):
+    #sweep holds the other inputs of the cell (n_games, test and the summary and population functions or the sweep_id)
+    cell = json.dumps({"config": stable_value(config), "seed": seed, "replication": replication, "sweep": stable_value(sweep)}, sort_keys=True)
+    return hashlib.sha1(cell.encode()).hexdigest()
+
+
+def build_game(build_population: Callable, config: dict, rng: np.random.Generator):
+    players, items = build_population(rng)
+    return Urnings(players, items, Game_Type(**config), rng=rng)
+
+
+def run_cell(build_population: Callable, n_games: int, test: bool, summary: Callable, config: dict, seed_seq: np.random.SeedSequence):
+    return run_replication(partial(build_game, build_population, config), n_games, test, summary, False, seed_seq)
+
+
+def run_sweep(configs: list[dict],
+              build_population: Callable,
+              n_replications: int,
+              n_games: int,
+              seed: int = 0,
+              n_workers: Optional[int] = None,
+              cache_dir: Optional[str] = None,
+              test: bool = True,
+              summary: Callable = mad_curve,
+              value_name: str = "mad",
+              sweep_id: Optional[str] = None):
+    """
+    Runs every (config, replication) cell of a parameter sweep on a process pool and returns one tidy table.
+
+        configs: list[dict]
+            the Game_Type keyword arguments of each configuration (see config_grid)
+        build_population: Callable
+            build_population(rng: np.random.Generator) -> (players, items), has to be picklable when n_workers > 1
+        n_replications: int
+            the number of replications per configuration
+        n_games: int
+            the number of games passed to Urnings.play
+        seed: int
+            the root seed, replication r of every configuration uses the same spawned seed (common random numbers)
+        n_workers: int
+            the number of processes (None uses all cores, 1 runs in the current process). Cells are submitted one by one,
+            so an idle worker always picks up the next unfinished cell
+        cache_dir: str
+            directory where finished cells are saved as <cell_key>.npy, an interrupted sweep started again with the same
+            cache_dir only runs the missing cells. The key covers the config, seed, replication, n_games, test and the
+            qualified names of summary and build_population (or sweep_id), so a changed sweep never reuses old cells
+        test: bool
+            passed to Urnings.play
+        summary: Callable
+            summary(urnings) -> np.ndarray, the result kept from each cell (default: mad_curve)
+        value_name: str
+            the column name of the summary values in the table
+        sweep_id: str
+            identifies summary and build_population in the cache keys instead of their qualified names, needed when they
+            are lambdas or local functions (change it whenever they change)
+
+    returns:
+        list[dict], one row per (config, replication, game) with the config options, "replication", "seed", "game"
+        and value_name as columns (pandas.DataFrame(rows) turns it into a data frame)
+    """
+    seeds = replication_seeds(seed, n_replications)
+    cells = [(c, r) for c in range(len(configs)) for r in range(n_replications)]
+    results = {}
+
+    keys = {}
+    if cache_dir is not None:
+        if sweep_id is None:
+            sweep = {"n_games": n_games, "test": test, "summary": summary, "build_population": build_population}
+        else:
+            sweep = {"n_games": n_games, "test": test, "sweep_id": sweep_id}
+        keys = {(c, r) : cell_key(configs[c], seed, r, sweep) for c, r in cells}
+        os.makedirs(cache_dir, exist_ok=True)
+        for cell in cells:
+            path = os.path.join(cache_dir, keys[cell] + ".npy")
+            if os.path.exists(path):
+                results[cell] = np.load(path)
+
+    def save(cell, value):
+        results[cell] = np.asarray(value)
+        if cache_dir is not None:
+            #writing to a temporary file first, so an interrupted write never leaves a broken cell behind
+            tmp_path = os.path.join(cache_dir, keys[cell] + ".tmp.npy")
+            np.save(tmp_path, results[cell])
+            os.replace(tmp_path, os.path.join(cache_dir, keys[cell] + ".npy"))
+
+    todo = [cell for cell in cells if cell not in results]
+    worker = partial(run_cell, build_population, n_games, test, summary)
+
+    if n_workers == 1:
+        state = np.random.get_state()
+        for c, r in todo:
+            save((c, r), worker(configs[c], seeds[r]))
+        np.random.set_state(state)
+    elif len(todo) > 0:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            futures = {pool.submit(worker, configs[c], seeds[r]): (c, r) for c, r in todo}
+            for future in as_completed(futures):
+                save(futures[future], future.result())
+
+    rows = []
+    for c, r in cells:
+        values = np.atleast_1d(results[(c, r)])
+        for game, value in enumerate(values.tolist()):
+            rows.append({**configs[c], "replication": r, "seed": seed, "game": game, value_name: value})
+
+    return rows
+
+
+def write_csv(rows: list[dict], path: str):
+    columns = list(dict.fromkeys(k for row in rows for k in row))
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
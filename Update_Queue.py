@@ -0,0 +1,67 @@
+import numpy as np
+from Random_Streams import GLOBAL_RNG
+
+class Update_Queue:
+    """
+    class Update_Queue:
+        The set of items waiting for a paired update (Urnings.queue_pos, Urnings.queue_neg). The idx of the waiting items are kept
+        in an array with a position map, so adding, removing and picking a random waiting item are all O(1).
+
+        attributes:
+            pending: np.ndarray
+                the first size elements are the idx of the waiting items
+            position: np.ndarray
+                the position of every item in pending, -1 if the item is not waiting
+            size: int
+                the number of waiting items
+
+        methods:
+            add(idx: int)
+                puts the item in the queue (nothing happens if it is already waiting)
+            remove(idx: int)
+                takes the item out of the queue
+            is_empty()
+                returns whether no item is waiting
+            random_pick(rng = GLOBAL_RNG)
+                returns the idx of a uniformly chosen waiting item
+    """
+    def __init__(self, n_items: int):
+        self.pending = np.zeros(max(n_items, 1), dtype=np.int64)
+        self.position = np.full(max(n_items, 1), -1, dtype=np.int64)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, idx: int):
+        return idx < len(self.position) and self.position[idx] != -1
+
+    def _reserve(self, n_items: int):
+        capacity = len(self.position)
+        if n_items > capacity:
+            new_capacity = max(n_items, 2 * capacity)
+            self.pending = np.concatenate([self.pending, np.zeros(new_capacity - capacity, dtype=np.int64)])
+            self.position = np.concatenate([self.position, np.full(new_capacity - capacity, -1, dtype=np.int64)])
+
+    def add(self, idx: int):
+        self._reserve(idx + 1)
+        if self.position[idx] == -1:
+            self.pending[self.size] = idx
+            self.position[idx] = self.size
+            self.size += 1
+
+    def remove(self, idx: int):
+        pos = self.position[idx]
+        if pos != -1:
+            #replacing the item with the last waiting one
+            last = self.pending[self.size - 1]
+            self.pending[pos] = last
+            self.position[last] = pos
+            self.position[idx] = -1
+            self.size -= 1
+
+    def is_empty(self):
+        return self.size == 0
+
+    def random_pick(self, rng = GLOBAL_RNG):
+        return int(self.pending[rng.integers(0, self.size)])
@@ -1,7 +1,16 @@
 import numpy as np
+import os
+import warnings
 from typing import Optional, Type
 from Game_Type import Game_Type
 from Agents import Player
+from History import History
+from Vectorized_Urnings import Vectorized_Urnings
+from Item_Bins import Item_Bins
+from Random_Streams import as_rng
+from Update_Queue import Update_Queue
+from Phase_Profiler import Phase_Profiler
+from Selection_Kernels import binned_selection_matrix, normal_kernel
 
 class Urnings:
     """
@@ -20,27 +29,52 @@ class Urnings:
                 A Game_Type object which save all the options we want to declare before we start the learning system. 
                 For details see Game_Type.__doc__()
             data: AlsData
-                An AlsData object which contains the serialized, and restructured data, it enables us to create the Player objects and a punchcard which 
-                governs the data's item selection procedure. 
-                For details see Als Data.__doc__()
-            queue_pos: dict
-                Dictionary with all the defined item's user id as key. Used in the paired update system. This dictionary contains the items waitning for a positive update.
-            queue_neg_ dict
-                Dictionary with all the defined item's user id as key. Used in the paired update system. This dictionary contains the items waitning for a negative update.
-            adaptive_matrix: np.ndarray
-                A numpy array saving the probability of selection of each player item paires (TODO: Refactor it into an Urn based matrix for better computation performance)
+                The AlsData object of the response log replayed through the system (None in simulations). It streams the logged responses, creates
+                the Player objects of new learners and items on the fly and feeds the observed outcomes into urnings_game.
+                For details see AlsData.__doc__()
+            player_urn_size: int
+                The urn size of the players (taken from the first player if not given)
+            item_urn_size: int
+                The urn size of the items (taken from the first item if not given)
+            queue_pos: Update_Queue
+                The idx of the items waiting for a positive update. Used in the paired update system. For details see Update_Queue.__doc__()
+            queue_neg: Update_Queue
+                The idx of the items waiting for a negative update. Used in the paired update system.
+            player_history: History
+                A History object storing the containers of all players (Player.container, Player.estimate_container etc. are views of its rows).
+            item_history: History
+                A History object storing the containers of all items.
+            rng: Buffered_RNG
+                The random stream used by every draw of the game. An np.random.Generator passed to the constructor is wrapped into a Buffered_RNG,
+                so Urnings objects with their own generators can run concurrently. Without a generator the global numpy state is used (Global_RNG).
+                For details see Random_Streams
+            adaptive_matrix_binned: np.ndarray
+                A read-only numpy array saving the selection weight of each (scaled player score, item score) pair. It is computed with Game_Type.selection_kernel
+                and shared by all Urnings objects with the same urn sizes and kernel, for details see Selection_Kernels
+            item_bins: Item_Bins
+                An index of the items by their current score, updated after every game. For details see Item_Bins.__doc__()
+            profiler: Phase_Profiler
+                The profiler attached by enable_profiling, None if profiling is disabled.
             game_count: int
                 The number of games we played in the system.
             item_green_balls: list[int]
                 A list of integers saving the number of green balls in all item urns. It can be used to check whether there is green ball inflation which is against the 
-                assumption of Urnings model. Can be corrected by setting Game.Type.paired_update = True.
+                assumption of Urnings model. Can be corrected by setting Game.Type.paired_update = True. Sampled every sample_every games if track_green_balls is True.
+            total_green_balls, total_num_balls: list[int]
+                The number of green balls and the number of balls in all urns (players and items), sampled together with item_green_balls.
             prop_correct: np.ndarray
-                A numpy array saving the proportion of correct responses in each player and item urnings. It can be used to investigate model fit by plotting it against 
-                the true model predictions using contour plots.
-            number_bin_correct: np.ndarray
-                A numpy array saving the number of responese in each play and item urnings.
+                A numpy array saving the number of correct responses in each (scaled player score, item score) bin, divided by number_per_bin it is the proportion of
+                correct responses. It can be used to investigate model fit by plotting it against the true model predictions using contour plots. Only updated if track_fit is True.
+            number_per_bin: np.ndarray
+                A numpy array saving the number of responses in each (scaled player score, item score) bin. Only updated if track_fit is True.
             fit_correct:  np.ndarray
-                A numpy array saving the model implied proportions. It can be used to investigate model fit.
+                A numpy array saving the sum of the model implied (expected) responses in each bin. It can be used to investigate model fit. Only updated if track_fit is True.
+            track_fit, track_green_balls: bool
+                Whether the model fit arrays and the green ball sums are updated (see enable_diagnostics), both are O(1) per game.
+            sample_every: int
+                The green ball sums are appended to item_green_balls, total_green_balls and total_num_balls every sample_every games.
+            item_green_ball_sum, total_green_ball_sum, total_ball_sum: int
+                The running number of green balls in the item urns, in all urns, and the number of balls in all urns, updated from the score changes of each game.
         
         methods:
             adaptive_rule_normal(self)
@@ -51,19 +85,63 @@ class Urnings:
             matchmaking(self, ret_adaptive_matrix: bool = False)
                 function governing the matchmaking by using either the adaptive or the nonadaptive alternatives, it can retrun the updated probability matrix for adaptive
                 item selection
-            urnings_game(player: Type(Player), item: Type(Player))
+            matchmaking_batch(player_ids: np.ndarray)
+                draws an item for each of the given players in one vectorized call (the item bins are not updated in between) and returns their idx
+            add_player(player: Type[Player]), add_item(item: Type[Player])
+                registers a new player or item in a running system
+            enable_diagnostics(fit: bool = True, green_balls: bool = True, sample_every: int = 1), disable_diagnostics()
+                switches the model fit and green ball tracking on (with one full scan of the urns) or off
+            sample_green_balls()
+                appends the current green ball sums to item_green_balls, total_green_balls and total_num_balls
+            model_fit()
+                returns the observed and model implied proportions of correct responses and the number of responses in each bin
+            urnings_game(player: Type(Player), item: Type(Player), result: Optional[int] = None)
                 The summary function which set's up the game environment. It activates after item selection and updates the item and player properties
-            play(n_games: int, test: bool = False)
+                If result is given it is used as the observed outcome instead of simulating it from the true values
+            enable_profiling(), disable_profiling()
+                attaches (removes) a Phase_Profiler timing every phase of urnings_game, counting the rejection loop iterations of the draw rule
+                and the accepted proposals. Disabled by default, when disabled the games run without any instrumentation. For details see Phase_Profiler.__doc__()
+            profile_report()
+                returns the report of the attached Phase_Profiler
+            play_compiled(engine: Compiled_Urnings, n_games: int, test: bool = False, checkpoint_every: Optional[int] = None, checkpoint_path: Optional[str] = None)
+                play() with the compiled engine
+            map_histories(path: str, chunk_size: int = 64, flush_every: Optional[int] = 1000)
+                moves the player and item histories into memory-mapped files in path/players and path/items (Result_Store.Mapped_History),
+                from here on the games are written to disk while they are played and can be read with Result_Store while the run continues.
+                The lengths are written every flush_every games (rounds in test mode, None only at the end of play), so a Result_Store.refresh()
+                sees the run up to the last flush and a crash loses at most flush_every games of it
+            ragged_histories()
+                moves the player and item histories into History.Ragged_History, which keeps every row in its own segment so the memory grows with
+                the number of games and not with players x most games of a player (used by AlsData.replay)
+            bind_histories()
+                points the players and items (and their populations) to player_history and item_history after these were replaced
+            flush_histories()
+                writes the saved values of the mapped histories to disk (called every flush_every games, with every checkpoint and at the end of play)
+            history_matrix(field: str, agents: str = "players", fill: float = np.nan)
+                exports a History field (e.g. "estimate_container") of the players or the items as a (players x games) matrix, shorter rows are padded with fill
+            play(n_games: int, test: bool = False, checkpoint_every: Optional[int] = None, checkpoint_path: Optional[str] = None)
                 The function which starts the Urnings game. Test can be used to let each player play the same amount of games. This feature can be useful with simulation studies
+                If Game_Type.engine = "vectorized" the rounds of the test mode are played by Vectorized_Urnings.
+                If Game_Type.engine = "compiled" all games are played by the numba kernel of Compiled_Urnings (the Python engine is used if numba is not installed).
+                If checkpoint_every is given the whole state is saved to checkpoint_path every checkpoint_every games (rounds in test mode), a run
+                restored with Checkpoint.load_checkpoint continues with play(n_games - urnings.game_count) exactly as the uninterrupted run would
 
 
 
     """
-    def __init__(self, players: list[Type[Player]], items: list[Type[Player]], game_type: Type[Game_Type], control_draws = 3):
+    def __init__(self, players: list[Type[Player]], items: list[Type[Player]], game_type: Type[Game_Type], control_draws = 3, rng: Optional[np.random.Generator] = None,
+                 player_urn_size: Optional[int] = None, item_urn_size: Optional[int] = None, track_fit: bool = False, track_green_balls: bool = False,
+                 sample_every: int = 1):
         # initial data for the Urnings frameweok
         self.players = players
         self.items = items
         self.game_type = game_type
+        self.rng = as_rng(rng)
+        self.data = None
+
+        #urn sizes, given explicitly if the players or the items are only added later (see add_player, add_item)
+        self.player_urn_size = self.players[0].urn_size if player_urn_size is None else player_urn_size
+        self.item_urn_size = self.items[0].urn_size if item_urn_size is None else item_urn_size
 
         #initialsing idexes
         for pl in range(len(self.players)):
@@ -72,9 +150,13 @@ class Urnings:
         for it in range(len(self.items)):
             self.items[it].idx = it
 
+        #merging the containers of the players and items into preallocated histories
+        self.player_history = History.merge(self.players)
+        self.item_history = History.merge(self.items)
+
         #containers for the paired update queue
-        self.queue_pos = {k.user_id : 0 for k in self.items}
-        self.queue_neg = {k.user_id : 0 for k in self.items}
+        self.queue_pos = Update_Queue(len(self.items))
+        self.queue_neg = Update_Queue(len(self.items))
 
         #helper attribute for the paired update queue
         sum_gb_init = 0
@@ -97,83 +179,139 @@ class Urnings:
 
         self.total_num_balls = [sum_total_init]
 
+        #running sums of the green ball tracking, updated from the score changes of each game
+        self.item_green_ball_sum = sum_gb_init
+        self.total_green_ball_sum = sum_gb_init_all
+        self.total_ball_sum = sum_total_init
+
         #arrays to calculate model fit
         if self.game_type.adaptive_urn == False:
-            self.game_type.max_urn = self.players[0].urn_size
+            self.game_type.max_urn = self.player_urn_size
 
-        self.prop_correct = np.zeros((self.game_type.max_urn +1, self.items[0].urn_size+1))
-        self.number_per_bin = np.zeros((self.game_type.max_urn +1, self.items[0].urn_size+1))
-        self.fit_correct = np.zeros((self.game_type.max_urn +1, self.items[0].urn_size+1))
-        self.adaptive_correct = np.zeros((self.game_type.max_urn +1, self.items[0].urn_size + 1))
+        self.prop_correct = np.zeros((self.game_type.max_urn +1, self.item_urn_size+1))
+        self.number_per_bin = np.zeros((self.game_type.max_urn +1, self.item_urn_size+1))
+        self.fit_correct = np.zeros((self.game_type.max_urn +1, self.item_urn_size+1))
+        self.adaptive_correct = np.zeros((self.game_type.max_urn +1, self.item_urn_size + 1))
         
         #helper attributes for the adaptive item selection
         for pl in self.players:
             pl.scaled_score = int(pl.score * (self.game_type.max_urn / pl.urn_size))
 
-        self.adaptive_matrix_binned = np.zeros((self.game_type.max_urn + 1, self.items[0].urn_size + 1))
-        for p in range(self.game_type.max_urn + 1):
-            for i in range(self.items[0].urn_size + 1):
-                self.adaptive_matrix_binned[p,i] = self.normal_method_helper(p, i, self.game_type.max_urn, self.items[0].urn_size)
+        self.adaptive_matrix_binned = binned_selection_matrix(self.game_type.max_urn, self.item_urn_size, self.game_type.selection_kernel, **self.game_type.kernel_args)
         
-        self.item_bins = {str(i):[] for i in range(self.items[0].urn_size + 1)}
-        for it in self.items:
-            bin_idx = str(int(it.score))
-            self.item_bins[bin_idx].append(it)
+        self.item_bins = Item_Bins(self.items, self.item_urn_size + 1, self.adaptive_matrix_binned)
         
         #helper attribute for data analysis
         self.game_count = 0
 
+        #games (rounds in test mode) between two flushes of the mapped histories, see map_histories
+        self.flush_every = None
+
         #helper for dev
         self.bugfix = 0
 
         self.control_draws = control_draws
 
+        #per phase timers and counters, see enable_profiling
+        self.profiler = None
+
+        #online diagnostics, see enable_diagnostics
+        self.track_fit = False
+        self.track_green_balls = False
+        self.sample_every = sample_every
+        self.diagnostic_games = 0
+        if track_fit == True or track_green_balls == True:
+            self.enable_diagnostics(track_fit, track_green_balls, sample_every)
+
     
     def normal_method_helper(self, R_i, R_j, n_i, n_j):
-        return np.exp(-2*(np.log((R_i + 1) / (n_i-R_i + 1)) - np.log((R_j + 1) / (n_j-R_j + 1)))**2)        
+        return normal_kernel(R_i, R_j, n_i, n_j)
+
+    def add_player(self, player: Type[Player]):
+        player.idx = len(self.players)
+        self.players.append(player)
+        self.player_history.add(player)
+        player.scaled_score = int(player.score * (self.game_type.max_urn / player.urn_size))
+        self.total_green_ball_sum += player.score
+        self.total_ball_sum += player.urn_size
+
+    def add_item(self, item: Type[Player]):
+        item.idx = len(self.items)
+        self.items.append(item)
+        self.item_history.add(item)
+        self.item_bins.add(item)
+        self.item_green_ball_sum += item.score
+        self.total_green_ball_sum += item.score
+        self.total_ball_sum += item.urn_size
+
+    def enable_diagnostics(self, fit: bool = True, green_balls: bool = True, sample_every: int = 1):
+        self.track_fit = fit
+        self.track_green_balls = green_balls
+        self.sample_every = sample_every
+
+        #one full scan, from here on the sums are updated from the score changes
+        if green_balls == True:
+            self.item_green_ball_sum = sum(it.score for it in self.items)
+            self.total_green_ball_sum = self.item_green_ball_sum + sum(pl.score for pl in self.players)
+            self.total_ball_sum = sum(it.urn_size for it in self.items) + sum(pl.urn_size for pl in self.players)
+
+    def disable_diagnostics(self):
+        self.track_fit = False
+        self.track_green_balls = False
+
+    def sample_green_balls(self):
+        self.item_green_balls.append(self.item_green_ball_sum)
+        self.total_green_balls.append(self.total_green_ball_sum)
+        self.total_num_balls.append(self.total_ball_sum)
+
+    def model_fit(self):
+        #observed and model implied proportion of correct responses in each (scaled player score, item score) bin
+        with np.errstate(divide="ignore", invalid="ignore"):
+            observed = np.where(self.number_per_bin > 0, self.prop_correct / self.number_per_bin, np.nan)
+            expected = np.where(self.number_per_bin > 0, self.fit_correct / self.number_per_bin, np.nan)
+        return {"observed": observed, "expected": expected, "counts": self.number_per_bin.copy()}
     
     def matchmaking(self, player_id: Optional[int] = None):
         if self.game_type.adaptivity == "n_adaptive":
             if player_id is None:
-                player_id = np.random.randint(0,len(self.players))
-            item_id = np.random.randint(0, len(self.items))
+                player_id = self.rng.integers(0, len(self.players))
+            item_id = self.rng.integers(0, len(self.items))
 
             return self.players[player_id], self.items[item_id]
         
         elif self.game_type.adaptivity == "adaptive":
             if player_id is None:
-                player_id = np.random.randint(0,len(self.players))
-            #calculating normalising constant
+                player_id = self.rng.integers(0, len(self.players))
+            #picking a bin weighted by the selection weight times the number of items in it, then an item uniformly within the bin
             player_scaled_score = self.players[player_id].scaled_score
-            selected_item_bins = self.adaptive_matrix_binned[player_scaled_score, :]
-            num_per_bin = [len(self.item_bins[str(i)]) for i in range(self.items[0].urn_size + 1)]
-
-            item_probs_unnormalised = []
-            for sib, npb in zip(selected_item_bins, num_per_bin):
-                for b in range(npb):
-                    item_probs_unnormalised.append(sib)
-            
-            item_id_list = []
-            for ib in range(self.items[0].urn_size + 1):
-                binned_item_list = self.item_bins[str(ib)]
-                for bil in binned_item_list:
-                    item_id_list.append(bil.idx)
-                    
-            item_probs_normalised = np.array(item_probs_unnormalised) / np.sum(np.array(item_probs_unnormalised))
-            item_id = np.random.choice(item_id_list, p=item_probs_normalised)
+            bin_idx = self.item_bins.random_bin(self.adaptive_matrix_binned[player_scaled_score, :], self.rng)
+            item_id = self.item_bins.random_member(bin_idx, self.rng)
             item = self.items[item_id]
             
             return self.players[player_id], item
+
+    def matchmaking_batch(self, player_ids: np.ndarray):
+        if self.game_type.adaptivity == "n_adaptive":
+            return self.rng.integers(0, len(self.items), size=len(player_ids))
+
+        elif self.game_type.adaptivity == "adaptive":
+            scaled_scores = np.array([self.players[pl].scaled_score for pl in player_ids], dtype=np.int64)
+            return self.item_bins.random_members(self.adaptive_matrix_binned, scaled_scores, self.rng)
         
-    def urnings_game(self, player: Type[Player], item: Type[Player]):
-        self.adaptive_correct[player.scaled_score, item.score] += 1
+    def urnings_game(self, player: Type[Player], item: Type[Player], result: Optional[int] = None):
+        player_bin = player.scaled_score
+        item_bin = item.score
+        self.adaptive_correct[player_bin, item_bin] += 1
+        if self.track_green_balls == True:
+            player_score_before = player.score
+            player_urn_before = player.urn_size
         #--------------------------------------calculate the estimated response-----------------------------------------#
 
-        result, expected_results = self.game_type.draw_rule(player, item) 
+        result, expected_results = self.game_type.draw_rule(player, item, self.rng, result)
         
         #--------------------------------------update the urnings -----------------------------------------------------#
         if self.game_type.adaptive_urn_type == "stakes_second_order_urnings" or self.game_type.adaptive_urn_type == "stakes_permutation":
-            player_stake = self.game_type.calculate_stakes(player, item, self.control_draws)
+            player_stake = self.game_type.calculate_stakes(player, item, self.control_draws, self.rng)
             player_proposal, item_proposal = self.game_type.updating_with_stakes(player, item, result, expected_results, player_stake)
         elif self.game_type.adaptive_urn_type == "fixed_stakes":
             player_proposal, item_proposal = self.game_type.updating_with_stakes(player, item, result, expected_results, player.previous_stake)
@@ -193,7 +331,7 @@ class Urnings:
             metropolis_corrector = 1
         
         acceptance = min(1, metropolis_corrector * adaptivity_corrector)
-        u = np.random.uniform()
+        u = self.rng.uniform()
 
         #save the   values for later methods
         player_prev = player.score
@@ -224,88 +362,214 @@ class Urnings:
             item_diff = -1
 
               
-        self.game_type.paired_update(item, self.items, item_diff, self.queue_neg, self.queue_pos)
+        paired_item = self.game_type.paired_update(item, self.items, item_diff, self.queue_neg, self.queue_pos, self.rng)
 
         #track the changes in the proportion of green balls in the whole system 
 
         #-------------------------------------Place items in a new bin after the updating is done---------------------#
-        #TODO: Optimise this
-        #adaptive item place recalculation
-        self.item_bins = {str(i):[] for i in range(self.items[0].urn_size + 1)}
-        for it in self.items:
-            bin_idx = str(it.score)
-            self.item_bins[bin_idx].append(it)
+        item_old_bin = self.item_bins.update(item)
+        if paired_item is not None:
+            paired_old_bin = self.item_bins.update(paired_item)
         
 
         #------------------------------------Save data before the adaptive urn change algos---------------------------#
         #appending new update to the container
-        player.container = np.append(player.container, player.score)
-        item.container = np.append(item.container, item.score)
+        player.history.append(player.history_row, "container", player.score)
+        item.history.append(item.history_row, "container", item.score)
 
-        player.estimate_container = np.append(player.estimate_container, player.est)
-        item.estimate_container = np.append(item.estimate_container, item.est)
+        player.history.append(player.history_row, "estimate_container", player.est)
+        item.history.append(item.history_row, "estimate_container", item.est)
 
         #appending second order results
-        player.differential_container = np.append(player.differential_container, player_diff)
-        item.differential_container = np.append(item.differential_container, item_diff)
+        player.history.append(player.history_row, "differential_container", player_diff)
+        item.history.append(item.history_row, "differential_container", item_diff)
 
         #--------------------------------------Adaptive urn change algos----------------------------------------------#
         #Second Order Urnings
-        self.game_type.second_order_urnings(player, player_diff)
+        self.game_type.second_order_urnings(player, player_diff, self.rng)
  
         #saving the second order urnings
-        player.so_container = np.append(player.so_container, player.so_est)
+        player.history.append(player.history_row, "so_container", player.so_est)
         
 
         #-------------------------------------Adaptive urn_size------------------------------------------------------#
-        self.game_type.adaptive_urn_change(player, control_draws=self.control_draws)
+        self.game_type.adaptive_urn_change(player, control_draws=self.control_draws, rng=self.rng)
         player.scaled_score = int(player.score * (self.game_type.max_urn / player.urn_size))
 
         #saving urnings values
-        player.urn_container = np.append(player.urn_container, player.urn_size)
-        item.urn_container = np.append(item.urn_container, item.urn_size)
-        player.stakes_container = np.append(player.stakes_container, player.previous_stake)
+        player.history.append(player.history_row, "urn_container", player.urn_size)
+        item.history.append(item.history_row, "urn_container", item.urn_size)
+        player.history.append(player.history_row, "stakes_container", player.previous_stake)
 
 
         #------------------------------------evaluating fit---------------------------------------------------------#
-        #self.prop_correct[player.scaled_score, item.score] += result
-        #self.number_per_bin[player.scaled_score, item.score] += 1
-        #self.fit_correct[player.scaled_score, item.score] += expected_results
+        #the outcome is binned by the scores the game was played with
+        if self.track_fit == True:
+            self.prop_correct[player_bin, item_bin] += result
+            self.number_per_bin[player_bin, item_bin] += 1
+            self.fit_correct[player_bin, item_bin] += expected_results
+
+        #------------------------------------green ball inflation---------------------------------------------------#
+        if self.track_green_balls == True:
+            item_change = item.score - item_old_bin
+            if paired_item is not None:
+                item_change += paired_item.score - paired_old_bin
+            self.item_green_ball_sum += item_change
+            self.total_green_ball_sum += item_change + player.score - player_score_before
+            self.total_ball_sum += player.urn_size - player_urn_before
+
+            self.diagnostic_games += 1
+            if self.diagnostic_games % self.sample_every == 0:
+                self.sample_green_balls()
          
             
 
-    def play(self, n_games: int, test: bool = False):
+    def enable_profiling(self):
+        if self.profiler is None:
+            self.profiler = Phase_Profiler()
+            self.profiler.attach(self)
+        return self.profiler
+
+    def disable_profiling(self):
+        if self.profiler is not None:
+            self.profiler.detach()
+            self.profiler = None
+
+    def profile_report(self):
+        if self.profiler is None:
+            raise ValueError("Profiling is not enabled, call enable_profiling() first.")
+        return self.profiler.report()
+
+    def history_matrix(self, field: str, agents: str = "players", fill: float = np.nan):
+        if agents == "players":
+            return self.player_history.to_matrix(field, fill=fill)
+        elif agents == "items":
+            return self.item_history.to_matrix(field, fill=fill)
+        else:
+            raise ValueError("agents should be either 'players' or 'items'.")
+
+    def play(self, n_games: int, test: bool = False, checkpoint_every: Optional[int] = None, checkpoint_path: Optional[str] = None):
+        if checkpoint_every is not None:
+            if checkpoint_path is None:
+                raise ValueError("checkpoint_path is needed to save checkpoints.")
+            from Checkpoint import save_checkpoint
+
+        if self.game_type.engine == "compiled":
+            from Compiled_Urnings import Compiled_Urnings, NUMBA_AVAILABLE
+            if NUMBA_AVAILABLE:
+                self.play_compiled(Compiled_Urnings(self), n_games, test, checkpoint_every, checkpoint_path)
+                self.flush_histories()
+                return
+            warnings.warn("numba is not installed, the games are played by the Python engine.")
+
+        #preallocating the player histories, every player plays once per round in test mode
+        if test == True:
+            self.player_history.reserve(np.max(self.player_history.lengths["container"]) + n_games)
+
+            if self.game_type.engine == "vectorized":
+                engine = Vectorized_Urnings.from_urnings(self)
+                for ng in range(n_games):
+                    engine.play_round()
+                    if ng % 10 == 0:
+                        print(ng)
+                    self.game_count += 1
+                    if self.track_green_balls == True:
+                        #a round costs O(players) anyway, the sums are taken from the engine
+                        self.item_green_ball_sum = int(np.sum(engine.item_score))
+                        self.total_green_ball_sum = self.item_green_ball_sum + int(np.sum(engine.player_score))
+                        previous_games = self.diagnostic_games
+                        self.diagnostic_games += len(self.players)
+                        if self.diagnostic_games // self.sample_every > previous_games // self.sample_every:
+                            self.sample_green_balls()
+                    if checkpoint_every is not None and self.game_count % checkpoint_every == 0:
+                        engine.write_back(self)
+                        save_checkpoint(self, checkpoint_path)
+                    if self.flush_every is not None and self.game_count % self.flush_every == 0:
+                        self.flush_histories()
+                engine.write_back(self)
+                self.flush_histories()
+                return
+
         for ng in range(n_games):
             if test == True:
                 for pl in range(len(self.players)):
                     current_player, current_item = self.matchmaking(pl)
                     self.urnings_game(current_player, current_item)
-
-                    #calculating the number of green balls in the item urns
-                    # sum_total = 0
-                    # sum_gb = 0
-                    # for it in self.items:
-                    #     sum_gb += it.score
-                    #     sum_total += it.urn_size
-                    
-                    # sum_gb_all = 0
-                    # for pl in self.players:
-                    #     sum_gb_all += pl.score
-                    #     sum_total += pl.urn_size
-                    
-                    # sum_gb_all += sum_gb
-                    
-                    # self.item_green_balls.append(sum_gb)
-                    # self.total_green_balls.append(sum_gb_all)
-                    # self.total_num_balls.append(sum_total)
                 if ng % 10 == 0:
                     print(ng)
             else:
                 current_player, current_item = self.matchmaking()
                 self.urnings_game(current_player, current_item)
             self.game_count += 1
-                
-
-
-
-    
\ No newline at end of file
+            if checkpoint_every is not None and self.game_count % checkpoint_every == 0:
+                save_checkpoint(self, checkpoint_path)
+            if self.flush_every is not None and self.game_count % self.flush_every == 0:
+                self.flush_histories()
+        self.flush_histories()
+
+    def map_histories(self, path: str, chunk_size: int = 64, flush_every: Optional[int] = 1000):
+        if flush_every is not None and flush_every < 1:
+            raise ValueError("flush_every should be at least 1.")
+        from Result_Store import Mapped_History
+        self.flush_every = flush_every
+        self.player_history = Mapped_History.from_history(self.player_history, os.path.join(path, "players"), chunk_size)
+        self.item_history = Mapped_History.from_history(self.item_history, os.path.join(path, "items"), chunk_size)
+        self.bind_histories()
+
+    def ragged_histories(self):
+        from History import Ragged_History
+        if not isinstance(self.player_history, Ragged_History):
+            self.player_history = Ragged_History.from_history(self.player_history)
+        if not isinstance(self.item_history, Ragged_History):
+            self.item_history = Ragged_History.from_history(self.item_history)
+        self.bind_histories()
+
+    def bind_histories(self):
+        #the rows of the players and items stay the same, only the history object is replaced
+        for agents, history in [(self.players, self.player_history), (self.items, self.item_history)]:
+            for ag in agents:
+                ag.history = history
+                if getattr(ag, "population", None) is not None:
+                    ag.population.history = history
+        #the profiler wraps the methods of the history instances, the new ones are wrapped again
+        if self.profiler is not None:
+            self.profiler.attach(self)
+
+    def flush_histories(self):
+        self.player_history.flush()
+        self.item_history.flush()
+
+    def play_compiled(self, engine, n_games: int, test: bool = False, checkpoint_every: Optional[int] = None, checkpoint_path: Optional[str] = None):
+        if checkpoint_every is not None:
+            from Checkpoint import save_checkpoint
+
+        if test == True:
+            self.player_history.reserve(np.max(self.player_history.lengths["container"]) + n_games)
+            for ng in range(n_games):
+                engine.play(len(self.players), players = np.arange(len(self.players)))
+                if ng % 10 == 0:
+                    print(ng)
+                self.game_count += 1
+                if checkpoint_every is not None and self.game_count % checkpoint_every == 0:
+                    engine.write_back()
+                    save_checkpoint(self, checkpoint_path)
+                if self.flush_every is not None and self.game_count % self.flush_every == 0:
+                    self.flush_histories()
+        else:
+            played = 0
+            while played < n_games:
+                #the games up to the next checkpoint or flush are played in one go
+                n = n_games - played
+                if checkpoint_every is not None:
+                    n = min(n, checkpoint_every - self.game_count % checkpoint_every)
+                if self.flush_every is not None:
+                    n = min(n, self.flush_every - self.game_count % self.flush_every)
+                engine.play(n)
+                played += n
+                self.game_count += n
+                if checkpoint_every is not None and self.game_count % checkpoint_every == 0:
+                    engine.write_back()
+                    save_checkpoint(self, checkpoint_path)
+                if self.flush_every is not None and self.game_count % self.flush_every == 0:
+                    self.flush_histories()
+        engine.write_back()
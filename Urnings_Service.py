@@ -0,0 +1,286 @@
+import numpy as np
+import asyncio
+import gc
+import time
+from typing import Optional
+from Agents import Player
+
+
+class Local_Transport:
+    """
+    class Local_Transport:
+        An in-process stand-in for the network transport of Urnings_Service. Clients put their requests on an asyncio.Queue and wait
+        for the reply, the service takes the requests off the queue and sets the replies. A real transport (HTTP, gRPC, a message broker)
+        only has to provide the same two coroutines.
+
+        attributes:
+            queue: asyncio.Queue
+                the requests waiting for the service, (kind, payload, reply future) tuples
+
+        methods:
+            send(kind: str, payload: dict)
+                puts a request ("next_item" or "response") on the queue and returns the future of its reply
+            request(kind: str, **payload)
+                sends a request and returns the reply of the service
+            receive()
+                returns the requests waiting for the service, at least one
+    """
+    def __init__(self):
+        self.queue = asyncio.Queue()
+
+    def send(self, kind: str, payload: dict):
+        reply = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((kind, payload, reply))
+        return reply
+
+    async def request(self, kind: str, **payload):
+        return await self.send(kind, payload)
+
+    async def receive(self):
+        requests = [await self.queue.get()]
+        while not self.queue.empty():
+            requests.append(self.queue.get_nowait())
+        return requests
+
+
+class Urnings_Service:
+    """
+    class Urnings_Service:
+        Serves an Urnings object online. The service answers "which item next" requests of learners with Urnings.matchmaking and records
+        the observed (learner, item, correct) responses with Urnings.urnings_game, the observed outcome replacing the simulated one of the
+        draw rule. Learners and items are created when their id first appears, like in AlsData.replay.
+
+        Selection requests arriving within max_wait seconds of each other (at most max_batch of them) are answered together by one
+        Urnings.matchmaking_batch call. The updates of a learner are serialised: serve() records the responses synchronously in the order
+        they arrived, and requests going through handle() take the lock of the learner, so a selection request waits for the responses of
+        the learner which arrived before it.
+
+        attributes:
+            urnings: Urnings
+                the system the service runs on
+            transport: Local_Transport
+                the transport the requests are received from
+            max_batch: int
+                the maximum number of selection requests answered by one matchmaking_batch call
+            max_wait: float
+                the maximum time (seconds) a selection request waits for other requests to be batched with
+            players, items: dict
+                user id -> Player object of the learners and items
+            n_responses, n_selections, n_batches: int
+                the number of recorded responses, answered selection requests and matchmaking_batch calls
+
+        methods:
+            next_item(learner_id)
+                returns the user id of the next item of the learner
+            record_response(learner_id, item_id, correct)
+                updates the learner and the item with the observed outcome
+            handle(kind: str, payload: dict)
+                answers one request of the transport
+            serve()
+                answers the requests of the transport until it is cancelled, requests of learners without a pending response are
+                answered without creating a task. The objects alive when it starts are moved out of the garbage collector (gc.freeze)
+                while it runs, they are moved back (gc.unfreeze) when it is cancelled or fails
+    """
+    def __init__(self, urnings, transport: Optional[Local_Transport] = None, max_batch: int = 256, max_wait: float = 0.001):
+        if len(urnings.items) == 0:
+            raise ValueError("The service needs at least one item to select from.")
+
+        self.urnings = urnings
+        self.transport = Local_Transport() if transport is None else transport
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.players = {pl.user_id : pl for pl in urnings.players}
+        self.items = {it.user_id : it for it in urnings.items}
+
+        self.n_responses = 0
+        self.n_selections = 0
+        self.n_batches = 0
+
+        self._locks = {}
+        self._pending = []
+        self._flush_handle = None
+
+    def _player(self, learner_id):
+        player = self.players.get(learner_id)
+        if player is None:
+            player = Player(learner_id, self.urnings.player_urn_size // 2, self.urnings.player_urn_size, None)
+            self.urnings.add_player(player)
+            self.players[learner_id] = player
+        return player
+
+    def _item(self, item_id):
+        item = self.items.get(item_id)
+        if item is None:
+            item = Player(item_id, self.urnings.item_urn_size // 2, self.urnings.item_urn_size, None)
+            self.urnings.add_item(item)
+            self.items[item_id] = item
+        return item
+
+    def _lock(self, learner_id):
+        lock = self._locks.get(learner_id)
+        if lock is None:
+            lock = self._locks[learner_id] = asyncio.Lock()
+        return lock
+
+    def _flush(self):
+        self._flush_handle = None
+        pending = self._pending
+        self._pending = []
+        if len(pending) == 0:
+            return
+
+        item_idx = self.urnings.matchmaking_batch(np.array([row for row, _ in pending], dtype=np.int64))
+        for (_, reply), idx in zip(pending, item_idx):
+            if not reply.done():
+                reply.set_result(self.urnings.items[idx].user_id)
+        self.n_selections += len(pending)
+        self.n_batches += 1
+
+    def _select(self, learner_id, reply: asyncio.Future):
+        self._pending.append((self._player(learner_id).idx, reply))
+        if len(self._pending) >= self.max_batch:
+            if self._flush_handle is not None:
+                self._flush_handle.cancel()
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+
+    def _update(self, learner_id, item_id, correct):
+        self.urnings.urnings_game(self._player(learner_id), self._item(item_id), int(correct))
+        self.urnings.game_count += 1
+        self.n_responses += 1
+
+    def _busy(self, learner_id):
+        lock = self._locks.get(learner_id)
+        return lock is not None and lock.locked()
+
+    async def next_item(self, learner_id):
+        #waiting for the responses of the learner which arrived earlier
+        async with self._lock(learner_id):
+            pass
+
+        reply = asyncio.get_running_loop().create_future()
+        self._select(learner_id, reply)
+        return await reply
+
+    async def record_response(self, learner_id, item_id, correct):
+        async with self._lock(learner_id):
+            self._update(learner_id, item_id, correct)
+
+    async def handle(self, kind: str, payload: dict):
+        if kind == "next_item":
+            return await self.next_item(payload["learner_id"])
+        elif kind == "response":
+            await self.record_response(payload["learner_id"], payload["item_id"], payload["correct"])
+            return None
+        else:
+            raise ValueError("The request kind should be either 'next_item' or 'response'.")
+
+    async def _answer(self, kind: str, payload: dict, reply: asyncio.Future):
+        try:
+            result = await self.handle(kind, payload)
+        except Exception as error:
+            if not reply.done():
+                reply.set_exception(error)
+        else:
+            if not reply.done():
+                reply.set_result(result)
+
+    async def serve(self):
+        #the players, items and histories live as long as the service, freezing them keeps them out of the garbage collections
+        #triggered by the short lived request objects (they dominated the tail latency). They are unfrozen when the service stops
+        gc.freeze()
+        tasks = set()
+        try:
+            while True:
+                for kind, payload, reply in await self.transport.receive():
+                    #nothing of the learner is pending, the request can be answered in order right away
+                    if kind == "next_item" and not self._busy(payload["learner_id"]):
+                        self._select(payload["learner_id"], reply)
+                    elif kind == "response" and not self._busy(payload["learner_id"]):
+                        try:
+                            self._update(payload["learner_id"], payload["item_id"], payload["correct"])
+                        except Exception as error:
+                            reply.set_exception(error)
+                        else:
+                            reply.set_result(None)
+                    else:
+                        task = asyncio.create_task(self._answer(kind, payload, reply))
+                        tasks.add(task)
+                        task.add_done_callback(tasks.discard)
+        finally:
+            gc.unfreeze()
+
+
+async def load_test(service: Urnings_Service, rate: float = 10000, duration: float = 2.0, response_share: float = 0.5, seed: Optional[int] = None):
+    """
+    Open loop load test of a service: requests are sent at a fixed rate whether or not the earlier ones were answered, the latency of a
+    request is measured from the time it was due, so a service falling behind shows up in the tail. Every request is a response with
+    probability response_share (a random item, correct with the probability given by the true values, 0.5 without them) and a selection
+    request otherwise, the learners are picked uniformly from the service's learners.
+
+        service: Urnings_Service
+            the service to test, it is served on its transport during the test
+        rate: float
+            requests per second
+        duration: float
+            the length of the test (seconds)
+
+    returns:
+        dict with the number of requests, the achieved rate, the p50, p99 and max latency (ms) and the mean selection batch size
+    """
+    rng = np.random.default_rng(seed)
+    n_requests = int(rate * duration)
+    learner_ids = list(service.players)
+    item_ids = list(service.items)
+
+    #the requests are drawn up front so the load generator costs as little as possible
+    learners = rng.integers(0, len(learner_ids), n_requests)
+    items = rng.integers(0, len(item_ids), n_requests)
+    is_response = rng.uniform(size=n_requests) < response_share
+    learner_true = np.array([np.nan if service.players[l].true_value is None else service.players[l].true_value for l in learner_ids])
+    item_true = np.array([np.nan if service.items[i].true_value is None else service.items[i].true_value for i in item_ids])
+    p = np.nan_to_num(service.urnings.game_type.conditional_probability(learner_true[learners], item_true[items]), nan=0.5)
+    correct = (rng.uniform(size=n_requests) < p).astype(np.int64)
+
+    latencies = np.full(n_requests, np.nan)
+    def done(k: int, due: float):
+        def callback(reply):
+            latencies[k] = time.perf_counter() - due
+        return callback
+
+    server = asyncio.create_task(service.serve())
+    replies = []
+    batches_before, selections_before = service.n_batches, service.n_selections
+    start = time.perf_counter()
+    sent = 0
+    while sent < n_requests:
+        #sending every request which is due, the event loop does not wake up 10k times a second
+        due_count = min(n_requests, int((time.perf_counter() - start) * rate) + 1)
+        for k in range(sent, due_count):
+            if is_response[k]:
+                payload = {"learner_id": learner_ids[learners[k]], "item_id": item_ids[items[k]], "correct": int(correct[k])}
+                reply = service.transport.send("response", payload)
+            else:
+                reply = service.transport.send("next_item", {"learner_id": learner_ids[learners[k]]})
+            reply.add_done_callback(done(k, start + k / rate))
+            replies.append(reply)
+        sent = due_count
+        await asyncio.sleep(max(0, start + sent / rate - time.perf_counter()))
+
+    await asyncio.gather(*replies)
+    elapsed = time.perf_counter() - start
+    server.cancel()
+    try:
+        await server
+    except asyncio.CancelledError:
+        pass
+
+    latencies = latencies * 1000
+    n_batches = service.n_batches - batches_before
+    return {"requests": n_requests,
+            "rate": n_requests / elapsed,
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+            "max_ms": float(np.max(latencies)),
+            "mean_batch": (service.n_selections - selections_before) / max(n_batches, 1)}
@@ -0,0 +1,289 @@
+import numpy as np
+from typing import Optional, Type
+from Game_Type import Game_Type
+from History import History
+from Random_Streams import GLOBAL_RNG
+
+class Vectorized_Urnings:
+    """
+    class Vectorized_Urnings:
+        A synchronous round engine for Urnings.play(test = True) (selected with Game_Type(engine = "vectorized")). The player and item
+        states are kept in numpy arrays and a whole round of players is processed as a batch of array operations.
+
+        Every player draws its item at the beginning of the round (using the item bins of that moment). The games of the round are
+        then played in waves, a wave contains at most one game per item, so no item update is lost and the Metropolis and adaptivity
+        corrections see the item scores updated by the previous waves. Apart from the item selection using the bins from the start of
+        the round, the updates follow Game_Type.draw_rule, updating_rule, metropolis_correction, adaptivity_correction and
+        second_order_urnings. Outcomes are sampled with Game_Type.draw_rule_batch, i.e. directly from the conditional probability.
+        Supported options: alg_type "Urnings1" and "Urnings2", adaptivity "adaptive" and "n_adaptive", no paired update and no
+        adaptive urn size algorithms.
+
+        attributes:
+            game_type: Game_Type
+                the Game_Type object governing the game
+            player_score, player_urn_size, player_true_value, player_scaled_score: np.ndarray
+                the scores, urn sizes, true values and scaled scores (row index of adaptive_matrix_binned) of the players
+            so_score, so_urn_size: np.ndarray
+                the second order urn of the players
+            player_stake: np.ndarray
+                the stakes of the players (only saved into the history)
+            item_score, item_urn_size, item_true_value: np.ndarray
+                the scores, urn sizes and true values of the items
+            adaptive_matrix_binned: np.ndarray
+                the selection weight of the item bins for each scaled player score
+            bin_counts: np.ndarray
+                the number of items in each item bin
+            adaptive_correct: np.ndarray
+                counts of the played (scaled player score, item score) pairs
+            prop_correct, number_per_bin, fit_correct: np.ndarray
+                the model fit arrays of Urnings (None if Urnings.track_fit is False)
+            n_accepted: int
+                the number of accepted Metropolis proposals
+            rng: Buffered_RNG
+                the random stream of the engine (see Random_Streams)
+            player_history, item_history: History
+                the histories the results are saved into, player_rows and item_rows give the row of every player and item
+
+        methods:
+            from_urnings(urnings: Urnings)
+                creates the engine from the current state of an Urnings object
+            write_back(urnings: Urnings)
+                copies the state of the engine back to the Player objects and the item bins of the Urnings object
+            select_items(players: np.ndarray)
+                draws an item for each of the given players
+            play_batch(players: np.ndarray, items: np.ndarray)
+                plays one game for every (player, item) pair, the items have to be distinct
+            play_round()
+                every player plays one game
+            play(n_rounds: int)
+                plays n_rounds rounds
+    """
+    def __init__(self,
+                 game_type: Type[Game_Type],
+                 player_score: np.ndarray,
+                 player_urn_size: np.ndarray,
+                 player_true_value: np.ndarray,
+                 item_score: np.ndarray,
+                 item_urn_size: np.ndarray,
+                 item_true_value: np.ndarray,
+                 adaptive_matrix_binned: np.ndarray,
+                 so_score: Optional[np.ndarray] = None,
+                 so_urn_size: Optional[np.ndarray] = None,
+                 player_stake: Optional[np.ndarray] = None,
+                 player_history: Optional[History] = None,
+                 player_rows: Optional[np.ndarray] = None,
+                 item_history: Optional[History] = None,
+                 item_rows: Optional[np.ndarray] = None,
+                 rng = GLOBAL_RNG):
+
+        self.check_game_type(game_type)
+        self.game_type = game_type
+        self.rng = rng
+
+        n_players = len(player_score)
+        self.player_score = np.asarray(player_score, dtype=np.int64)
+        self.player_urn_size = np.asarray(player_urn_size, dtype=np.int64)
+        self.player_true_value = np.asarray(player_true_value, dtype=np.float64)
+        self.so_urn_size = np.full(n_players, 10, dtype=np.int64) if so_urn_size is None else np.asarray(so_urn_size, dtype=np.int64)
+        self.so_score = np.round(self.so_urn_size / 2).astype(np.int64) if so_score is None else np.asarray(so_score, dtype=np.int64)
+        self.player_stake = np.full(n_players, 16, dtype=np.int64) if player_stake is None else np.asarray(player_stake, dtype=np.int64)
+
+        self.item_score = np.asarray(item_score, dtype=np.int64)
+        self.item_urn_size = np.asarray(item_urn_size, dtype=np.int64)
+        self.item_true_value = np.asarray(item_true_value, dtype=np.float64)
+
+        self.adaptive_matrix_binned = adaptive_matrix_binned
+        self.max_urn = adaptive_matrix_binned.shape[0] - 1
+        self.player_scaled_score = (self.player_score * (self.max_urn / self.player_urn_size)).astype(np.int64)
+        self.bin_counts = np.bincount(self.item_score, minlength=adaptive_matrix_binned.shape[1])
+        self.adaptive_correct = np.zeros(adaptive_matrix_binned.shape)
+        self.n_accepted = 0
+
+        #model fit arrays, only updated if given (see from_urnings)
+        self.prop_correct = None
+        self.number_per_bin = None
+        self.fit_correct = None
+
+        self.player_history = player_history
+        self.player_rows = np.arange(n_players) if player_rows is None else np.asarray(player_rows)
+        self.item_history = item_history
+        self.item_rows = np.arange(len(item_score)) if item_rows is None else np.asarray(item_rows)
+
+    @staticmethod
+    def check_game_type(game_type: Type[Game_Type]):
+        if game_type.alg_type not in ["Urnings1", "Urnings2"]:
+            raise ValueError("The vectorized engine supports alg_type 'Urnings1' and 'Urnings2'.")
+        if game_type.adaptivity not in ["adaptive", "n_adaptive"]:
+            raise ValueError("The vectorized engine supports adaptivity 'adaptive' and 'n_adaptive'.")
+        if game_type.item_pair_update == True:
+            raise ValueError("The vectorized engine does not support the paired update.")
+        if game_type.adaptive_urn == True or game_type.adaptive_urn_type is not None:
+            raise ValueError("The vectorized engine does not support adaptive urn size algorithms.")
+
+    @classmethod
+    def from_urnings(cls, urnings):
+        players = urnings.players
+        items = urnings.items
+        engine = cls(urnings.game_type,
+                     player_score = [pl.score for pl in players],
+                     player_urn_size = [pl.urn_size for pl in players],
+                     player_true_value = [pl.true_value for pl in players],
+                     item_score = [it.score for it in items],
+                     item_urn_size = [it.urn_size for it in items],
+                     item_true_value = [it.true_value for it in items],
+                     adaptive_matrix_binned = urnings.adaptive_matrix_binned,
+                     so_score = [pl.so_score for pl in players],
+                     so_urn_size = [pl.so_urn_size for pl in players],
+                     player_stake = [pl.previous_stake for pl in players],
+                     player_history = urnings.player_history,
+                     player_rows = [pl.history_row for pl in players],
+                     item_history = urnings.item_history,
+                     item_rows = [it.history_row for it in items],
+                     rng = urnings.rng)
+        engine.adaptive_correct = urnings.adaptive_correct
+        if urnings.track_fit == True:
+            engine.prop_correct = urnings.prop_correct
+            engine.number_per_bin = urnings.number_per_bin
+            engine.fit_correct = urnings.fit_correct
+        return engine
+
+    def write_back(self, urnings):
+        for pl, score, so_score in zip(urnings.players, self.player_score.tolist(), self.so_score.tolist()):
+            pl.score = score
+            pl.est = pl.score / pl.urn_size
+            pl.scaled_score = int(pl.score * (self.max_urn / pl.urn_size))
+            pl.so_score = so_score
+            pl.so_est = pl.so_score / pl.so_urn_size
+
+        for it, score in zip(urnings.items, self.item_score.tolist()):
+            it.score = score
+            it.est = it.score / it.urn_size
+            urnings.item_bins.update(it)
+
+        urnings.bugfix += self.n_accepted
+        self.n_accepted = 0
+
+    def select_items(self, players: np.ndarray):
+        if self.game_type.adaptivity == "n_adaptive":
+            return self.rng.integers(0, len(self.item_score), len(players))
+
+        #first picking a bin weighted by the selection weight times the number of items in the bin
+        weights = self.adaptive_matrix_binned * self.bin_counts
+        cumulative = np.cumsum(weights, axis=1)
+        scaled_scores = self.player_scaled_score[players]
+        u_bin = self.rng.random(len(players))
+        bins = np.empty(len(players), dtype=np.int64)
+        for s in np.unique(scaled_scores):
+            selected = scaled_scores == s
+            bins[selected] = np.searchsorted(cumulative[s], u_bin[selected] * cumulative[s, -1], side="right")
+        bins = np.minimum(bins, len(self.bin_counts) - 1)
+
+        #then an item uniformly within the bin
+        order = np.argsort(self.item_score, kind="stable")
+        starts = np.cumsum(self.bin_counts) - self.bin_counts
+        within = (self.rng.random(len(players)) * self.bin_counts[bins]).astype(np.int64)
+        return order[starts[bins] + within]
+
+    def play_batch(self, players: np.ndarray, items: np.ndarray):
+        player_score = self.player_score[players]
+        player_urn_size = self.player_urn_size[players]
+        item_score = self.item_score[items]
+        item_urn_size = self.item_urn_size[items]
+        scaled_score = self.player_scaled_score[players]
+        np.add.at(self.adaptive_correct, (scaled_score, item_score), 1)
+
+        #--------------------------------------calculate the estimated response-----------------------------------------#
+        result, expected_results = self.game_type.draw_rule_batch(player_score, player_urn_size, self.player_true_value[players],
+                                                                  item_score, item_urn_size, self.item_true_value[items], self.rng)
+        if self.prop_correct is not None:
+            np.add.at(self.prop_correct, (scaled_score, item_score), result)
+            np.add.at(self.number_per_bin, (scaled_score, item_score), 1)
+            np.add.at(self.fit_correct, (scaled_score, item_score), expected_results)
+
+        #--------------------------------------update the urnings -----------------------------------------------------#
+        player_proposal = np.clip(player_score + result - expected_results, 0, player_urn_size)
+        item_proposal = np.clip(item_score - result + expected_results, 0, item_urn_size)
+
+        #--------------------------------------calculate metropolis correction————————————————————————————————————————–#
+        if self.game_type.adaptivity == "adaptive":
+            normaliser = self.adaptive_matrix_binned @ self.bin_counts
+            proposal_scaled = (player_proposal * (self.max_urn / player_urn_size)).astype(np.int64)
+            current_selection_prob = self.adaptive_matrix_binned[scaled_score, item_score] / normaliser[scaled_score]
+            proposed_normaliser = (normaliser[proposal_scaled]
+                                   - self.adaptive_matrix_binned[proposal_scaled, item_score]
+                                   + self.adaptive_matrix_binned[proposal_scaled, item_proposal])
+            proposed_selection_prob = self.adaptive_matrix_binned[proposal_scaled, item_proposal] / proposed_normaliser
+            adaptivity_corrector = proposed_selection_prob / current_selection_prob
+        else:
+            adaptivity_corrector = 1
+
+        if self.game_type.alg_type == "Urnings1":
+            old_score = player_score * (player_urn_size - item_score) + (item_urn_size - player_score) * item_score
+            new_score = player_proposal * (player_urn_size - item_proposal) + (item_urn_size - player_proposal) * item_proposal
+            with np.errstate(divide="ignore", invalid="ignore"):
+                #a division by zero counts as 1 like in urnings_game
+                metropolis_corrector = np.where(new_score != 0, old_score / np.where(new_score != 0, new_score, 1), 1.0)
+        else:
+            metropolis_corrector = 1
+
+        #min(1, nan) is 1 in urnings_game
+        ratio = metropolis_corrector * adaptivity_corrector
+        acceptance = np.where(np.isnan(ratio), 1, np.minimum(1, ratio))
+        accepted = self.rng.random(len(players)) < acceptance
+        self.n_accepted += int(np.sum(accepted))
+
+        new_player_score = np.where(accepted, player_proposal, player_score)
+        new_item_score = np.where(accepted, item_proposal, item_score)
+        self.player_score[players] = new_player_score
+        self.item_score[items] = new_item_score
+        self.player_scaled_score[players] = (new_player_score * (self.max_urn / player_urn_size)).astype(np.int64)
+        np.add.at(self.bin_counts, item_score, -1)
+        np.add.at(self.bin_counts, new_item_score, 1)
+
+        player_diff = np.clip(new_player_score - player_score, -1, 1)
+        item_diff = np.clip(new_item_score - item_score, -1, 1)
+
+        #--------------------------------------Second Order Urnings---------------------------------------------------#
+        so_score = self.so_score[players]
+        so_urn_size = self.so_urn_size[players]
+        so_expected = self.rng.random(len(players)) < so_score / so_urn_size
+        so_score = so_score + np.maximum(player_diff, 0) - so_expected
+        self.so_score[players] = so_score
+
+        #------------------------------------Save data---------------------------------------------------------------#
+        if self.player_history is not None:
+            rows = self.player_rows[players]
+            self.player_history.append_rows(rows, "container", new_player_score)
+            self.player_history.append_rows(rows, "estimate_container", new_player_score / player_urn_size)
+            self.player_history.append_rows(rows, "differential_container", player_diff)
+            self.player_history.append_rows(rows, "so_container", so_score / so_urn_size)
+            self.player_history.append_rows(rows, "urn_container", player_urn_size)
+            self.player_history.append_rows(rows, "stakes_container", self.player_stake[players])
+
+        if self.item_history is not None:
+            rows = self.item_rows[items]
+            self.item_history.append_rows(rows, "container", new_item_score)
+            self.item_history.append_rows(rows, "estimate_container", new_item_score / item_urn_size)
+            self.item_history.append_rows(rows, "differential_container", item_diff)
+            self.item_history.append_rows(rows, "urn_container", item_urn_size)
+
+    def play_round(self):
+        players = np.arange(len(self.player_score))
+        items = self.select_items(players)
+
+        #the k-th wave contains the k-th player of every item, so the items within a wave are distinct
+        order = np.argsort(items, kind="stable")
+        sorted_items = items[order]
+        group_start = np.flatnonzero(np.r_[True, sorted_items[1:] != sorted_items[:-1]])
+        group_sizes = np.diff(np.r_[group_start, len(sorted_items)])
+        wave = np.arange(len(sorted_items)) - np.repeat(group_start, group_sizes)
+
+        wave_order = np.argsort(wave, kind="stable")
+        wave_bounds = np.r_[0, np.cumsum(np.bincount(wave))]
+        for w in range(len(wave_bounds) - 1):
+            batch = order[wave_order[wave_bounds[w]:wave_bounds[w + 1]]]
+            self.play_batch(players[batch], items[batch])
+
+    def play(self, n_rounds: int):
+        for nr in range(n_rounds):
+            self.play_round()
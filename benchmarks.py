@@ -0,0 +1,253 @@
+"""
+Benchmark suite of Urnings.play. Every Game_Type mode (adaptivity x alg_type x adaptive_urn_type x paired_update) is timed on
+populations from 100 to 100k players and item banks from 50 to 10k items. For every cell it reports games/sec, the peak memory
+of playing (tracemalloc) and the share of the profiled time spent in each phase of the game (Phase_Profiler). The results are saved as
+JSON, two result files can be compared to catch regressions between commits.
+
+    python benchmarks.py run --scale quick --out bench.json
+    python benchmarks.py compare baseline.json bench.json --threshold 0.1
+    python benchmarks.py service --rate 10000 --duration 5
+    python benchmarks.py imports --budget 300
+
+The imports command times the cold import of the simulation core in fresh interpreters (every process-pool worker pays it) and
+fails if it is over the budget or pulls in one of the analysis packages. The service command load tests Urnings_Service (see Urnings_Service.load_test) and reports the p50/p99 latency.
+"""
+import numpy as np
+import argparse
+import io
+import json
+import contextlib
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Optional
+from Agents import Player
+from Game_Type import Game_Type
+from Urnings import Urnings
+
+#(players, items) of each scale
+SCALES = {"quick": [(100, 50), (1000, 200)],
+          "full": [(100, 50), (1000, 200), (10000, 1000), (100000, 10000)]}
+
+#options of the adaptive urn size algorithms
+URN_OPTIONS = {None: {},
+               "permutation": dict(adaptive_urn=True, window=10, min_urn=8, max_urn=64, permutation_test=True, perm_p_val=0.1),
+               "second_order_urnings": dict(adaptive_urn=True, window=10, min_urn=8, max_urn=64),
+               "stakes_permutation": dict(adaptive_urn=True, window=6, min_urn=8, max_urn=64, max_stakes=4),
+               "stakes_second_order_urnings": dict(adaptive_urn=True, window=6, min_urn=8, max_urn=64, max_stakes=4),
+               "fixed_stakes": dict(adaptive_urn=True, min_urn=8, max_urn=64)}
+
+#the modules a simulation worker imports and the packages they should not load (see core)
+CORE_MODULES = ["Urnings", "Replications", "Sweeps", "Population", "Checkpoint", "Sharded_Urnings"]
+HEAVY_PACKAGES = ["scipy", "matplotlib", "numba", "pandas"]
+
+
+def benchmark_configs():
+    #every combination of the Game_Type modes
+    configs = []
+    for adaptivity in ["adaptive", "n_adaptive"]:
+        for alg_type in ["Urnings1", "Urnings2"]:
+            for urn_type, options in URN_OPTIONS.items():
+                for paired_update in [False, True]:
+                    configs.append(dict(adaptivity=adaptivity, alg_type=alg_type, adaptive_urn_type=urn_type, paired_update=paired_update, **options))
+    return configs
+
+
+def build_urnings(config: dict, n_players: int, n_items: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    item_values = rng.uniform(size=n_items)
+    item_scores = rng.binomial(64, item_values)
+    items = [Player("Item" + str(i), int(item_scores[i]), 64, float(item_values[i])) for i in range(n_items)]
+
+    #the urn size algorithms which grow the urns start from the minimum urn size
+    urn_size = config["min_urn"] if config.get("adaptive_urn_type") in ["permutation", "second_order_urnings"] else 64
+    player_values = rng.uniform(size=n_players)
+    players = [Player("Player" + str(p), urn_size // 2, urn_size, float(player_values[p])) for p in range(n_players)]
+
+    return Urnings(players, items, Game_Type(**config), rng=rng)
+
+
+def run_benchmark(config: dict, n_players: int, n_items: int, n_games: int = 5000, seed: int = 0, repeats: int = 3):
+    """
+    Times Urnings.play(n_games) for one Game_Type configuration and population size.
+
+        config: dict
+            the Game_Type keyword arguments
+        n_players, n_items: int
+            the size of the population and the item bank
+        n_games: int
+            the number of games played per measurement
+        seed: int
+            the seed of the population and the random stream
+        repeats: int
+            the number of timed repetitions, the fastest one is reported
+
+    returns:
+        dict with the configuration, the sizes, games_per_sec, peak_memory (bytes allocated while playing), setup_seconds and phases
+    """
+    timings = []
+    for r in range(repeats):
+        start = time.perf_counter()
+        urnings = build_urnings(config, n_players, n_items, seed)
+        if r == 0:
+            setup_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        urnings.play(n_games)
+        timings.append(time.perf_counter() - start)
+
+    #the memory and the profile are measured in separate runs, both slow down the games
+    urnings = build_urnings(config, n_players, n_items, seed)
+    tracemalloc.start()
+    urnings.play(n_games)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    #the share of the profiled time spent in each phase (see Phase_Profiler.PHASES), other is the bookkeeping of urnings_game itself
+    urnings = build_urnings(config, n_players, n_items, seed)
+    urnings.enable_profiling()
+    urnings.play(n_games)
+    report = urnings.profile_report()
+
+    return {"config": config,
+            "n_players": n_players,
+            "n_items": n_items,
+            "n_games": n_games,
+            "games_per_sec": n_games / min(timings),
+            "peak_memory": peak_memory,
+            "setup_seconds": setup_seconds,
+            "phases": {phase: value["share"] for phase, value in report["phases"].items()}}
+
+
+def import_time(module: str, repeats: int = 5):
+    """
+    Times the cold import of a module in repeats fresh interpreters (the median is returned) and lists the heavy packages it loads.
+    numpy itself is timed the same way as the floor of every module.
+    """
+    code = ("import sys, time, json; t = time.perf_counter(); import " + module +
+            "; print(json.dumps([time.perf_counter() - t, [p for p in " + repr(HEAVY_PACKAGES) + " if p in sys.modules]]))")
+    times = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        seconds, heavy = json.loads(output.stdout.strip().splitlines()[-1])
+        times.append(seconds)
+    return {"module": module, "ms": 1000 * float(np.median(times)), "heavy": heavy}
+
+
+def result_key(result: dict):
+    return json.dumps({"config": result["config"], "n_players": result["n_players"], "n_items": result["n_items"]}, sort_keys=True)
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"commit": commit,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "date": time.strftime("%Y-%m-%d %H:%M:%S")}
+
+
+def run_suite(scale: str = "quick", n_games: int = 5000, seed: int = 0, repeats: int = 3, configs: Optional[list] = None, verbose: bool = True):
+    configs = benchmark_configs() if configs is None else configs
+    results = []
+    for n_players, n_items in SCALES[scale]:
+        for config in configs:
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = run_benchmark(config, n_players, n_items, n_games, seed, repeats)
+            results.append(result)
+            if verbose:
+                print(n_players, n_items, config["adaptivity"], config["alg_type"], config["adaptive_urn_type"], config["paired_update"],
+                      int(result["games_per_sec"]), "games/sec")
+
+    return {"environment": environment(), "results": results}
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.1):
+    #the cells whose games/sec dropped by more than threshold (as a fraction of the baseline)
+    baseline_results = {result_key(r): r for r in baseline["results"]}
+    regressions = []
+    for r in current["results"]:
+        b = baseline_results.get(result_key(r))
+        if b is not None:
+            change = r["games_per_sec"] / b["games_per_sec"] - 1
+            if change < -threshold:
+                regressions.append({"config": r["config"], "n_players": r["n_players"], "n_items": r["n_items"],
+                                    "baseline": b["games_per_sec"], "current": r["games_per_sec"], "change": change})
+    return regressions
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="Benchmarks of Urnings.play")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmark suite")
+    run_parser.add_argument("--scale", choices=list(SCALES), default="quick")
+    run_parser.add_argument("--games", type=int, default=5000)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--repeats", type=int, default=3)
+    run_parser.add_argument("--out", default="bench.json")
+
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.1)
+
+    service_parser = commands.add_parser("service", help="load test the online service")
+    service_parser.add_argument("--players", type=int, default=10000)
+    service_parser.add_argument("--items", type=int, default=1000)
+    service_parser.add_argument("--adaptivity", choices=["adaptive", "n_adaptive"], default="adaptive")
+    service_parser.add_argument("--rate", type=float, default=10000)
+    service_parser.add_argument("--duration", type=float, default=5.0)
+    service_parser.add_argument("--seed", type=int, default=0)
+
+    imports_parser = commands.add_parser("imports", help="time the cold import of the simulation core")
+    imports_parser.add_argument("--budget", type=float, default=300, help="milliseconds")
+    imports_parser.add_argument("--repeats", type=int, default=5)
+
+    args = parser.parse_args(argv)
+    if args.command == "imports":
+        floor = import_time("numpy", args.repeats)
+        print("numpy: %.0f ms" % floor["ms"])
+        failed = 0
+        for module in CORE_MODULES:
+            result = import_time(module, args.repeats)
+            over = result["ms"] > args.budget or len(result["heavy"]) > 0
+            failed += over
+            print("%s: %.0f ms%s%s" % (module, result["ms"], " loads " + ", ".join(result["heavy"]) if len(result["heavy"]) > 0 else "", " OVER BUDGET" if over else ""))
+        print(failed, "modules over the budget of", args.budget, "ms")
+        return 1 if failed > 0 else 0
+
+    if args.command == "service":
+        import asyncio
+        from Urnings_Service import Urnings_Service, load_test
+        config = dict(adaptivity=args.adaptivity, alg_type="Urnings2", adaptive_urn_type=None, paired_update=False)
+        service = Urnings_Service(build_urnings(config, args.players, args.items, args.seed))
+        report = asyncio.run(load_test(service, args.rate, args.duration, seed=args.seed))
+        print("%d requests at %.0f/sec: p50 %.2f ms, p99 %.2f ms, max %.2f ms, %.1f selections per batch" %
+              (report["requests"], report["rate"], report["p50_ms"], report["p99_ms"], report["max_ms"], report["mean_batch"]))
+        return 0
+
+    if args.command == "run":
+        results = run_suite(args.scale, args.games, args.seed, args.repeats)
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=1)
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    regressions = compare(baseline, current, args.threshold)
+    for r in regressions:
+        print("regression:", r["config"], r["n_players"], r["n_items"], int(r["baseline"]), "->", int(r["current"]), "games/sec")
+    print(len(regressions), "regressions")
+    return 1 if len(regressions) > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,31 @@
+"""
+The helpers of the simulation core which Game_Type needs at import time. They only depend on numpy and the standard library, so
+importing Urnings (e.g. in every process-pool worker) does not pull in scipy or matplotlib. The analysis helpers stay in utilities
+and metrics, utilities re-exports the functions below.
+"""
+import numpy as np
+import itertools
+import math
+
+
+def all_binary_combination(window):
+
+    lst = [list(i) for i in itertools.product([-1, 1], repeat=window)]
+    binary_combinations = np.array(lst)
+    return binary_combinations
+
+
+def permutation_p_values(window):
+    #p values of the exact sign flip permutation test of a window of differences from {-1, 0, 1}
+    #flipping the sign of a zero changes nothing, so the p value only depends on the number of nonzero differences k and |sum of differences| a,
+    #the permuted sums are then 2B - k with B ~ Binomial(k, 1/2), table[k, a] = 1 - P(2B - k < a)
+    table = np.ones((window + 1, window + 1))
+    for k in range(window + 1):
+        for a in range(k + 1):
+            below = sum(math.comb(k, b) for b in range(k + 1) if 2 * b - k < a)
+            table[k, a] = 1 - below / 2 ** k
+    return table
+
+
+def pRasch(u,v,n,m):
+    return ((u*(m-v))/(u*(m-v)+(n-u)*v))
@@ -0,0 +1,110 @@
+"""
+Vectorized evaluation metrics for the result matrices of Urnings (e.g. Urnings.history_matrix("estimate_container")).
+Every function works on a single (players x games) matrix or on stacked replications (reps x players x games) in one call,
+games are always the last axis and players the second to last one. Metrics computed from column means take (... x games)
+arrays, e.g. np.mean(matrices, axis=-2).
+"""
+import numpy as np
+from typing import Optional
+
+#returned by hitting_time and hitting_below if the chain never hits
+NEVER = 999
+
+
+def drifting_true_value(n_games: int, start: float = 0.5, change: float = 0.0):
+    #the true value of a player whose ability changes by change after every game
+    return start + change * np.arange(n_games)
+
+
+def percentiles(matrix: np.ndarray, q = (5, 95), axis: int = -2):
+    #the percentiles of every game over the players, shape (len(q), ... x games)
+    return np.percentile(matrix, q, axis=axis)
+
+
+def coverage(matrix: np.ndarray, true_value, change: Optional[float] = None, q = (5, 95)):
+    """
+    The proportion of games in which the true value lies strictly within the percentile interval of the players' estimates.
+
+        matrix: np.ndarray
+            (players x games) or (reps x players x games) estimates
+        true_value: float or np.ndarray
+            the true value, broadcastable to (... x games)
+        change: float
+            if given the true value starts at 0.5 and changes by change after every game (true_value is ignored)
+        q: tuple
+            the lower and upper percentile of the interval
+
+    returns:
+        float, or np.ndarray of shape (reps,) for stacked replications
+    """
+    lower, upper = percentiles(matrix, q)
+    if change is not None:
+        true_value = drifting_true_value(matrix.shape[-1], 0.5, change)
+    covered = (lower < true_value) & (true_value < upper)
+    return np.mean(covered, axis=-1)
+
+
+def mse(col_means: np.ndarray, true_value, change: Optional[float] = None):
+    #mean squared error of the column means over the games, the true value drifts from 0.5 if change is given
+    if change is not None:
+        true_value = drifting_true_value(col_means.shape[-1], 0.5, change)
+    return np.mean((true_value - col_means) ** 2, axis=-1)
+
+
+def first_hit(mask: np.ndarray, never: int = NEVER):
+    #index of the first True along the last axis, never if there is none
+    return np.where(np.any(mask, axis=-1), np.argmax(mask, axis=-1), never)
+
+
+def hitting_time(col_means: np.ndarray, true_value, tol: float = 0.01, never: int = NEVER):
+    #the first game in which the column mean is strictly within tol of the true value
+    col_means = np.asarray(col_means)
+    return first_hit(((true_value - tol) < col_means) & (col_means < (true_value + tol)), never)
+
+
+def hitting_below(col_means: np.ndarray, true_value, never: int = NEVER):
+    #the first game in which the column mean drops below the true value
+    return first_hit(np.asarray(col_means) < true_value, never)
+
+
+def score_counts(scores: np.ndarray, urn_size: int):
+    #the frequency of every score 0..urn_size along the last axis, shape (... x urn_size + 1)
+    scores = np.asarray(scores)
+    if not np.issubdtype(scores.dtype, np.integer):
+        if not np.all(np.isfinite(scores)) or np.any(scores != np.round(scores)):
+            raise ValueError("The scores should be whole numbers of green balls.")
+    #an out of range score would be counted in the neighbouring row
+    if scores.size > 0 and (np.min(scores) < 0 or np.max(scores) > urn_size):
+        raise ValueError("The scores should be between 0 and the urn size (" + str(urn_size) + ").")
+    scores = scores.astype(np.int64)
+    rows = scores.reshape(-1, scores.shape[-1])
+    offsets = (np.arange(rows.shape[0]) * (urn_size + 1))[:, None]
+    counts = np.bincount((rows + offsets).ravel(), minlength=rows.shape[0] * (urn_size + 1))
+    return counts.reshape(scores.shape[:-1] + (urn_size + 1,))
+
+
+def binomial_gof(scores: np.ndarray, urn_size: int, true_p):
+    """
+    Chi-square goodness of fit test of the scores against the Binomial(urn_size, true_p) distribution, which is the stationary
+    distribution of the urn of a player with true value true_p.
+
+        scores: np.ndarray
+            the scores (number of green balls) along the last axis, e.g. a player's container or (players x games) scores
+        urn_size: int
+            the urn size of the scores
+        true_p: float or np.ndarray
+            the true value, broadcastable to the leading axes of scores
+
+    returns:
+        (chi_square, p_value), floats or arrays with the leading shape of scores. Scores with zero expected frequency are left out.
+    """
+    import scipy.stats as sp
+    counts = score_counts(scores, urn_size)
+    n = counts.sum(axis=-1, keepdims=True)
+    expected = sp.binom.pmf(np.arange(urn_size + 1), urn_size, np.asarray(true_p, dtype=np.float64)[..., None]) * n
+    positive = expected > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        terms = np.where(positive, (counts - expected) ** 2 / expected, 0)
+    chi_square = terms.sum(axis=-1)
+    p_value = sp.chi2.sf(chi_square, np.sum(positive, axis=-1) - 1)
+    return chi_square, p_value
@@ -0,0 +1,92 @@
+import io
+import contextlib
+import numpy as np
+import pytest
+from Agents import Player
+from AlsData import AlsData
+from Checkpoint import load_checkpoint
+from Game_Type import Game_Type
+from History import HISTORY_FIELDS
+from Urnings import Urnings
+from Compiled_Urnings import NUMBA_AVAILABLE
+
+ENGINES = ["python", "vectorized", pytest.param("compiled", marks=pytest.mark.skipif(not NUMBA_AVAILABLE, reason="numba is not installed"))]
+#the vectorized engine only plays rounds (test mode), the number of games and the checkpoints count rounds there
+GAMES = {"python": (500, 120), "vectorized": (25, 7), "compiled": (500, 120)}
+
+
+def build(engine: str, stream: str):
+    rng = np.random.default_rng(0)
+    players = [Player(i, 10, 20, tv) for i, tv in enumerate(rng.uniform(0.1, 0.9, 40))]
+    items = [Player(i, 10, 20, tv) for i, tv in enumerate(rng.uniform(0.1, 0.9, 15))]
+    #the vectorized engine has no paired update
+    game_type = Game_Type(adaptivity="adaptive", alg_type="Urnings2", paired_update=engine != "vectorized", engine=engine)
+    if stream == "global":
+        np.random.seed(1)
+        return Urnings(players, items, game_type)
+    return Urnings(players, items, game_type, rng=np.random.default_rng(1))
+
+
+def assert_same_state(resumed: Urnings, expected: Urnings):
+    assert resumed.game_count == expected.game_count
+    assert resumed.bugfix == expected.bugfix
+    for agents in ["players", "items"]:
+        np.testing.assert_array_equal([ag.score for ag in getattr(resumed, agents)], [ag.score for ag in getattr(expected, agents)])
+        for f in HISTORY_FIELDS:
+            np.testing.assert_array_equal(resumed.history_matrix(f, agents, fill=-1), expected.history_matrix(f, agents, fill=-1))
+
+
+@pytest.mark.parametrize("stream", ["buffered", "global"])
+@pytest.mark.parametrize("engine", ENGINES)
+def test_resumed_run_equals_uninterrupted_run(engine, stream, tmp_path):
+    n_games, checkpoint_every = GAMES[engine]
+    test = engine == "vectorized"
+    path = str(tmp_path / "checkpoint")
+    with contextlib.redirect_stdout(io.StringIO()):
+        expected = build(engine, stream)
+        expected.play(n_games, test=test)
+
+        #the interrupted run goes on after its last checkpoint, the resumed one starts from there again
+        interrupted = build(engine, stream)
+        interrupted.play(n_games, test=test, checkpoint_every=checkpoint_every, checkpoint_path=path)
+        resumed = load_checkpoint(path)
+        assert resumed.game_count == checkpoint_every * (n_games // checkpoint_every)
+        resumed.play(n_games - resumed.game_count, test=test)
+
+    assert_same_state(resumed, expected)
+    assert_same_state(interrupted, expected)
+
+
+def write_log(path: str, n_events: int, seed: int = 0):
+    #the learners and items appear over the whole log, so a resumed replay still creates new ones
+    rng = np.random.default_rng(seed)
+    with open(path, "w") as f:
+        f.write("timestamp,learner_id,item_id,correct\n")
+        for e in range(n_events):
+            learner, item = rng.integers(0, 5 + e // 20), rng.integers(0, 3 + e // 40)
+            f.write(f"{e},L{learner},I{item},{int(rng.uniform() < 0.6)}\n")
+
+
+@pytest.mark.parametrize("engine", ["python", pytest.param("compiled", marks=pytest.mark.skipif(not NUMBA_AVAILABLE, reason="numba is not installed"))])
+def test_resumed_replay_equals_uninterrupted_replay(engine, tmp_path):
+    log = str(tmp_path / "log.csv")
+    path = str(tmp_path / "checkpoint")
+    write_log(log, 1000)
+    game_type = Game_Type(adaptivity="n_adaptive", alg_type="Urnings1", engine=engine)
+
+    data = AlsData(log, 20, 20, chunk_size=150)
+    expected = data.build_urnings(game_type, rng=np.random.default_rng(1))
+    data.replay(expected)
+
+    data = AlsData(log, 20, 20, chunk_size=150)
+    interrupted = data.build_urnings(game_type, rng=np.random.default_rng(1))
+    data.replay(interrupted, checkpoint_every=240, checkpoint_path=path)
+    resumed = load_checkpoint(path)
+    assert resumed.game_count == 960
+
+    data = AlsData(log, 20, 20, chunk_size=150)
+    report = data.replay(resumed)
+    assert report["events"] == 40
+    assert_same_state(resumed, expected)
+    assert [pl.user_id for pl in resumed.players] == [pl.user_id for pl in expected.players]
+    assert [it.user_id for it in resumed.items] == [it.user_id for it in expected.items]
@@ -0,0 +1,101 @@
+import io
+import contextlib
+import numpy as np
+import pytest
+from AlsData import AlsData
+from Game_Type import Game_Type
+from History import HISTORY_FIELDS
+from Compiled_Urnings import NUMBA_AVAILABLE
+from Replications import mad_curve
+from benchmarks import build_urnings, URN_OPTIONS
+
+pytestmark = pytest.mark.skipif(not NUMBA_AVAILABLE, reason="numba is not installed")
+
+PERMUTATION = dict(adaptive_urn=True, adaptive_urn_type="permutation", max_urn=64, min_urn=8, window=6, bound=0.1, permutation_test=True, perm_p_val=0.1)
+N_SEEDS = 6
+N_ROUNDS = 60
+
+
+def assert_same_games(compiled, python):
+    assert compiled.bugfix == python.bugfix
+    for agents in ["players", "items"]:
+        for name in ["score", "urn_size"]:
+            np.testing.assert_array_equal([getattr(ag, name) for ag in getattr(compiled, agents)],
+                                          [getattr(ag, name) for ag in getattr(python, agents)])
+        for f in HISTORY_FIELDS:
+            np.testing.assert_array_equal(compiled.history_matrix(f, agents, fill=-1), python.history_matrix(f, agents, fill=-1))
+
+
+def play_both(config: dict, n_games: int, test: bool = False):
+    played = {}
+    for engine in ["python", "compiled"]:
+        urnings = build_urnings(dict(config, engine=engine), 40, 20, seed=1)
+        with contextlib.redirect_stdout(io.StringIO()):
+            urnings.play(n_games, test=test)
+        played[engine] = urnings
+    return played["compiled"], played["python"]
+
+
+@pytest.mark.parametrize("paired_update", [False, True])
+@pytest.mark.parametrize("adaptivity", ["adaptive", "n_adaptive"])
+@pytest.mark.parametrize("alg_type", ["Urnings1", "Urnings2"])
+def test_compiled_matches_python(alg_type, adaptivity, paired_update):
+    config = dict(adaptivity=adaptivity, alg_type=alg_type, paired_update=paired_update)
+    assert_same_games(*play_both(config, 2000))
+    assert_same_games(*play_both(config, 5, test=True))
+
+
+@pytest.mark.parametrize("alg_type", ["Urnings1", "Urnings2"])
+def test_compiled_matches_python_with_permutation_urns(alg_type):
+    config = dict(adaptivity="adaptive", alg_type=alg_type, **PERMUTATION)
+    compiled, python = play_both(config, 3000)
+    #the test changes the urn sizes, otherwise the comparison would not cover it
+    assert len(set(pl.urn_size for pl in python.players)) > 1
+    assert_same_games(compiled, python)
+
+
+def test_compiled_replay_matches_python(tmp_path):
+    #the learners and items appear over the whole log, several of them within one chunk
+    rng = np.random.default_rng(0)
+    log = str(tmp_path / "log.csv")
+    with open(log, "w") as f:
+        f.write("timestamp,learner_id,item_id,correct\n")
+        for e in range(3000):
+            f.write(f"{e},L{rng.integers(0, 5 + e // 30)},I{rng.integers(0, 3 + e // 60)},{int(rng.uniform() < 0.6)}\n")
+
+    replayed = {}
+    for engine in ["python", "compiled"]:
+        data = AlsData(log, 20, 20, chunk_size=500)
+        urnings = data.build_urnings(Game_Type(adaptivity="adaptive", alg_type="Urnings2", paired_update=True, engine=engine), rng=np.random.default_rng(1))
+        data.replay(urnings)
+        replayed[engine] = urnings
+    assert [pl.user_id for pl in replayed["compiled"].players] == [pl.user_id for pl in replayed["python"].players]
+    assert [it.user_id for it in replayed["compiled"].items] == [it.user_id for it in replayed["python"].items]
+    assert_same_games(replayed["compiled"], replayed["python"])
+
+
+def curves(engine: str, config: dict):
+    #the mean absolute error of the estimates and the mean urn size (stake) of the players after every round
+    field = "stakes_container" if config["adaptive_urn_type"] == "stakes_second_order_urnings" else "urn_container"
+    values = []
+    for seed in range(N_SEEDS):
+        urnings = build_urnings(dict(config, engine=engine), 100, 30, seed)
+        with contextlib.redirect_stdout(io.StringIO()):
+            urnings.play(N_ROUNDS, test=True)
+        sizes = np.nanmean(urnings.history_matrix(field).astype(np.float64), axis=0) / config["max_urn"]
+        values.append(np.concatenate([mad_curve(urnings), sizes]))
+    return np.array(values)
+
+
+@pytest.mark.parametrize("adaptivity", ["adaptive", "n_adaptive"])
+@pytest.mark.parametrize("urn_type", ["second_order_urnings", "stakes_second_order_urnings"])
+def test_compiled_second_order_urns_match_python(urn_type, adaptivity):
+    #the control draws of the second order urns are taken from other uniforms than in the Python engine, only the distribution of
+    #the curves has to agree
+    config = dict(adaptivity=adaptivity, alg_type="Urnings1", adaptive_urn_type=urn_type, **URN_OPTIONS[urn_type])
+    python = curves("python", config)
+    compiled = curves("compiled", config)
+    se = np.sqrt((python.var(axis=0, ddof=1) + compiled.var(axis=0, ddof=1)) / N_SEEDS)
+    difference = np.abs(python.mean(axis=0) - compiled.mean(axis=0))
+    assert np.all(difference[1:] < 4.5 * se[1:] + 0.005), difference
+    assert np.mean(difference) < 0.03
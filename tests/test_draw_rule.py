@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+import zlib
+from Agents import Player
+from Game_Type import Game_Type
+
+N_DRAWS = 2000
+
+#(player score, player urn size, item score, item urn size), the degenerate urns are where the capped rejection loop decides
+URNS = [(3, 8, 5, 8),
+        (4, 8, 4, 8),
+        (0, 8, 0, 8),
+        (8, 8, 8, 8),
+        (8, 8, 0, 8),
+        (0, 8, 8, 8),
+        (1, 16, 15, 16)]
+
+TRUE_VALUES = [(0.3, 0.6), (0.5, 0.5), (0.9, 0.2)]
+
+
+def outcome_frequencies(game_type: Game_Type, urns: tuple, true_values: tuple, seed: int, n_draws: int = N_DRAWS):
+    rng = np.random.default_rng(seed)
+    player = Player(0, urns[0], urns[1], true_values[0])
+    item = Player(1, urns[2], urns[3], true_values[1])
+    counts = np.zeros((2, 2))
+    for _ in range(n_draws):
+        result, expected_results = game_type.draw_rule(player, item, rng)
+        counts[result, expected_results] += 1
+    return counts / n_draws
+
+
+def batch_frequencies(game_type: Game_Type, urns: tuple, true_values: tuple, seed: int):
+    rng = np.random.default_rng(seed)
+    full = lambda value: np.full(N_DRAWS, value)
+    result, expected_results = game_type.draw_rule_batch(full(urns[0]), full(urns[1]), full(true_values[0]),
+                                                         full(urns[2]), full(urns[3]), full(true_values[1]), rng)
+    counts = np.zeros((2, 2))
+    np.add.at(counts, (result, expected_results), 1)
+    return counts / N_DRAWS
+
+
+def assert_same_distribution(p: np.ndarray, q: np.ndarray):
+    #two sample z test for every (result, expected result) cell, cells which never or always occur have to agree exactly
+    pooled = (p + q) / 2
+    se = np.sqrt(2 * pooled * (1 - pooled) / N_DRAWS)
+    degenerate = se == 0
+    np.testing.assert_array_equal(p[degenerate], q[degenerate])
+    z = np.abs(p - q)[~degenerate] / se[~degenerate]
+    assert np.all(z < 4.5), (p, q)
+
+
+@pytest.mark.parametrize("alg_type", ["Urnings1", "Urnings2"])
+@pytest.mark.parametrize("urns", URNS)
+@pytest.mark.parametrize("true_values", TRUE_VALUES)
+def test_closed_form_matches_rejection(alg_type, urns, true_values):
+    rejection = Game_Type(adaptivity="n_adaptive", alg_type=alg_type, draw_mode="rejection")
+    closed_form = Game_Type(adaptivity="n_adaptive", alg_type=alg_type, draw_mode="closed_form")
+    seed = zlib.crc32(repr((alg_type, urns, true_values)).encode())
+    reference = outcome_frequencies(rejection, urns, true_values, seed)
+
+    assert_same_distribution(reference, outcome_frequencies(closed_form, urns, true_values, seed + 1))
+    assert_same_distribution(reference, batch_frequencies(closed_form, urns, true_values, seed + 2))
+
+
+@pytest.mark.parametrize("urns, expected", [((0, 8, 0, 8), 0), ((8, 8, 8, 8), 1)])
+def test_all_green_or_all_red_urns(urns, expected):
+    #Urnings1: the draws of the urns never differ, the rejection loop stops after 1000 draws with the player's draw
+    for draw_mode in ["rejection", "closed_form"]:
+        game_type = Game_Type(adaptivity="n_adaptive", alg_type="Urnings1", draw_mode=draw_mode)
+        frequencies = outcome_frequencies(game_type, urns, (0.5, 0.5), 0, n_draws = 200)
+        assert np.sum(frequencies[:, expected]) == 1
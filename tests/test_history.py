@@ -0,0 +1,92 @@
+import numpy as np
+from Agents import Player
+from History import History, Ragged_History, HISTORY_FIELDS
+from Result_Store import Result_Store
+
+
+def random_operations(histories: list, n_operations: int, seed: int):
+    #the same random appends, assignments and new rows on every history
+    rng = np.random.default_rng(seed)
+    fields = list(HISTORY_FIELDS)
+    for _ in range(n_operations):
+        n = histories[0].n_rows
+        field = fields[rng.integers(len(fields))]
+        operation = rng.integers(5)
+        if operation == 0:
+            row, value = rng.integers(n), rng.integers(100)
+            for h in histories:
+                h.append(row, field, value)
+        elif operation == 1:
+            rows = rng.choice(n, min(n, 3), replace=False)
+            values = rng.integers(0, 100, len(rows))
+            for h in histories:
+                h.append_rows(rows, field, values)
+        elif operation == 2:
+            rows = rng.integers(0, n, 20)
+            values = {f : rng.integers(0, 100, 20).astype(dt) for f, dt in HISTORY_FIELDS.items()}
+            for h in histories:
+                h.extend_rows(rows, values)
+        elif operation == 3:
+            for h in histories:
+                h.add(Player(n, 3, 8, 0.5))
+        else:
+            row, values = rng.integers(n), rng.integers(0, 100, rng.integers(0, 30))
+            for h in histories:
+                h.assign(row, field, values)
+
+
+def test_ragged_history_matches_history(tmp_path):
+    matrix, ragged = History(3, 1), Ragged_History(3, 1)
+    random_operations([matrix, ragged], 2000, 0)
+
+    for f in HISTORY_FIELDS:
+        np.testing.assert_array_equal(matrix.to_matrix(f, fill=-1), ragged.to_matrix(f, fill=-1))
+        for row in range(matrix.n_rows):
+            np.testing.assert_array_equal(matrix.view(row, f), ragged.view(row, f))
+
+    #the packed files load as a Ragged_History and can be read by Result_Store
+    ragged.save(tmp_path, "ragged_")
+    matrix.save(tmp_path, "matrix_")
+    for loaded in [History.load(tmp_path, "ragged_"), Ragged_History.load(tmp_path, "ragged_"), Ragged_History.load(tmp_path, "matrix_")]:
+        assert isinstance(loaded, Ragged_History)
+        for f in HISTORY_FIELDS:
+            np.testing.assert_array_equal(matrix.to_matrix(f, fill=-1), loaded.to_matrix(f, fill=-1))
+    rows = np.array([0, 2, 5])
+    for f in HISTORY_FIELDS:
+        store, reference = Result_Store(tmp_path, "ragged_"), Result_Store(tmp_path, "matrix_")
+        np.testing.assert_array_equal(store.to_matrix(f, fill=-1), matrix.to_matrix(f, fill=-1))
+        np.testing.assert_array_equal(store.to_matrix(f, rows, slice(1, 6), fill=-1), reference.to_matrix(f, rows, slice(1, 6), fill=-1))
+
+    #the loaded history keeps growing
+    loaded = History.load(tmp_path, "ragged_")
+    random_operations([matrix, loaded], 200, 1)
+    for f in HISTORY_FIELDS:
+        np.testing.assert_array_equal(matrix.to_matrix(f, fill=-1), loaded.to_matrix(f, fill=-1))
+
+
+def test_ragged_history_grows_with_the_saved_values():
+    #one long row does not widen the others
+    ragged = Ragged_History(1000, 1)
+    for _ in range(10000):
+        ragged.append(0, "container", 1)
+    assert ragged.data["container"].size <= 4 * (10000 + 1000)
+
+
+def test_ragged_files_hold_the_saved_values(tmp_path):
+    ragged = Ragged_History(1000, 1)
+    for _ in range(10000):
+        ragged.append(0, "container", 1)
+    ragged.save(tmp_path)
+    assert np.load(tmp_path / "container_flat.npy").size == 10000
+
+
+def test_profiler_follows_replaced_histories(tmp_path):
+    from benchmarks import build_urnings, benchmark_configs
+    urnings = build_urnings(benchmark_configs()[0], 20, 10)
+    urnings.enable_profiling()
+    urnings.play(100)
+    urnings.ragged_histories()
+    urnings.play(100)
+    urnings.map_histories(str(tmp_path / "histories"))
+    urnings.play(100)
+    assert urnings.profile_report()["phases"]["container_appends"]["calls"] == 3 * 1000
@@ -0,0 +1,55 @@
+import io
+import contextlib
+import numpy as np
+import pytest
+from Agents import Player
+from Game_Type import Game_Type
+from History import HISTORY_FIELDS
+from Result_Store import Mapped_History, Result_Store
+from Urnings import Urnings
+from Compiled_Urnings import NUMBA_AVAILABLE
+
+ENGINES = ["python", "vectorized", pytest.param("compiled", marks=pytest.mark.skipif(not NUMBA_AVAILABLE, reason="numba is not installed"))]
+
+
+def build(engine: str):
+    rng = np.random.default_rng(0)
+    players = [Player(i, 10, 20, tv) for i, tv in enumerate(rng.uniform(0.1, 0.9, 60))]
+    items = [Player(i, 10, 20, tv) for i, tv in enumerate(rng.uniform(0.1, 0.9, 20))]
+    return Urnings(players, items, Game_Type(adaptivity="adaptive", alg_type="Urnings1", engine=engine), rng=np.random.default_rng(1))
+
+
+def play(urnings: Urnings):
+    with contextlib.redirect_stdout(io.StringIO()):
+        urnings.play(30, test=True)
+        urnings.play(500)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_mapped_run_equals_in_memory_run(engine, tmp_path):
+    in_memory, mapped = build(engine), build(engine)
+    #a small chunk size makes the mapped files grow (and be replaced) during the run
+    mapped.map_histories(str(tmp_path), chunk_size=4, flush_every=100)
+    play(in_memory)
+    play(mapped)
+
+    assert isinstance(mapped.player_history, Mapped_History)
+    for agents in ["players", "items"]:
+        store = Result_Store(str(tmp_path / agents))
+        for f in HISTORY_FIELDS:
+            expected = in_memory.history_matrix(f, agents, fill=-1)
+            np.testing.assert_array_equal(mapped.history_matrix(f, agents, fill=-1), expected)
+            np.testing.assert_array_equal(store.to_matrix(f, fill=-1), expected)
+
+
+def test_reopened_history_can_add_rows(tmp_path):
+    urnings = build("python")
+    urnings.map_histories(str(tmp_path))
+    urnings.add_player(Player(60, 10, 20, 0.5))
+    play(urnings)
+
+    history = Mapped_History.open(str(tmp_path / "players"))
+    for k in range(3):
+        history.add(Player(100 + k, 10, 20, 0.5))
+    assert history.n_rows == 64
+    assert history.lengths["container"][63] == 1
@@ -0,0 +1,47 @@
+import io
+import contextlib
+import numpy as np
+import pytest
+from Agents import Player
+from Game_Type import Game_Type
+from Urnings import Urnings
+from Replications import mad_curve
+
+N_SEEDS = 6
+N_ROUNDS = 40
+
+
+def mad_curves(engine: str, adaptivity: str, alg_type: str):
+    curves = []
+    for seed in range(N_SEEDS):
+        rng = np.random.default_rng(seed)
+        players = [Player(i, 10, 20, tv) for i, tv in enumerate(rng.uniform(0.1, 0.9, 200))]
+        items = [Player(i, 10, 20, tv) for i, tv in enumerate(rng.uniform(0.1, 0.9, 50))]
+        urnings = Urnings(players, items, Game_Type(adaptivity=adaptivity, alg_type=alg_type, engine=engine), rng=np.random.default_rng(seed + 100))
+        with contextlib.redirect_stdout(io.StringIO()):
+            urnings.play(N_ROUNDS, test=True)
+        curves.append(mad_curve(urnings))
+    return np.array(curves)
+
+
+@pytest.mark.parametrize("adaptivity", ["adaptive", "n_adaptive"])
+@pytest.mark.parametrize("alg_type", ["Urnings1", "Urnings2"])
+def test_vectorized_matches_python(adaptivity, alg_type):
+    #the rounds of the vectorized engine are synchronous, so only the distribution of the curves has to agree
+    python = mad_curves("python", adaptivity, alg_type)
+    vectorized = mad_curves("vectorized", adaptivity, alg_type)
+    se = np.sqrt((python.var(axis=0, ddof=1) + vectorized.var(axis=0, ddof=1)) / N_SEEDS)
+    difference = np.abs(python.mean(axis=0) - vectorized.mean(axis=0))
+    assert np.all(difference[1:] < 4.5 * se[1:] + 0.005), difference
+    assert np.mean(difference) < 0.01
+
+
+def test_write_back_refreshes_the_item_bins():
+    rng = np.random.default_rng(0)
+    players = [Player(i, 10, 20, tv) for i, tv in enumerate(rng.uniform(0.1, 0.9, 50))]
+    items = [Player(i, 10, 20, tv) for i, tv in enumerate(rng.uniform(0.1, 0.9, 20))]
+    urnings = Urnings(players, items, Game_Type(adaptivity="adaptive", alg_type="Urnings1", engine="vectorized"), rng=rng)
+    with contextlib.redirect_stdout(io.StringIO()):
+        urnings.play(5, test=True)
+    for it in urnings.items:
+        assert urnings.item_bins.bin_of[it.idx] == it.score
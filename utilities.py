@@ -1,11 +1,12 @@
 import numpy as np
-import scipy.stats as sp
-import scipy.special as sps
-import itertools
-import matplotlib.pyplot as plt
+#the simulation core only needs these, they live in core so importing Game_Type does not load scipy (re-exported here)
+from core import all_binary_combination, permutation_p_values, pRasch
 
 
 def binomial_gof(array, urn_size, true_p):
+    #kept as it was for the published analyses, metrics.binomial_gof is the vectorized Binomial(urn_size, true_p) test
+    import scipy.stats as sp
+    import scipy.special as sps
     a_len = len(array)
     elements_count = {}
     # iterating over the elements for frequency
@@ -53,28 +54,16 @@ def frequency_check(array, set):
     return elements_count
 
 
-def all_binary_combination(window):
-
-    lst = [list(i) for i in itertools.product([-1, 1], repeat=window)]
-    binary_combinations = np.array(lst)
-    return binary_combinations
-
-
 #plt.hist(np.mean(all_binary_combination(10) * np.array([0,1,1,0,0,-1,-1,1,-1,0]), axis=1))
 
 def MSE(col_means, true_value, change = None):
-    mse =  np.sum((true_value - col_means) ** 2) / len(col_means)
-    if change is not None:
-        true_value = []
-        for i in range(len(col_means)):
-           true_value.append(0.5 + i * change)
-        
-        true_value = np.array(true_value)
-        mse = np.sum((true_value - col_means) ** 2) / len(col_means)
-
-    return mse
+    import metrics
+    #see metrics.mse, which also takes stacked replications
+    return metrics.mse(np.asarray(col_means), true_value, change)
 
 def coverage(urnings_matrix, true_value, change = None):
+    #kept as it was for the published analyses, metrics.coverage is the vectorized version (it divides by n_sim once and
+    #compares the drifting true value with the interval of each game)
 
     n_sim = urnings_matrix.shape[1]
     col_lower = np.zeros(n_sim)
@@ -103,34 +92,12 @@ def coverage(urnings_matrix, true_value, change = None):
     return coverage
 
 def hitting_time(col_means, true_value, tol = 0.01):
-    SE_true_value = tol
-    #print out the iteration when the mean was in this error radius
-    error_radius_logical = []
-    
-    for clm in col_means:
-        error_radius_logical.append((true_value - SE_true_value) < clm < (true_value + SE_true_value))
-    
-    trues_vec = np.where(error_radius_logical)[0]
-    if len(trues_vec) > 0:
-        hitting_time = np.min(trues_vec)
-    else:
-        hitting_time = 999
-    
-    return hitting_time
+    import metrics
+    #see metrics.hitting_time, which also takes stacked replications
+    return int(metrics.hitting_time(col_means, true_value, tol))
 
 def hitting_below(col_means, true_value):
-    dropped_below = []
-    for clm in col_means:
-        dropped_below.append(clm < true_value)
-    
-    trues_vec = np.where(dropped_below)[0]
-    if len(trues_vec) > 0:
-        hitting_time = np.min(trues_vec)
-    else:
-        hitting_time = 999
-    
-    return hitting_time
-
-def pRasch(u,v,n,m):
-    return ((u*(m-v))/(u*(m-v)+(n-u)*v))
+    import metrics
+    #see metrics.hitting_below, which also takes stacked replications
+    return int(metrics.hitting_below(col_means, true_value))
 